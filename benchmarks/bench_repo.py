@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Repository discovery benchmarks
+
+Times repository discovery and classification on a synthetic workspace
+generated in a temporary folder. No network access or real repositories
+are required.
+
+Usage:
+    bench_repo.py [--repos=<count>] [--depth=<depth>] [--repeat=<repeat>] [--output=<path>] [--baseline=<path>] [--threshold=<ratio>]
+
+Options:
+
+    --repos=<count>     Number of repositories to generate. [default: 200]
+
+    --depth=<depth>     Number of nested folders inside each repository.
+                        [default: 8]
+
+    --repeat=<repeat>   Number of times each benchmark is repeated. The
+                        fastest run is used for comparisons. [default: 5]
+
+    --output=<path>     Write the results to this JSON file.
+
+    --baseline=<path>   Compare the results with a previous JSON file and
+                        exit with an error if a benchmark regressed.
+
+    --threshold=<ratio> How much slower than the baseline a benchmark can be
+                        before it is considered a regression. [default: 1.25]
+"""
+
+from __future__ import print_function
+
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+import docopt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tk_toolchain.repo import Repository  # noqa: E402
+from tk_toolchain.workspace import Workspace, WorkspaceIndex  # noqa: E402
+
+# Files identifying each type of component. Folders end with a slash.
+COMPONENT_MARKERS = [
+    ["_core_upgrader.py"],
+    ["engine.py"],
+    ["app.py"],
+    ["framework.py"],
+    ["core/", "env/"],
+    ["shotgun_api3/"],
+    ["pytest_tank_test/"],
+    # Not a Shotgun component.
+    ["README.md"],
+]
+
+SOURCE_CONTROL_FOLDERS = [".git", ".hg", ".svn"]
+
+PREDICATES = [
+    "is_tk_core",
+    "is_engine",
+    "is_framework",
+    "is_app",
+    "is_config",
+    "is_toolkit_component",
+    "is_shotgun_component",
+    "is_tk_toolchain",
+    "is_python_api",
+]
+
+
+def generate_workspace(root, repo_count, depth):
+    """
+    Generate repositories of every type side by side.
+
+    :param str root: Folder to generate the repositories in.
+    :param int repo_count: Number of repositories to generate.
+    :param int depth: Number of nested folders inside each repository.
+
+    :returns: List of (repository root, deepest folder) tuples.
+    """
+    repos = []
+    for i in range(repo_count):
+        repo_root = os.path.join(root, "tk-repo-{0:05d}".format(i))
+        os.makedirs(
+            os.path.join(
+                repo_root, SOURCE_CONTROL_FOLDERS[i % len(SOURCE_CONTROL_FOLDERS)]
+            )
+        )
+        for marker in COMPONENT_MARKERS[i % len(COMPONENT_MARKERS)] + ["info.yml"]:
+            path = os.path.join(repo_root, marker)
+            if marker.endswith("/"):
+                os.makedirs(path)
+            else:
+                open(path, "w").close()
+
+        deepest = os.path.join(
+            repo_root, *["folder{0}".format(d) for d in range(depth)]
+        )
+        os.makedirs(deepest)
+        repos.append((repo_root, deepest))
+
+    # A few folders that are not repositories at all.
+    for i in range(max(1, repo_count // 10)):
+        os.makedirs(os.path.join(root, "not-a-repo-{0:05d}".format(i), "folder"))
+    return repos
+
+
+def walk_to_root(path):
+    """
+    Find a repository root by listing every folder up to it, which is how
+    roots were found before they were memoized.
+
+    :param str path: Folder inside a repository.
+
+    :returns: The repository root.
+    """
+    while True:
+        files = os.listdir(path)
+        for source_control_folder in SOURCE_CONTROL_FOLDERS:
+            if source_control_folder in files:
+                return path
+        path = os.path.dirname(path)
+
+
+def get_benchmarks(workspace_root, repos, cache_path):
+    """
+    Build the list of benchmarks to run.
+
+    :param str workspace_root: Folder containing the repositories.
+    :param list repos: List of (repository root, deepest folder) tuples.
+    :param str cache_path: Where the workspace index can be stored.
+
+    :returns: List of (name, setup, function) tuples. Only the function is timed.
+    """
+    deepest_folders = [deepest for _, deepest in repos]
+    repo_objects = [Repository(root) for root, _ in repos]
+
+    def find_root():
+        for folder in deepest_folders:
+            Repository.find_root(folder)
+
+    def find_root_walk():
+        for folder in deepest_folders:
+            walk_to_root(folder)
+
+    def predicates_cold():
+        for root, _ in repos:
+            repo = Repository(root)
+            for predicate in PREDICATES:
+                getattr(repo, predicate)()
+
+    def predicates_warm():
+        for repo in repo_objects:
+            for predicate in PREDICATES:
+                getattr(repo, predicate)()
+
+    def roots_environment_variables():
+        for repo in repo_objects:
+            repo.get_roots_environment_variables()
+
+    def workspace_scan():
+        Workspace(workspace_root).scan()
+
+    def remove_index():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+
+    def workspace_index():
+        index = WorkspaceIndex(workspace_root, cache_path=cache_path)
+        index.get_repositories()
+        index.save()
+
+    # Populate the cache once so the warm benchmarks are warm.
+    find_root()
+    workspace_index()
+
+    return [
+        ("find_root_walk", None, find_root_walk),
+        ("find_root_cold", Repository.clear_root_cache, find_root),
+        ("find_root_warm", None, find_root),
+        ("predicates_cold", None, predicates_cold),
+        ("predicates_warm", None, predicates_warm),
+        ("get_roots_environment_variables", None, roots_environment_variables),
+        ("workspace_scan", None, workspace_scan),
+        ("workspace_index_cold", remove_index, workspace_index),
+        ("workspace_index_warm", None, workspace_index),
+    ]
+
+
+def run_benchmark(setup, func, repeat):
+    """
+    Time a function.
+
+    :param callable setup: Called before each run, without being timed.
+    :param callable func: Function to time.
+    :param int repeat: Number of runs.
+
+    :returns: Dictionary of statistics, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = timeit.default_timer()
+        func()
+        timings.append(timeit.default_timer() - start)
+
+    timings.sort()
+    return {
+        "min": timings[0],
+        "median": timings[len(timings) // 2],
+        "max": timings[-1],
+        "runs": timings,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print how each benchmark compares with a baseline.
+
+    :param dict results: Results of this run.
+    :param dict baseline: Results of a previous run.
+    :param float threshold: Ratio above which a benchmark has regressed.
+
+    :returns: List of the names of the benchmarks that regressed.
+    """
+    if baseline["parameters"] != results["parameters"]:
+        print(
+            "Warning: the baseline was generated with different parameters: {0}".format(
+                baseline["parameters"]
+            )
+        )
+
+    regressions = []
+    for name, stats in sorted(results["benchmarks"].items()):
+        if name not in baseline["benchmarks"]:
+            continue
+        ratio = stats["min"] / max(baseline["benchmarks"][name]["min"], 1e-9)
+        is_regression = ratio > threshold
+        if is_regression:
+            regressions.append(name)
+        print(
+            "{0:<35} {1:6.2f}x {2}".format(
+                name, ratio, "REGRESSION" if is_regression else ""
+            )
+        )
+    return regressions
+
+
+def main(arguments=None):
+    """
+    Run the benchmarks.
+    """
+    arguments = arguments or sys.argv[1:]
+    options = docopt.docopt(__doc__, argv=arguments)
+
+    parameters = {
+        "repos": int(options["--repos"]),
+        "depth": int(options["--depth"]),
+        "repeat": int(options["--repeat"]),
+    }
+
+    tmp_folder = tempfile.mkdtemp(prefix="tk-toolchain-bench-")
+    try:
+        workspace_root = os.path.join(tmp_folder, "repos")
+        os.mkdir(workspace_root)
+        repos = generate_workspace(
+            workspace_root, parameters["repos"], parameters["depth"]
+        )
+
+        benchmarks = {}
+        for name, setup, func in get_benchmarks(
+            workspace_root, repos, os.path.join(tmp_folder, "index.json")
+        ):
+            benchmarks[name] = run_benchmark(setup, func, parameters["repeat"])
+            print(
+                "{0:<35} min {1:9.3f}ms  median {2:9.3f}ms".format(
+                    name,
+                    benchmarks[name]["min"] * 1000,
+                    benchmarks[name]["median"] * 1000,
+                )
+            )
+    finally:
+        shutil.rmtree(tmp_folder)
+
+    results = {
+        "metadata": {
+            "date": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+        },
+        "parameters": parameters,
+        "benchmarks": benchmarks,
+    }
+
+    if options["--output"]:
+        with open(options["--output"], "w") as fh:
+            json.dump(results, fh, indent=4, sort_keys=True)
+        print("Results written to {0}".format(options["--output"]))
+
+    if options["--baseline"]:
+        with open(options["--baseline"], "r") as fh:
+            baseline = json.load(fh)
+        print("Comparison with {0}:".format(options["--baseline"]))
+        if compare(results, baseline, float(options["--threshold"])):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
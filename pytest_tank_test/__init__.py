@@ -11,11 +11,38 @@
 
 from __future__ import print_function
 
-from tk_toolchain.repo import Repository
 from tk_toolchain import util
-from tk_toolchain.tk_testengine import get_test_engine_enviroment
+from tk_toolchain.bootstrap import compute_bootstrap
+from pytest_tank_test.materializer import FixtureMaterializer
+from pytest_tank_test import forkserver
+from pytest_tank_test.engine_pool import ISOLATED_MARKER, SHARED_MARKER, EnginePool
+from pytest_tank_test.mockgun_snapshots import (
+    MockgunSnapshots,
+    get_default_schema_folder,
+)
+from pytest_tank_test.logs import (
+    FailureLogReporter,
+    LogCapture,
+    QueuedLogging,
+    is_queue_supported,
+)
+from pytest_tank_test.collection import (
+    CollectionIndex,
+    CollectionPruner,
+    IgnorePatterns,
+)
 import os
 import sys
+import timeit
+
+import pytest
+
+# Paths that are never collected: unit tests for third parties found inside
+# tk-core and any Python source file inside tests/fixtures.
+_DEFAULT_IGNORE_PATTERNS = ["tests/python/third_party", "tests/fixtures"]
+
+# Used to report how long it took for the plugin to be ready.
+_PLUGIN_IMPORT_TIME = timeit.default_timer()
 
 
 def _update_sys_path(reason, path):
@@ -27,17 +54,324 @@ def _update_sys_path(reason, path):
         sys.path.insert(0, path)
 
 
-def _initialize_logging():
+def _initialize_logging(config):
     """
     Sets up a log file for the unit tests and optionally logs everything to the
     console.
+
+    The log file is named ``tk-test`` unless ``TK_TEST_LOG_NAME`` is set.
+    When running under pytest-xdist, each worker writes to its own log file.
+    Records are written by a background thread unless ``--tank-log-sync`` is
+    set or the version of Python doesn't support it.
     """
     import tank
 
-    tank.LogManager().initialize_base_file_handler("tk-test")
+    log_name = os.environ.get("TK_TEST_LOG_NAME") or "tk-test"
+    workerinput = getattr(config, "workerinput", None)
+    if workerinput is not None:
+        log_name = "{0}-{1}".format(log_name, workerinput["workerid"])
+
+    tank.LogManager().initialize_base_file_handler(log_name)
     tank.LogManager().initialize_custom_handler()
     print("Logs for this test run can be found at", tank.LogManager().log_file)
 
+    logger = tank.LogManager().root_logger
+    direct_handlers = []
+    if config._tank_test_log_reporter is not None:
+        # Captured records are needed as soon as a test fails.
+        config._tank_test_log_reporter.attach(logger)
+        direct_handlers.append(config._tank_test_log_reporter.handler)
+    if not config.getoption("tank_log_sync", False) and is_queue_supported():
+        config._tank_test_log_queue = QueuedLogging(
+            logger, direct_handlers=direct_handlers
+        )
+        config._tank_test_log_queue.start()
+
+
+def _apply_bootstrap(config, bootstrap):
+    """
+    Configures the process according to the result of :func:`compute_bootstrap`.
+
+    :param config: The pytest config object.
+    :param dict bootstrap: Result of :func:`compute_bootstrap`.
+    """
+    start = timeit.default_timer()
+    for reason, path in bootstrap["sys_paths"]:
+        _update_sys_path(reason, path)
+    config._tank_test_sys_path_duration = timeit.default_timer() - start
+
+    # Now that Toolkit has been added to the PYTHONPATH, we could set up logging.
+    # However, importing Toolkit is slow, so this is delayed until a test that
+    # uses Toolkit is about to run. See _ensure_logging_initialized.
+    config._tank_test_logging_pending = True
+
+    util.merge_into_environment_variables(bootstrap["environment"])
+
+    print("Fixtures found at", bootstrap["fixtures"])
+    # Note: This won't be documented (or renamed) as we're not super comfortable
+    # supporting TankTestBase at the moment for clients to write tests with.
+    os.environ["TK_TEST_FIXTURES"] = bootstrap["fixtures"]
+
+
+def pytest_addoption(parser):
+    """
+    Adds the options of the plugin.
+    """
+    group = parser.getgroup("tank", "Shotgun Toolkit")
+    group.addoption(
+        "--tank-ignore",
+        action="append",
+        metavar="GLOB",
+        default=[],
+        help="Do not collect paths matching this glob pattern, in addition to "
+        "the tank_ignore ini option. Can be repeated.",
+    )
+    parser.addini(
+        "tank_ignore",
+        type="linelist",
+        default=[],
+        help="Glob patterns of paths that should not be collected, e.g. "
+        "tests/fixtures. Patterns match the trailing components of a path.",
+    )
+    group.addoption(
+        "--tank-record-impact",
+        action="store_true",
+        default=False,
+        help="Record which source files each test executes, "
+        "for use with --tank-affected.",
+    )
+    group.addoption(
+        "--tank-affected",
+        metavar="GIT_REF",
+        default=None,
+        help="Only run the tests that executed files changed since GIT_REF. "
+        "All tests are run if the recorded test impact is out of date.",
+    )
+    group.addoption(
+        "--tank-fixtures-mode",
+        choices=FixtureMaterializer.MODES,
+        default=FixtureMaterializer.AUTO,
+        help="How the tank_fixture fixture materializes fixtures: 'auto' clones "
+        "files with copy-on-write reflinks when possible and copies them "
+        "otherwise, 'copy' always copies and 'hardlink' hardlinks files, "
+        "which requires tests not to modify them in place. Default: 'auto'.",
+    )
+    group.addoption(
+        "--tank-shard",
+        metavar="INDEX/COUNT",
+        default=None,
+        help="Only run the tests of one of COUNT shards of similar durations, "
+        "e.g. 2/4. Every shard needs to use the same test durations.",
+    )
+    group.addoption(
+        "--tank-durations",
+        metavar="PATH",
+        default=None,
+        help="Test durations used by --tank-shard, e.g. a report written by "
+        "--tank-timing-report. Defaults to the durations of previous runs "
+        "stored in the pytest cache.",
+    )
+    group.addoption(
+        "--tank-timing-report",
+        metavar="PATH",
+        default=None,
+        help="Time the phases of the session and of each test, write them to "
+        "a JSON file and print the slowest setups, imports and tests.",
+    )
+    group.addoption(
+        "--tank-fork",
+        choices=forkserver.FORK_MODES,
+        default=None,
+        help="Import Toolkit, Qt and TankTestBase once and run the tests of "
+        "each module in a process forked from this warm process. POSIX only.",
+    )
+    parser.addini(
+        "tank_prewarm",
+        type="linelist",
+        default=[],
+        help="Additional modules imported once before forking with --tank-fork.",
+    )
+    group.addoption(
+        "--tank-log-sync",
+        action="store_true",
+        default=False,
+        help="Write Toolkit logs from the test thread instead of a background "
+        "thread, so no record is lost if the process crashes.",
+    )
+    group.addoption(
+        "--tank-log-capture",
+        action="store_true",
+        default=False,
+        help="Show the Toolkit logs of a failed test in its report.",
+    )
+    group.addoption(
+        "--tank-impact-db",
+        metavar="PATH",
+        default=None,
+        help="Location of the test impact database. "
+        "Defaults to a file in the tk-toolchain cache folder.",
+    )
+
+
+def _register_impact_plugins(config, repo_root):
+    """
+    Registers the test impact plugins requested on the command line.
+
+    :param config: The pytest config object.
+    :param str repo_root: Root of the repository being tested.
+    """
+    record = config.getoption("tank_record_impact")
+    ref = config.getoption("tank_affected")
+    if not record and ref is None:
+        return
+
+    # Imported here so the plugin doesn't pay for it when the options are not used.
+    from pytest_tank_test import impact
+
+    if record and config.getoption("cov_source", None):
+        raise pytest.UsageError("--tank-record-impact can't be combined with --cov.")
+
+    database_path = config.getoption(
+        "tank_impact_db"
+    ) or impact.get_default_database_location(repo_root)
+
+    if record:
+        config.pluginmanager.register(
+            impact.ImpactRecorder(repo_root, database_path), "tank_impact_recorder"
+        )
+
+    if ref is not None:
+        selector = impact.ImpactSelector(repo_root, database_path, ref)
+        config._tank_test_selectors.append(selector.is_selected)
+        config.pluginmanager.register(selector, "tank_impact_selector")
+
+
+def _register_sharding(config):
+    """
+    Registers the plugin remembering test durations and, if requested on the
+    command line, the plugin selecting the tests of a shard.
+
+    :param config: The pytest config object.
+    """
+    from pytest_tank_test import sharding
+
+    shard = config.getoption("tank_shard", None)
+
+    store = None
+    if getattr(config, "cache", None) is not None:
+        store = sharding.DurationStore(config, read_only=shard is not None)
+        config.pluginmanager.register(store, "tank_duration_store")
+
+    if shard is None:
+        return
+
+    index, count = sharding.parse_shard(shard)
+    durations_path = config.getoption("tank_durations", None)
+    if durations_path is not None:
+        durations = sharding.load_durations(durations_path)
+    elif store is not None:
+        durations = store.durations
+    else:
+        durations = {}
+    config.pluginmanager.register(
+        sharding.ShardSelector(index, count, durations), "tank_shard_selector"
+    )
+
+
+def _register_pruner(config):
+    """
+    Registers the plugin skipping the collection of modules whose tests would
+    all be deselected.
+
+    :param config: The pytest config object.
+    """
+    cache = getattr(config, "cache", None)
+    if cache is None:
+        return
+
+    # When only some tests of a module are requested, we can't tell which
+    # tests the module contains.
+    update_index = not config.getoption("lf", False) and not any(
+        "::" in arg for arg in config.args
+    )
+    config._tank_test_pruner = CollectionPruner(
+        CollectionIndex(cache, str(config.rootdir)),
+        config._tank_test_selectors,
+        update_index,
+    )
+    config.pluginmanager.register(config._tank_test_pruner, "tank_pruner")
+
+
+def _register_timer(config, bootstrap_duration):
+    """
+    Registers the plugin timing the session, if requested on the command line.
+
+    :param config: The pytest config object.
+    :param float bootstrap_duration: Time it took to discover the environment.
+    """
+    report_path = config.getoption("tank_timing_report", None)
+    if report_path is None:
+        return
+
+    from pytest_tank_test.timing import PhaseTimer
+
+    config._tank_test_timer = PhaseTimer(config, os.path.abspath(report_path))
+    config._tank_test_timer.record("bootstrap", bootstrap_duration)
+    config._tank_test_timer.record("sys_path", config._tank_test_sys_path_duration)
+    config._tank_test_timer.install()
+    config.pluginmanager.register(config._tank_test_timer, "tank_timer")
+
+
+def _register_log_reporter(config):
+    """
+    Registers the plugin showing the Toolkit logs of failed tests, if
+    requested on the command line.
+
+    :param config: The pytest config object.
+    """
+    if not config.getoption("tank_log_capture", False):
+        return
+    config._tank_test_log_reporter = FailureLogReporter()
+    config.pluginmanager.register(config._tank_test_log_reporter, "tank_log_reporter")
+
+
+def _register_forker(config):
+    """
+    Imports the modules the tests need and registers the plugin running each
+    test module in a forked process, if requested on the command line.
+
+    :param config: The pytest config object.
+    """
+    if config.getoption("tank_fork", None) is None:
+        return
+
+    if not forkserver.is_supported():
+        raise pytest.UsageError("--tank-fork is not supported on this platform.")
+    if not hasattr(config.hook, "pytest_report_to_serializable"):
+        raise pytest.UsageError("--tank-fork requires pytest 4.4 or later.")
+    if config.getoption("tank_record_impact", False) or config.getoption(
+        "cov_source", None
+    ):
+        raise pytest.UsageError(
+            "--tank-fork can't be combined with --tank-record-impact or --cov."
+        )
+    # Each pytest-xdist worker is only handed some of the tests of a module, a
+    # few at a time, so the batch run by a child can't be known in advance.
+    if config.getoption("numprocesses", None) or config.getoption("dist", "no") != "no":
+        raise pytest.UsageError("--tank-fork can't be combined with pytest-xdist.")
+
+    results = forkserver.prewarm(
+        forkserver.DEFAULT_PREWARM_MODULES + config.getini("tank_prewarm")
+    )
+    config._tank_test_prewarm = forkserver.format_prewarm(results)
+    if config._tank_test_timer is not None:
+        config._tank_test_timer.record(
+            "prewarm", sum(duration for _, duration, _ in results)
+        )
+    # Children inherit the log file instead of each opening their own.
+    _ensure_logging_initialized(config)
+    config.pluginmanager.register(forkserver.ModuleForker(config), "tank_forker")
+
 
 def pytest_configure(config):
     """
@@ -47,81 +381,356 @@ def pytest_configure(config):
     - find the repository root via SHOTGUN_REPO_ROOT
     - find the test engine via SHOTGUN_TEST_ENGINE
     - write to a Toolkit log file
-    """
 
-    cur_dir = os.path.abspath(os.curdir)
+    When running under pytest-xdist, the environment is discovered once by the
+    controller and handed to the workers.
+    """
+    config.addinivalue_line(
+        "markers",
+        "{0}: run the test with a newly started engine instead of the one "
+        "shared by the tank_engine fixture.".format(ISOLATED_MARKER),
+    )
+    config.addinivalue_line(
+        "markers",
+        "{0}: reuse the engine of the previous test in the same context with "
+        "its apps as they are instead of resetting them.".format(SHARED_MARKER),
+    )
 
-    # The path to the current repo root
-    try:
-        repo = Repository(cur_dir)
-    except RuntimeError:
-        valid_repo = False
+    workerinput = getattr(config, "workerinput", None)
+    start = timeit.default_timer()
+    if workerinput is not None and "tank_test_bootstrap" in workerinput:
+        bootstrap = workerinput["tank_test_bootstrap"]
     else:
-        # Make sure we're in a toolkit component
-        valid_repo = repo.is_shotgun_component()
-    # If we were unable to construct a Repository object, or if we're not in a
-    # shotgun component repo, bail.
-    if valid_repo is False:
-        print(
-            "%s does not appear to be inside Shotgun repository. Skipping initialization of 'pytest_tank_test.'"
-            % cur_dir
+        bootstrap = compute_bootstrap(os.path.abspath(os.curdir))
+    bootstrap_duration = timeit.default_timer() - start
+
+    config._tank_test_bootstrap = bootstrap
+    config._tank_test_ignore = IgnorePatterns(
+        _DEFAULT_IGNORE_PATTERNS
+        + config.getini("tank_ignore")
+        + (config.getoption("tank_ignore") or [])
+    )
+    config._tank_test_selectors = []
+    config._tank_test_pruner = None
+    config._tank_test_materializer = None
+    config._tank_test_mockgun = None
+    config._tank_test_engine_pool = None
+    config._tank_test_logging_pending = False
+    config._tank_test_logging_duration = None
+    config._tank_test_timer = None
+    config._tank_test_prewarm = None
+    config._tank_test_log_queue = None
+    config._tank_test_log_reporter = None
+    if bootstrap is not None:
+        _apply_bootstrap(config, bootstrap)
+        _register_impact_plugins(
+            config, bootstrap["environment"]["SHOTGUN_CURRENT_REPO_ROOT"]
+        )
+        _register_timer(config, bootstrap_duration)
+        _register_log_reporter(config)
+        _register_forker(config)
+        _register_sharding(config)
+        _register_pruner(config)
+
+    config._tank_test_startup_duration = timeit.default_timer() - _PLUGIN_IMPORT_TIME
+
+
+def _ensure_logging_initialized(config):
+    """
+    Sets up Toolkit logging the first time a test runs after Toolkit was imported.
+
+    Runs that never import Toolkit, like ``--collect-only`` or runs selecting
+    tests that do not use Toolkit, never pay for the import and the log file.
+    """
+    if not config._tank_test_logging_pending or "tank" not in sys.modules:
+        return
+
+    config._tank_test_logging_pending = False
+    start = timeit.default_timer()
+    _initialize_logging(config)
+    config._tank_test_logging_duration = timeit.default_timer() - start
+    if config._tank_test_timer is not None:
+        config._tank_test_timer.record("logging", config._tank_test_logging_duration)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    """
+    Initializes logging before the fixtures of a test using Toolkit are set up.
+    """
+    _ensure_logging_initialized(item.config)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_call(item):
+    """
+    Initializes logging if the fixtures of the test imported Toolkit.
+    """
+    _ensure_logging_initialized(item.config)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """
+    Writes the queued Toolkit logs when a test fails, so the log file is
+    complete by the time the failure is reported.
+    """
+    outcome = yield
+    log_queue = getattr(item.config, "_tank_test_log_queue", None)
+    if log_queue is not None and outcome.get_result().failed:
+        log_queue.flush()
+
+
+def pytest_unconfigure(config):
+    """
+    Writes the queued Toolkit logs and stops the background thread.
+    """
+    log_queue = getattr(config, "_tank_test_log_queue", None)
+    if log_queue is not None:
+        log_queue.stop()
+        config._tank_test_log_queue = None
+
+
+def pytest_report_header(config):
+    """
+    Reports how long it took for the plugin to configure the environment.
+    """
+    if getattr(config, "_tank_test_bootstrap", None) is None:
+        return None
+    lines = [
+        "pytest_tank_test: ready {0:.3f}s after the plugin was imported".format(
+            config._tank_test_startup_duration
         )
+    ]
+    if config._tank_test_prewarm is not None:
+        lines.append("pytest_tank_test: {0}".format(config._tank_test_prewarm))
+    return "\n".join(lines)
+
+
+def pytest_terminal_summary(terminalreporter):
+    """
+    Reports how long it took to initialize Toolkit logging, if it was needed.
+    """
+    config = terminalreporter.config
+    if getattr(config, "_tank_test_bootstrap", None) is None:
         return
 
-    print("Repository found at {0}".format(repo.root))
-
-    # tk-toolchain assumes that the other repositories are clone alongside
-    # the current one with their real name. However, for the current repo,
-    # we can't make such an assumption.
-    #
-    # On Azure Pipeline for example, when testing an app we will clone alongside
-    # the repo all the dependencies, including tk-core, which means we'll have
-    # control over the folder names used for the repositories. However, when
-    # Azure runs a build for tk-core, it will clone it inside a folder not named
-    # after the repo. As such, we have to use whatever name we're given for
-    # tk-core.
-    if repo.is_tk_core() is False:
-        tk_core_repo_root = os.path.join(repo.parent, "tk-core")
+    if config._tank_test_materializer is not None:
+        terminalreporter.write_line(
+            "pytest_tank_test: {0}".format(
+                config._tank_test_materializer.format_stats()
+            )
+        )
+
+    if config._tank_test_mockgun is not None:
+        terminalreporter.write_line(
+            "pytest_tank_test: {0}".format(config._tank_test_mockgun.format_stats())
+        )
+
+    if config._tank_test_engine_pool is not None:
+        terminalreporter.write_line(
+            "pytest_tank_test: {0}".format(config._tank_test_engine_pool.format_stats())
+        )
+
+    if config._tank_test_logging_duration is None:
+        terminalreporter.write_line(
+            "pytest_tank_test: Toolkit was not imported by the tests, "
+            "logging was not initialized."
+        )
     else:
-        tk_core_repo_root = repo.root
+        terminalreporter.write_line(
+            "pytest_tank_test: Toolkit logging initialized in {0:.3f}s".format(
+                config._tank_test_logging_duration
+            )
+        )
+
 
-    # Adds the tk-core/python folder to the PYTHONPATH so we can import Toolkit
-    _update_sys_path("Adding Toolkit folder", os.path.join(tk_core_repo_root, "python"))
+@pytest.fixture(scope="session")
+def tank_fixture_materializer(request, tmpdir_factory):
+    """
+    Materializes the fixtures of the repository for the whole test session.
 
-    # Now that Toolkit has been added to the PYTHONPATH, we can set up logging.
-    _initialize_logging()
+    Each fixture is copied once into a snapshot, from which tests get private
+    views. See :class:`pytest_tank_test.materializer.FixtureMaterializer`.
+    """
+    config = request.config
+    fixtures_root = os.environ.get("TK_TEST_FIXTURES")
+    if fixtures_root is None:
+        pytest.fail("TK_TEST_FIXTURES is not set, is this a Shotgun repository?")
 
-    # Adds the tk-core/tests/python folder to the PYTHONPATH so TanTestBase
-    # is available.
-    _update_sys_path(
-        "Adding Toolkit test framework",
-        os.path.join(tk_core_repo_root, "tests", "python"),
+    config._tank_test_materializer = FixtureMaterializer(
+        fixtures_root,
+        str(tmpdir_factory.mktemp("tank-fixtures")),
+        config.getoption("tank_fixtures_mode"),
     )
+    return config._tank_test_materializer
+
+
+@pytest.fixture
+def tank_fixture(tmpdir, tank_fixture_materializer):
+    """
+    Factory creating private copies of the repository's fixtures for a test.
+
+    For example, ``tank_fixture("config")`` returns the path to a copy of
+    ``tests/fixtures/config`` that the test can modify freely.
+    """
+    names = []
 
-    # Add the <current-repo>/tests/python folder to the PYTHONPATH so custom
-    # python modules from it can be used in the tests.
-    # If we're running tests inside tk-core, we shouldn't add it as tk-toolchain
-    # includes everything we need.
-    if repo.is_tk_core() is False:
-        _update_sys_path(
-            "Adding repository tests/python folder",
-            os.path.join(repo.root, "tests", "python"),
+    def materialize(name):
+        names.append(name)
+        # Each view gets its own folder so a fixture can be requested twice.
+        destination = tmpdir.mkdir("tank-fixture-{0}".format(len(names)))
+        return tank_fixture_materializer.materialize(
+            name, str(destination.join(os.path.basename(name)))
         )
 
-    util.merge_into_environment_variables(repo.get_roots_environment_variables())
-    util.merge_into_environment_variables(get_test_engine_enviroment())
+    yield materialize
 
-    print("Fixtures found at", os.path.join(repo.root, "tests", "fixtures"))
-    # Note: This won't be documented (or renamed) as we're not super comfortable
-    # supporting TankTestBase at the moment for clients to write tests with.
-    os.environ["TK_TEST_FIXTURES"] = os.path.join(repo.root, "tests", "fixtures")
+    if tank_fixture_materializer.mode == FixtureMaterializer.HARDLINK:
+        for name in names:
+            tank_fixture_materializer.check_snapshot(name)
+
+
+@pytest.fixture(scope="session")
+def tank_mockgun_snapshots(request):
+    """
+    Mock Shotgun databases built once for the whole test session.
+
+    See :class:`pytest_tank_test.mockgun_snapshots.MockgunSnapshots`.
+    """
+    request.config._tank_test_mockgun = MockgunSnapshots()
+    return request.config._tank_test_mockgun
+
+
+@pytest.fixture
+def tank_mockgun(tank_mockgun_snapshots):
+    """
+    Factory creating mock Shotgun connections with a private database.
+
+    ``tank_mockgun()`` returns a connection using tk-core's test schema and an
+    empty database. ``tank_mockgun(seed="tests/fixtures/entities.yml")`` seeds
+    the database with the entities of a JSON or YAML file, relative to the
+    repository root, and ``schema`` selects another schema folder. Each schema
+    and seed file is only loaded once per session.
+    """
+
+    def clone(seed=None, schema=None):
+        repo_root = os.environ.get("SHOTGUN_CURRENT_REPO_ROOT", os.getcwd())
+        return tank_mockgun_snapshots.clone(
+            os.path.join(repo_root, schema) if schema else get_default_schema_folder(),
+            os.path.join(repo_root, seed) if seed else None,
+        )
+
+    return clone
+
+
+@pytest.fixture(scope="session")
+def tank_engine_pool(request):
+    """
+    Engine kept running for the whole test session.
+
+    See :class:`pytest_tank_test.engine_pool.EnginePool`.
+    """
+    request.config._tank_test_engine_pool = EnginePool()
+    yield request.config._tank_test_engine_pool
+    request.config._tank_test_engine_pool.destroy()
+
+
+@pytest.fixture(scope="session")
+def tank_engine_name():
+    """
+    Name of the engine instance started by the tank_engine fixture.
+    """
+    return "tk-testengine"
+
+
+@pytest.fixture(scope="session")
+def tank_engine_tk():
+    """
+    The Toolkit instance the tank_engine fixture starts the engine with.
+
+    Override this fixture to return the :class:`sgtk.Sgtk` instance of the
+    pipeline configuration of your tests. The engine is only reused by tests
+    using the same pipeline configuration, so it should be created once.
+    """
+    pytest.fail(
+        "Override the tank_engine_tk fixture to return the Toolkit instance "
+        "the tank_engine fixture starts the engine with."
+    )
+
+
+@pytest.fixture
+def tank_engine_context(tank_engine_tk):
+    """
+    The context of the engine handed out by the tank_engine fixture.
+
+    Defaults to an empty context. Override this fixture to run tests in
+    another context.
+    """
+    return tank_engine_tk.context_empty()
+
+
+@pytest.fixture
+def tank_engine(
+    request, tank_engine_pool, tank_engine_name, tank_engine_tk, tank_engine_context
+):
+    """
+    An engine running in the context of the test.
+
+    The engine is started once and reused by the following tests, changing
+    its context when ``tank_engine_context`` differs. Tests in the same
+    context as the previous test get the engine with its apps reset, unless
+    they are marked ``tank_engine_shared``. Dialogs left open are closed after each
+    test. Tests marked ``tank_engine_isolated`` get a newly started engine,
+    destroyed after the test.
+    """
+    isolated = request.node.get_closest_marker(ISOLATED_MARKER) is not None
+    shared = request.node.get_closest_marker(SHARED_MARKER) is not None
+    engine = tank_engine_pool.acquire(
+        tank_engine_name, tank_engine_tk, tank_engine_context, isolated, shared
+    )
+    yield engine
+    tank_engine_pool.release(isolated)
+
+
+@pytest.fixture
+def tank_log_capture():
+    """
+    Captures the records logged by Toolkit during a test.
+
+    The fixture is a :class:`logging.Handler` with the ``records`` captured so
+    far, their formatted ``text`` and a ``clear`` method.
+    """
+    import tank
+
+    capture = LogCapture(None)
+    logger = tank.LogManager().root_logger
+    logger.addHandler(capture)
+    yield capture
+    logger.removeHandler(capture)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    """
+    Hands the environment discovered by the controller to a pytest-xdist worker.
+
+    This hook is only called when pytest-xdist is installed.
+    """
+    node.workerinput["tank_test_bootstrap"] = node.config._tank_test_bootstrap
 
 
 def pytest_ignore_collect(path, config):
     """
-    Ignore unit tests for third parties found inside tk-core and any Python
-    source file inside tests/fixtures.
+    Ignore unit tests for third parties found inside tk-core, any Python
+    source file inside tests/fixtures and paths matching the tank_ignore
+    patterns. Also skips test modules whose tests would all be deselected.
     """
-    return os.path.join("tests", "python", "third_party") in str(path) or os.path.join(
-        "tests", "fixtures"
-    ) in str(path)
+    path = str(path)
+    if config._tank_test_ignore.matches(path):
+        return True
+    if config._tank_test_pruner is not None and config._tank_test_pruner.is_pruned(
+        path
+    ):
+        return True
+    return None
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Speeds up the collection of the tests.
+
+Ignored paths are matched with a single precompiled regular expression, and
+the node ids found in each test module are remembered across runs so that
+modules whose tests would all be deselected don't need to be imported.
+"""
+
+import os
+import re
+
+import pytest
+
+
+class IgnorePatterns(object):
+    """
+    Glob patterns of paths that should not be collected.
+
+    A pattern matches a path if it matches any number of its trailing
+    components, so ``tests/fixtures`` matches ``/repo/tests/fixtures``
+    and everything it contains.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param list patterns: Glob patterns, using forward slashes.
+        """
+        self._patterns = list(patterns)
+        if self._patterns:
+            self._regex = re.compile(
+                "|".join(
+                    "(?:^|.*/){0}(?:/.*)?$".format(_translate(pattern.strip("/")))
+                    for pattern in self._patterns
+                ),
+                re.DOTALL,
+            )
+        else:
+            self._regex = None
+
+    @property
+    def patterns(self):
+        """
+        List of the patterns.
+        """
+        return list(self._patterns)
+
+    def matches(self, path):
+        """
+        Check if a path should be ignored.
+
+        :param str path: Path to check.
+
+        :returns: ``True`` if the path matches a pattern, ``False`` otherwise.
+        """
+        if self._regex is None:
+            return False
+        return self._regex.match(path.replace(os.path.sep, "/")) is not None
+
+
+class CollectionIndex(object):
+    """
+    Node ids of the tests found in each test module during previous runs.
+
+    A module's entry is only used if the module and the ``conftest.py`` files
+    that apply to it didn't change, based on their sizes and modification
+    times.
+    """
+
+    # Bump this whenever the format of the index changes.
+    _CACHE_KEY = "tank/collection-v1"
+
+    def __init__(self, cache, rootdir):
+        """
+        :param cache: The pytest cache object.
+        :param str rootdir: Root folder of the test session.
+        """
+        self._cache = cache
+        self._rootdir = rootdir
+        data = cache.get(self._CACHE_KEY, None)
+        if isinstance(data, dict) and data.get("rootdir") == rootdir:
+            self._modules = data["modules"]
+        else:
+            self._modules = {}
+        self._is_dirty = False
+
+    def get_nodeids(self, path):
+        """
+        Get the node ids of the tests of a module.
+
+        :param str path: Path to the test module.
+
+        :returns: List of node ids or ``None`` if the module changed since
+            it was last collected.
+        """
+        entry = self._modules.get(self._get_key(path))
+        if entry is None or entry["signature"] != self._get_signature(path):
+            return None
+        return entry["nodeids"]
+
+    def update(self, path, nodeids):
+        """
+        Remember the node ids of the tests of a module.
+
+        :param str path: Path to the test module.
+        :param list nodeids: Node ids of the tests found in the module.
+        """
+        key = self._get_key(path)
+        entry = {"signature": self._get_signature(path), "nodeids": list(nodeids)}
+        if self._modules.get(key) != entry:
+            self._modules[key] = entry
+            self._is_dirty = True
+
+    def save(self):
+        """
+        Write the index to the pytest cache if it was updated.
+
+        Modules that no longer exist are forgotten.
+        """
+        for key in list(self._modules):
+            if not os.path.exists(os.path.join(self._rootdir, key)):
+                del self._modules[key]
+                self._is_dirty = True
+
+        if self._is_dirty:
+            self._cache.set(
+                self._CACHE_KEY, {"rootdir": self._rootdir, "modules": self._modules}
+            )
+            self._is_dirty = False
+
+    def _get_key(self, path):
+        """
+        Get the key of a module in the index.
+        """
+        return os.path.relpath(path, self._rootdir).replace(os.path.sep, "/")
+
+    def _get_signature(self, path):
+        """
+        Describe the state of a module and of the conftest.py files applying to it.
+
+        :returns: A list of [size, mtime] pairs.
+        """
+        paths = [path]
+        folder = os.path.dirname(path)
+        while True:
+            paths.append(os.path.join(folder, "conftest.py"))
+            if folder == self._rootdir or os.path.dirname(folder) == folder:
+                break
+            folder = os.path.dirname(folder)
+
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signature.append(None)
+            else:
+                signature.append([stat.st_size, stat.st_mtime])
+        return signature
+
+
+class CollectionPruner(object):
+    """
+    Prunes test modules whose tests would all be deselected.
+
+    Registered as a pytest plugin by pytest_tank_test. Selectors, like
+    :class:`pytest_tank_test.impact.ImpactSelector`, are callables taking a
+    node id and returning ``False`` if the test will be deselected.
+    """
+
+    def __init__(self, index, selectors, update_index=True):
+        """
+        :param index: A :class:`CollectionIndex`.
+        :param list selectors: Callables deciding if a test will be run.
+        :param bool update_index: If ``False``, the node ids collected are not
+            remembered, for example because only some tests of a module
+            were requested.
+        """
+        self._index = index
+        self._selectors = selectors
+        self._update_index = update_index
+        self._pruned_modules = 0
+        self._pruned_tests = 0
+
+    def is_pruned(self, path):
+        """
+        Check if a test module doesn't need to be collected.
+
+        :param str path: Path to the module.
+
+        :returns: ``True`` if every test of the module is known and will be
+            deselected, ``False`` otherwise.
+        """
+        if not self._selectors or not path.endswith(".py"):
+            return False
+
+        nodeids = self._index.get_nodeids(path)
+        if not nodeids:
+            return False
+
+        for nodeid in nodeids:
+            if all(selector(nodeid) for selector in self._selectors):
+                return False
+
+        self._pruned_modules += 1
+        self._pruned_tests += len(nodeids)
+        return True
+
+    @property
+    def pruned_tests(self):
+        """
+        Number of tests that were not collected.
+        """
+        return self._pruned_tests
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, items):
+        """
+        Remembers the node ids of the modules that were collected, before
+        any of them are deselected.
+        """
+        if not self._update_index:
+            return
+
+        modules = {}
+        for item in items:
+            modules.setdefault(str(item.fspath), []).append(item.nodeid)
+        for path, nodeids in modules.items():
+            self._index.update(path, nodeids)
+        self._index.save()
+
+    def pytest_report_collectionfinish(self):
+        """
+        Reports how many tests were pruned.
+        """
+        if not self._pruned_modules:
+            return None
+        return (
+            "pytest_tank_test: skipped collecting {0} module(s) whose {1} test(s) "
+            "would not be selected".format(self._pruned_modules, self._pruned_tests)
+        )
+
+
+def _translate(pattern):
+    """
+    Convert a glob pattern to an unanchored regular expression.
+
+    Unlike :func:`fnmatch.translate`, ``*`` and ``?`` don't match slashes and
+    the expression is not anchored.
+
+    :param str pattern: Glob pattern.
+
+    :returns: A regular expression.
+    """
+    parts = []
+    for part in re.split(r"(\*|\?)", pattern):
+        if part == "*":
+            parts.append("[^/]*")
+        elif part == "?":
+            parts.append("[^/]")
+        elif part:
+            parts.append(re.escape(part))
+    return "".join(parts)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Keeps an engine running between tests.
+
+Starting and destroying an engine for each test takes seconds. The pool instead
+starts an engine once and hands it to the following tests that need another
+context, switching its context, which reloads the apps whose settings differ
+between the contexts. Changing to the context the engine already runs in
+wouldn't reload any app, so for a test in the same context as the previous one
+the apps are reset in place instead, unless the test is marked
+``tank_engine_shared``. Tests marked ``tank_engine_isolated`` get a newly
+started engine, which is destroyed once they are done.
+"""
+
+import timeit
+
+# Marker of the tests needing an engine of their own.
+ISOLATED_MARKER = "tank_engine_isolated"
+
+# Marker of the tests accepting the apps left by a previous test in the same
+# context.
+SHARED_MARKER = "tank_engine_shared"
+
+
+class EnginePool(object):
+    """
+    Hands out a long-lived engine.
+    """
+
+    def __init__(self, platform=None):
+        """
+        :param platform: The ``sgtk.platform`` module. Defaults to the one of
+            the Toolkit core being tested.
+        """
+        if platform is None:
+            import sgtk
+
+            platform = sgtk.platform
+        self._platform = platform
+        self._engine = None
+        self._stats = {
+            "starts": 0,
+            "resets": 0,
+            "context_changes": 0,
+            "reuses": 0,
+            "start_duration": 0.0,
+            "reset_duration": 0.0,
+            "context_change_duration": 0.0,
+        }
+
+    @property
+    def engine(self):
+        """
+        The engine of the pool, if it is running.
+        """
+        return self._engine
+
+    @property
+    def stats(self):
+        """
+        Dictionary with the number of engine ``starts``, app ``resets``,
+        ``context_changes`` and ``reuses`` and the time spent starting engines
+        (``start_duration``), resetting their apps (``reset_duration``) and
+        changing their context (``context_change_duration``), in seconds.
+        """
+        return dict(self._stats)
+
+    def format_stats(self):
+        """
+        Describe the work done by the pool.
+
+        :returns: A human readable string.
+        """
+        stats = dict(self._stats)
+        stats["saved"] = 0.0
+        if stats["starts"]:
+            # Every test handed an existing engine would have started one.
+            stats["saved"] = max(
+                0.0,
+                (stats["reuses"] + stats["resets"] + stats["context_changes"])
+                * stats["start_duration"]
+                / stats["starts"]
+                - stats["reset_duration"]
+                - stats["context_change_duration"],
+            )
+        return (
+            "started {starts} engine(s) in {start_duration:.3f}s, "
+            "reset their apps {resets} time(s) in {reset_duration:.3f}s, "
+            "reused them {reuses} time(s) and changed their context "
+            "{context_changes} time(s) in {context_change_duration:.3f}s, "
+            "saving about {saved:.3f}s".format(**stats)
+        )
+
+    def acquire(self, engine_name, tk, context, isolated=False, shared=False):
+        """
+        Get a running engine.
+
+        The engine of the pool is reused if it has the same name and
+        pipeline configuration and is still the current engine. Its context is
+        changed if needed, otherwise its apps are reset, unless the test
+        shares the apps of the previous test. If the engine can't be reused,
+        any current engine is destroyed and a new one is started.
+
+        :param str engine_name: Name of the engine instance, like
+            ``tk-testengine``.
+        :param tk: The :class:`sgtk.Sgtk` instance the engine runs with.
+        :param context: The :class:`sgtk.Context` of the test.
+        :param bool isolated: If ``True``, a new engine is always started.
+        :param bool shared: If ``True``, an engine already running in the
+            context is reused with its apps as they are, without resetting them.
+
+        :returns: The engine.
+        """
+        if isolated or not self._is_reusable(engine_name, tk):
+            self.destroy()
+            self._start(engine_name, tk, context)
+        elif self._engine.context != context:
+            start = timeit.default_timer()
+            self._engine.change_context(context)
+            self._stats["context_changes"] += 1
+            self._stats["context_change_duration"] += timeit.default_timer() - start
+        elif shared:
+            self._stats["reuses"] += 1
+        else:
+            # Changing to the same context keeps every app as it is.
+            start = timeit.default_timer()
+            _reset_apps(self._engine)
+            self._stats["resets"] += 1
+            self._stats["reset_duration"] += timeit.default_timer() - start
+
+        # Tests only see the records logged while they run.
+        log_buffer = getattr(self._engine, "log_buffer", None)
+        if log_buffer is not None:
+            log_buffer.flush()
+            log_buffer.clear()
+        return self._engine
+
+    def release(self, isolated=False):
+        """
+        Hand the engine back to the pool once a test is done.
+
+        The dialogs the test left open are closed and the log lines waiting
+        to be printed are written. Engines of isolated tests are destroyed.
+
+        :param bool isolated: If ``True``, the engine was acquired by an
+            isolated test.
+        """
+        if isolated:
+            self.destroy()
+            return
+        if self._engine is None:
+            return
+        for dialog in list(getattr(self._engine, "created_qt_dialogs", [])):
+            dialog.close()
+        # Lines still waiting to be printed belong to the output of this test.
+        log_buffer = getattr(self._engine, "log_buffer", None)
+        if log_buffer is not None:
+            log_buffer.flush()
+
+    def destroy(self):
+        """
+        Destroy the current engine, if any.
+        """
+        engine = self._platform.current_engine()
+        if engine is not None:
+            engine.destroy()
+        self._engine = None
+
+    def _is_reusable(self, engine_name, tk):
+        """
+        Check if the engine of the pool can be handed to a test.
+        """
+        engine = self._engine
+        return (
+            engine is not None
+            and engine is self._platform.current_engine()
+            and engine.instance_name == engine_name
+            and _get_config_path(engine.sgtk) == _get_config_path(tk)
+        )
+
+    def _start(self, engine_name, tk, context):
+        """
+        Start a new engine.
+        """
+        start = timeit.default_timer()
+        self._engine = self._platform.start_engine(engine_name, tk, context)
+        self._stats["starts"] += 1
+        self._stats["start_duration"] += timeit.default_timer() - start
+
+
+def _reset_apps(engine):
+    """
+    Reset the apps of an engine in place.
+
+    Each app is destroyed and initialized again, the way the engine does when
+    it starts, after forgetting the commands and panels it registered so it
+    can register them again.
+    """
+    for app in engine.apps.values():
+        for registry in (engine.commands, getattr(engine, "panels", {})):
+            for name, entry in list(registry.items()):
+                if (entry.get("properties") or {}).get("app") is app:
+                    del registry[name]
+        app.destroy_app()
+        app.init_app()
+
+
+def _get_config_path(tk):
+    """
+    Identify the pipeline configuration of a Toolkit instance.
+    """
+    return tk.pipeline_configuration.get_path()
@@ -0,0 +1,769 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Runs tests in processes forked from a parent that already imported Toolkit.
+
+Importing tk-core, the Qt bindings and TankTestBase takes seconds. A warm
+parent pays for it once and forks fresh children, which inherit the imported
+modules without sharing any other state:
+
+- ``--tank-fork=module`` makes the pytest process import everything once and
+  run each test module in its own forked child.
+- :class:`ForkServer` is a daemon, started by ``tk-test-forkserver``, that
+  stays warm across runs and forks a child for each pytest run.
+
+Forking requires a POSIX platform.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+import timeit
+import traceback
+
+import pytest
+import six
+
+from tk_toolchain import util
+
+# Modules imported by the warm parent. Failures to import them are reported
+# but not fatal, so the same list works for any repository.
+DEFAULT_PREWARM_MODULES = ["tank", "sgtk", "tank_test.tank_test_base"]
+
+# Imports the Qt binding Toolkit would use, without creating a QApplication,
+# which can't survive a fork.
+_QT_IMPORTER_MODULE = "tank.util.qt_importer"
+
+# Values of --tank-fork.
+FORK_MODULE = "module"
+FORK_MODES = [FORK_MODULE]
+
+
+class StaleServerError(RuntimeError):
+    """
+    Raised when a fork server refuses to run tests because the sources it
+    imported were modified since it started.
+    """
+
+
+def is_supported():
+    """
+    Check if processes can be forked on this platform.
+
+    :returns: ``True`` on POSIX platforms, ``False`` otherwise.
+    """
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+def prewarm(modules):
+    """
+    Import modules, along with the Qt binding Toolkit uses if Toolkit was imported.
+
+    :param list modules: Names of the modules to import.
+
+    :returns: A list of (name, duration, error) tuples, where error is ``None``
+        if the module was imported successfully.
+    """
+    results = []
+    for name in modules:
+        start = timeit.default_timer()
+        try:
+            __import__(name)
+        except Exception as e:
+            error = "{0}: {1}".format(type(e).__name__, e)
+        else:
+            error = None
+        results.append((name, timeit.default_timer() - start, error))
+
+    if "tank" in sys.modules:
+        start = timeit.default_timer()
+        try:
+            __import__(_QT_IMPORTER_MODULE)
+            sys.modules[_QT_IMPORTER_MODULE].QtImporter()
+        except Exception as e:
+            error = "{0}: {1}".format(type(e).__name__, e)
+        else:
+            error = None
+        results.append(("Qt", timeit.default_timer() - start, error))
+
+    return results
+
+
+def format_prewarm(results):
+    """
+    Summarize the result of :func:`prewarm`.
+
+    :param list results: Result of :func:`prewarm`.
+
+    :returns: A one line description.
+    """
+    imported = [name for name, _, error in results if error is None]
+    failed = [name for name, _, error in results if error is not None]
+    message = "prewarmed {0} in {1:.3f}s".format(
+        ", ".join(imported) or "nothing", sum(duration for _, duration, _ in results),
+    )
+    if failed:
+        message += " (could not import {0})".format(", ".join(failed))
+    return message
+
+
+def get_returncode(status):
+    """
+    Convert the exit status returned by :func:`os.waitpid` into a return code.
+
+    :param int status: Exit status of a process.
+
+    :returns: The exit code of the process or, like shells do, 128 plus the
+        number of the signal that killed it.
+    """
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def describe_status(status):
+    """
+    Describe how a process ended.
+
+    :param int status: Exit status of a process, as returned by :func:`os.waitpid`.
+
+    :returns: A description like ``exited with code 1``.
+    """
+    if os.WIFSIGNALED(status):
+        return "was killed by signal {0}".format(os.WTERMSIG(status))
+    return "exited with code {0}".format(os.WEXITSTATUS(status))
+
+
+def call_forked(function):
+    """
+    Call a function in a forked child process.
+
+    :param function: Callable taking a ``send`` callable, which sends a
+        JSON serializable value back to the parent.
+
+    :returns: A tuple of (list of the values sent by the child, exit status of
+        the child). The child exits with code 1 if the function raised.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.close(read_fd)
+            with os.fdopen(write_fd, "w") as fh:
+
+                def send(data):
+                    fh.write(json.dumps(data) + "\n")
+                    fh.flush()
+
+                function(send)
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            _exit(code)
+
+    os.close(write_fd)
+    messages = []
+    with os.fdopen(read_fd, "r") as fh:
+        for line in fh:
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                # The child died in the middle of a message.
+                break
+    _, status = _waitpid(pid, 0)
+    return messages, status
+
+
+class ModuleForker(object):
+    """
+    Runs the tests of each module in a child forked from the pytest process.
+
+    The reports of the child are sent back to the parent and replayed, so
+    terminal output and the other plugins see them as usual. The tests of a
+    module are expected to run one after the other in this process, which is
+    not the case under pytest-xdist.
+    Registered as a pytest plugin when ``--tank-fork=module`` is set.
+    """
+
+    def __init__(self, config):
+        """
+        :param config: The pytest config object.
+        """
+        self._config = config
+        self._module = None
+        self._reports = {}
+        self.forks = 0
+        self.crashes = 0
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        """
+        Runs the tests of a module in a child the first time one of its tests
+        is about to run, then reports the results of the test.
+        """
+        module = _get_module(item.nodeid)
+        if module != self._module:
+            self._module = module
+            self._reports = self._run_module(item)
+
+        item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        for report in self._reports.pop(item.nodeid):
+            item.ihook.pytest_runtest_logreport(report=report)
+        item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+        return True
+
+    def _run_module(self, item):
+        """
+        Runs the tests of the module of an item in a forked child.
+
+        :returns: Dictionary of the list of reports of each test, indexed by
+            node id.
+        """
+        from _pytest.runner import runtestprotocol
+
+        items = item.session.items
+        start = items.index(item)
+        end = start
+        while end < len(items) and _get_module(items[end].nodeid) == self._module:
+            end += 1
+        items = items[start:end]
+        config = self._config
+
+        def run(send):
+            for index, test in enumerate(items):
+                # The last test of the module tears down every fixture, so the
+                # child cleans up after itself.
+                next_test = items[index + 1] if index + 1 < len(items) else None
+                for report in runtestprotocol(test, nextitem=next_test, log=False):
+                    send(
+                        config.hook.pytest_report_to_serializable(
+                            config=config, report=report
+                        )
+                    )
+
+        self.forks += 1
+        messages, status = call_forked(run)
+
+        reports = dict((test.nodeid, []) for test in items)
+        for data in messages:
+            report = config.hook.pytest_report_from_serializable(
+                config=config, data=data
+            )
+            reports[report.nodeid].append(report)
+
+        for test in items:
+            if not any(report.when == "teardown" for report in reports[test.nodeid]):
+                self.crashes += 1
+                reports[test.nodeid].append(_get_crash_report(test, status))
+        return reports
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """
+        Reports how many children were forked.
+        """
+        message = "pytest_tank_test: ran {0} module(s) in forked processes".format(
+            self.forks
+        )
+        if self.crashes:
+            message += ", {0} test(s) did not complete".format(self.crashes)
+        terminalreporter.write_line(message)
+
+
+def _get_module(nodeid):
+    """
+    Get the path of the module of a test from its node id.
+    """
+    return nodeid.split("::", 1)[0]
+
+
+def _get_crash_report(item, status):
+    """
+    Build the report of a test whose child process died before it completed.
+    """
+    from _pytest.reports import TestReport
+
+    return TestReport(
+        item.nodeid,
+        item.location,
+        dict((keyword, 1) for keyword in item.keywords),
+        "failed",
+        "The process running {0} {1} before the test completed.".format(
+            _get_module(item.nodeid), describe_status(status)
+        ),
+        "call",
+    )
+
+
+def get_socket_location(repo_root):
+    """
+    Get the location of the socket of the fork server of a repository.
+
+    There is one server per repository and Python interpreter, since the
+    modules it imports depend on both. The name is kept short because
+    paths of Unix sockets are limited to about a hundred characters.
+
+    :param str repo_root: Root of the repository being tested.
+
+    :returns: Path to a file in the tk-toolchain cache folder.
+    """
+    key = hashlib.sha1(
+        six.ensure_binary("{0}\n{1}".format(sys.executable, repo_root))
+    ).hexdigest()
+    return util.get_cache_location("forkserver", "{0}.sock".format(key[:16]))
+
+
+def get_watched_files(roots):
+    """
+    Find the source files of the imported modules that are inside some folders.
+
+    :param list roots: Folders containing the sources that may be modified,
+        like tk-core's python folder.
+
+    :returns: List of paths.
+    """
+    roots = [os.path.join(os.path.abspath(root), "") for root in roots]
+    paths = set()
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if not path:
+            continue
+        path = os.path.abspath(path)
+        if path.endswith((".pyc", ".pyo")):
+            path = path[:-1]
+        if any(path.startswith(root) for root in roots):
+            paths.add(path)
+    return sorted(paths)
+
+
+def _get_signature(paths):
+    """
+    Describe the state of some files.
+
+    :returns: A list of [size, mtime] pairs.
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append([stat.st_size, stat.st_mtime])
+    return signature
+
+
+def run_pytest(args):
+    """
+    Run pytest in the current process.
+
+    :param list args: Command line arguments for pytest.
+
+    :returns: The exit code of pytest.
+    """
+    import pytest_tank_test
+
+    # The header reports the startup time of this run, not of the server.
+    pytest_tank_test._PLUGIN_IMPORT_TIME = timeit.default_timer()
+    return int(pytest.main(list(args)))
+
+
+class ForkServer(object):
+    """
+    Daemon forking a child for each test run it is asked to perform.
+
+    Clients hand their standard input and outputs to the server, which
+    passes them to the child, so the output of the tests goes straight to
+    the client's terminal. The server only handles one request at a time,
+    but children run concurrently.
+    """
+
+    def __init__(
+        self, socket_path, watched_files=(), runner=run_pytest, idle_timeout=None
+    ):
+        """
+        :param str socket_path: Path of the Unix socket to listen on.
+        :param list watched_files: Source files of the prewarmed modules. The
+            server stops when they are modified, since children would run
+            stale code.
+        :param runner: Callable running the tests in a child, taking the
+            command line arguments and returning an exit code.
+        :param float idle_timeout: Number of seconds without any test running
+            after which the server stops. ``None`` to run forever.
+        """
+        self._socket_path = socket_path
+        self._watched_files = list(watched_files)
+        self._signature = _get_signature(self._watched_files)
+        self._runner = runner
+        self._idle_timeout = idle_timeout
+        self._started = time.time()
+        self._listener = None
+        self._socket_id = None
+        self._children = {}
+        self._is_stopping = False
+        self.prewarm = []
+
+    def is_stale(self):
+        """
+        Check if the sources of the prewarmed modules were modified.
+
+        :returns: ``True`` if a file changed, ``False`` otherwise.
+        """
+        return _get_signature(self._watched_files) != self._signature
+
+    def serve_forever(self):
+        """
+        Handles requests until asked to stop, the sources are modified or the
+        server was idle for too long.
+
+        Once stopping, the socket is removed right away so a new server can be
+        started, but children that are still running get to report their
+        exit code to their client.
+        """
+        util.ensure_folder_exists(os.path.dirname(self._socket_path), 0o700)
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._listener.bind(self._socket_path)
+            os.chmod(self._socket_path, 0o600)
+            self._socket_id = _get_file_id(self._socket_path)
+            self._listener.listen(16)
+
+            last_activity = time.time()
+            while not self._is_stopping:
+                try:
+                    readable = select.select([self._listener], [], [], 0.05)[0]
+                except (select.error, OSError) as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    readable = []
+
+                if readable:
+                    connection = self._listener.accept()[0]
+                    try:
+                        self._handle(connection)
+                    except Exception:
+                        traceback.print_exc()
+                        connection.close()
+
+                self._reap()
+                if self._children:
+                    last_activity = time.time()
+                elif (
+                    self._idle_timeout is not None
+                    and time.time() - last_activity > self._idle_timeout
+                ):
+                    print("Idle for too long, stopping.")
+                    self._is_stopping = True
+        finally:
+            self._listener.close()
+            # A new server may already be listening at the same location.
+            if _get_file_id(self._socket_path) == self._socket_id:
+                os.remove(self._socket_path)
+
+        while self._children:
+            time.sleep(0.05)
+            self._reap()
+
+    def _handle(self, connection):
+        """
+        Handles a request from a client.
+        """
+        fds = _receive_fds(connection)
+        # The client sends nothing after its request, so nothing is lost by
+        # reading through a buffered file.
+        reader = connection.makefile("rb")
+        try:
+            request = _receive_message(reader)
+        finally:
+            reader.close()
+        command = request.get("command")
+
+        if command == "run" and not self.is_stale():
+            pid = os.fork()
+            if pid == 0:
+                self._run_child(connection, fds, request)
+            for fd in fds:
+                os.close(fd)
+            self._children[pid] = connection
+            _send_message(connection, {"pid": pid})
+            return
+
+        for fd in fds:
+            os.close(fd)
+
+        if command == "run":
+            print("Sources were modified, stopping.")
+            self._is_stopping = True
+            _send_message(connection, {"error": "stale"})
+        elif command == "status":
+            _send_message(
+                connection,
+                {
+                    "pid": os.getpid(),
+                    "started": self._started,
+                    "running": len(self._children),
+                    "stale": self.is_stale(),
+                    "prewarm": self.prewarm,
+                },
+            )
+        elif command == "stop":
+            self._is_stopping = True
+            _send_message(connection, {"pid": os.getpid()})
+        else:
+            _send_message(connection, {"error": "unknown command"})
+        connection.close()
+
+    def _run_child(self, connection, fds, request):
+        """
+        Runs the tests in a forked child. Never returns.
+        """
+        code = 1
+        try:
+            self._listener.close()
+            connection.close()
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+                os.close(fd)
+            # Write to the client's outputs even if the streams of the server
+            # were replaced.
+            sys.stdin, sys.stdout, sys.stderr = (
+                sys.__stdin__,
+                sys.__stdout__,
+                sys.__stderr__,
+            )
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["environment"])
+            sys.argv = ["pytest"] + list(request["args"])
+            # Children must not all generate the same random numbers.
+            random.seed()
+            code = self._runner(request["args"])
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            _exit(code)
+
+    def _reap(self):
+        """
+        Sends the exit codes of the children that ended to their clients.
+        """
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    raise
+                return
+            if pid == 0:
+                return
+            connection = self._children.pop(pid, None)
+            if connection is None:
+                continue
+            try:
+                _send_message(connection, {"returncode": get_returncode(status)})
+            except (IOError, OSError, socket.error):
+                # The client went away.
+                pass
+            connection.close()
+
+
+def send_command(socket_path, command):
+    """
+    Send a command to a fork server.
+
+    :param str socket_path: Path of the socket of the server.
+    :param str command: ``status`` or ``stop``.
+
+    :returns: The response of the server.
+
+    :raises socket.error: If the server is not running.
+    """
+    connection = _send_request(socket_path, {"command": command})
+    reader = connection.makefile("rb")
+    try:
+        return _receive_message(reader)
+    finally:
+        reader.close()
+        connection.close()
+
+
+def run(socket_path, args, cwd=None, environment=None):
+    """
+    Run pytest in a child of a fork server.
+
+    The child uses the standard input and outputs of the current process.
+    Interrupting the current process interrupts the child.
+
+    :param str socket_path: Path of the socket of the server.
+    :param list args: Command line arguments for pytest.
+    :param str cwd: Folder to run pytest from. Defaults to the current folder.
+    :param dict environment: Environment variables of the child. Defaults
+        to the current environment.
+
+    :returns: The exit code of pytest.
+
+    :raises socket.error: If the server is not running.
+    :raises StaleServerError: If the server is stopping because the sources
+        it imported were modified.
+    """
+    connection = _send_request(
+        socket_path,
+        {
+            "command": "run",
+            "args": list(args),
+            "cwd": cwd or os.getcwd(),
+            "environment": dict(os.environ if environment is None else environment),
+        },
+    )
+    reader = connection.makefile("rb")
+    try:
+        response = _receive_message(reader)
+        if response.get("error") == "stale":
+            raise StaleServerError(
+                "The fork server at {0} is out of date.".format(socket_path)
+            )
+        pid = response["pid"]
+        while True:
+            try:
+                return _receive_message(reader)["returncode"]
+            except KeyboardInterrupt:
+                os.kill(pid, signal.SIGINT)
+    finally:
+        reader.close()
+        connection.close()
+
+
+def wait_for_server(socket_path, timeout):
+    """
+    Wait for a fork server to accept requests.
+
+    :param str socket_path: Path of the socket of the server.
+    :param float timeout: Maximum number of seconds to wait.
+
+    :returns: The status of the server, or ``None`` if it didn't start in time.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return send_command(socket_path, "status")
+        except (IOError, OSError, socket.error):
+            if time.time() > deadline:
+                return None
+            time.sleep(0.1)
+
+
+def _send_request(socket_path, request):
+    """
+    Connect to a server and send it a request along with the standard input
+    and outputs of the current process.
+
+    :returns: The connection.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        from multiprocessing import reduction
+
+        for fd in (0, 1, 2):
+            reduction.send_handle(connection, fd, None)
+        _send_message(connection, request)
+    except BaseException:
+        connection.close()
+        raise
+    return connection
+
+
+def _receive_fds(connection):
+    """
+    Receive the standard input and outputs of a client.
+    """
+    from multiprocessing import reduction
+
+    return [reduction.recv_handle(connection) for _ in range(3)]
+
+
+def _send_message(connection, data):
+    """
+    Send a JSON message terminated by a new line.
+    """
+    connection.sendall(six.ensure_binary(json.dumps(data)) + b"\n")
+
+
+def _receive_message(reader):
+    """
+    Receive a JSON message terminated by a new line.
+
+    :param reader: A file object reading from the connection.
+
+    :raises IOError: If the connection was closed before a message was received.
+    """
+    while True:
+        try:
+            line = reader.readline()
+        except (IOError, OSError, socket.error) as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if not line.endswith(b"\n"):
+            raise IOError(
+                errno.EPIPE, "Connection closed before a message was received"
+            )
+        return json.loads(six.ensure_text(line))
+
+
+def _get_file_id(path):
+    """
+    Identify a file, so it can be told apart from a file later created at
+    the same location.
+
+    :returns: A tuple of (device, inode), or ``None`` if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino)
+
+
+def _waitpid(pid, options):
+    """
+    Wait for a process, retrying when interrupted by a signal on Python 2.
+    """
+    while True:
+        try:
+            return os.waitpid(pid, options)
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+
+def _exit(code):
+    """
+    Exit a forked child without running the cleanups of the parent.
+    """
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    os._exit(code)
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Test impact analysis.
+
+While recording, the source files of the repository executed by each test are
+stored in a SQLite database. Later runs can then select only the tests that
+executed a file that changed since a given git reference.
+"""
+
+from __future__ import print_function
+
+import fnmatch
+import hashlib
+import os
+import sqlite3
+import subprocess
+import tempfile
+
+import pytest
+import six
+
+from tk_toolchain import util
+
+# Changes to these files can't affect the outcome of the tests.
+_IGNORED_CHANGES = ["*.md", "*.rst", "*.txt", "docs/*", ".gitignore", "LICENSE"]
+
+
+def get_default_database_location(repo_root):
+    """
+    Get the location of the impact database for a repository.
+
+    :param str repo_root: Root of the repository.
+
+    :returns: Path to the database in the tk-toolchain cache folder.
+    """
+    return util.get_cache_location(
+        "test-impact",
+        "{0}.sqlite".format(hashlib.sha1(six.ensure_binary(repo_root)).hexdigest()),
+    )
+
+
+def git(repo_root, *args):
+    """
+    Run a git command.
+
+    :param str repo_root: Folder to run the command in.
+    :param args: Arguments of the git command.
+
+    :returns: A tuple of (return code, output lines).
+    """
+    process = subprocess.Popen(
+        ["git"] + list(args),
+        cwd=repo_root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output = six.ensure_str(process.communicate()[0])
+    return process.returncode, [line for line in output.splitlines() if line]
+
+
+def get_changed_files(repo_root, ref):
+    """
+    List the files that changed since a git reference, including uncommitted
+    and untracked files.
+
+    :param str repo_root: Root of the repository.
+    :param str ref: Git reference to compare with.
+
+    :returns: Set of paths relative to the root, with forward slashes.
+
+    :raises pytest.UsageError: If the reference is unknown.
+    """
+    code, changed = git(repo_root, "diff", "--name-only", ref)
+    if code != 0:
+        raise pytest.UsageError("Unknown git reference {0}".format(ref))
+    untracked = git(repo_root, "ls-files", "--others", "--exclude-standard")[1]
+    return set(changed) | set(untracked)
+
+
+def get_revision(repo_root):
+    """
+    Describe the state of a repository.
+
+    :param str repo_root: Root of the repository.
+
+    :returns: The commit checked out, suffixed by ``-dirty`` if Python files
+        were modified since, or ``None`` if it's not a git repository.
+    """
+    code, lines = git(repo_root, "rev-parse", "HEAD")
+    if code != 0:
+        return None
+    if any(path.endswith(".py") for path in get_changed_files(repo_root, "HEAD")):
+        return lines[0] + "-dirty"
+    return lines[0]
+
+
+class ImpactDatabase(object):
+    """
+    Maps tests to the source files they executed.
+
+    Every test in the database was recorded at the same revision of the
+    repository. Recording at another revision discards previous records.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the database.
+        """
+        util.ensure_folder_exists(os.path.dirname(path))
+        # Generous timeout as pytest-xdist workers write to the same database.
+        # Transactions are managed explicitly, see record.
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS test_files (
+                nodeid TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (nodeid, path)
+            );
+            CREATE INDEX IF NOT EXISTS test_files_path ON test_files (path);
+            """
+        )
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+    @property
+    def revision(self):
+        """
+        Revision of the repository the tests were recorded at, or ``None``.
+        """
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE key = 'revision'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_tests(self):
+        """
+        :returns: Set of the node ids of every recorded test.
+        """
+        return set(
+            row[0]
+            for row in self._connection.execute(
+                "SELECT DISTINCT nodeid FROM test_files"
+            )
+        )
+
+    def get_affected_tests(self, paths):
+        """
+        Find the tests that executed any of the given files.
+
+        :param paths: Paths relative to the root of the repository.
+
+        :returns: Set of node ids.
+        """
+        tests = set()
+        cursor = self._connection.cursor()
+        for path in paths:
+            cursor.execute("SELECT nodeid FROM test_files WHERE path = ?", (path,))
+            tests.update(row[0] for row in cursor)
+        return tests
+
+    def record(self, revision, executed_files):
+        """
+        Record the files executed by tests.
+
+        :param str revision: Revision of the repository the tests ran at.
+        :param dict executed_files: Node ids mapped to the list of files
+            they executed.
+        """
+        # Lock the database right away so that two workers don't both
+        # decide to discard the records of the other.
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            if self.revision != revision:
+                self._connection.execute("DELETE FROM test_files")
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('revision', ?)", (revision,)
+                )
+            for nodeid, paths in executed_files.items():
+                self._connection.execute(
+                    "DELETE FROM test_files WHERE nodeid = ?", (nodeid,)
+                )
+                self._connection.executemany(
+                    "INSERT INTO test_files VALUES (?, ?)",
+                    [(nodeid, path) for path in set(paths)],
+                )
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+class ImpactRecorder(object):
+    """
+    Records the files of the repository executed by each test.
+
+    Registered as a pytest plugin when ``--tank-record-impact`` is set.
+    """
+
+    def __init__(self, repo_root, database_path):
+        """
+        :param str repo_root: Root of the repository.
+        :param str database_path: Path to the impact database.
+        """
+        import coverage
+
+        self._repo_root = repo_root
+        self._database_path = database_path
+        self._executed_files = {}
+        # The data file is never saved, but erasing the data removes it,
+        # so make sure it doesn't point to a real file.
+        self._coverage = coverage.Coverage(
+            data_file=os.path.join(
+                tempfile.gettempdir(), ".tank-impact-{0}".format(os.getpid())
+            ),
+            # Unlike source, include doesn't report files that were never
+            # executed.
+            include=[os.path.join(repo_root, "*")],
+            config_file=False,
+        )
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        """
+        Measures the files executed by a test, from its setup to its teardown.
+        """
+        self._coverage.start()
+        try:
+            yield
+        finally:
+            self._coverage.stop()
+            data = self._coverage.get_data()
+            files = [path for path in data.measured_files() if data.lines(path)]
+            self._coverage.erase()
+            # The test's module always counts as executed, even if the test
+            # was skipped before its body was reached.
+            self._executed_files[item.nodeid] = [
+                os.path.relpath(path, self._repo_root).replace(os.path.sep, "/")
+                for path in list(files) + [str(item.fspath)]
+            ]
+
+    def pytest_sessionfinish(self, session):
+        """
+        Writes the records to the database.
+        """
+        if not self._executed_files:
+            return
+        revision = get_revision(self._repo_root)
+        if revision is None:
+            print("Test impact was not recorded: not inside a git repository.")
+            return
+        database = ImpactDatabase(self._database_path)
+        try:
+            database.record(revision, self._executed_files)
+        finally:
+            database.close()
+
+
+class ImpactSelector(object):
+    """
+    Deselects tests that are not affected by the changes since a git reference.
+
+    Registered as a pytest plugin when ``--tank-affected`` is set. All the tests
+    are run if the database is missing or was recorded at a revision that
+    doesn't match the reference's Python code.
+    """
+
+    def __init__(self, repo_root, database_path, ref):
+        """
+        :param str repo_root: Root of the repository.
+        :param str database_path: Path to the impact database.
+        :param str ref: Git reference to compare with.
+        """
+        self._repo_root = repo_root
+        self._ref = ref
+        self._affected_tests = None
+        self._report = None
+
+        changed_files = get_changed_files(repo_root, ref)
+        reason = self._get_full_run_reason(database_path, changed_files)
+        if reason:
+            self._report = "running all tests, {0}".format(reason)
+            return
+
+        database = ImpactDatabase(database_path)
+        try:
+            self._known_tests = database.get_tests()
+            self._affected_tests = database.get_affected_tests(changed_files)
+        finally:
+            database.close()
+
+    @property
+    def affected_tests(self):
+        """
+        Node ids of the recorded tests affected by the changes, or ``None`` if
+        every test needs to run.
+        """
+        return self._affected_tests
+
+    def is_selected(self, nodeid):
+        """
+        Check if a test needs to run.
+
+        :param str nodeid: Node id of the test.
+
+        :returns: ``True`` if the test is affected by the changes or was never
+            recorded, ``False`` otherwise.
+        """
+        if self._affected_tests is None:
+            return True
+        return nodeid in self._affected_tests or nodeid not in self._known_tests
+
+    def _get_full_run_reason(self, database_path, changed_files):
+        """
+        Check if the database can be used to select tests.
+
+        :param str database_path: Path to the impact database.
+        :param set changed_files: Files changed since the reference.
+
+        :returns: Why all the tests need to run, or ``None`` if the database
+            can be used.
+        """
+        if not os.path.exists(database_path):
+            return "no test impact was recorded yet (see --tank-record-impact)"
+
+        database = ImpactDatabase(database_path)
+        try:
+            revision = database.revision
+        finally:
+            database.close()
+
+        if revision is None or revision.endswith("-dirty"):
+            return "test impact was recorded with uncommitted changes"
+
+        code, diff = git(self._repo_root, "diff", "--name-only", revision, self._ref)
+        if code != 0:
+            return "test impact was recorded at unknown revision {0}".format(revision)
+        if any(path.endswith(".py") for path in diff):
+            return "test impact was recorded at {0}, which differs from {1}".format(
+                revision[:12], self._ref
+            )
+
+        for path in changed_files:
+            if not path.endswith(".py") and not any(
+                fnmatch.fnmatch(path, pattern) for pattern in _IGNORED_CHANGES
+            ):
+                return "{0} changed and may affect any test".format(path)
+        return None
+
+    def pytest_collection_modifyitems(self, config, items):
+        """
+        Deselects the tests that are not affected by the changes.
+        """
+        selected = []
+        deselected = []
+        for item in items:
+            if self.is_selected(item.nodeid):
+                selected.append(item)
+            else:
+                deselected.append(item)
+
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+        if self._report is None:
+            self._report = "selected {0} of {1} tests affected by changes since {2}".format(
+                len(selected), len(selected) + len(deselected), self._ref
+            )
+
+    def pytest_report_collectionfinish(self, config):
+        """
+        Reports how the tests were selected.
+        """
+        return "pytest_tank_test: {0}".format(self._report)
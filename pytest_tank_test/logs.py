@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Keeps Toolkit logging off the critical path of the tests.
+
+The handlers Toolkit attaches to its root logger are moved behind a queue
+drained by a background thread, so logging a record no longer waits on a
+file write. Records logged by a test can also be kept in memory and shown
+when the test fails.
+"""
+
+import collections
+import logging
+import logging.handlers
+import os
+import weakref
+
+import pytest
+from six.moves import queue
+
+# Maximum number of records waiting to be written. Once reached, logging
+# blocks until the writer catches up instead of dropping records.
+DEFAULT_QUEUE_SIZE = 10000
+
+# Maximum number of records of a test phase shown when it fails.
+DEFAULT_CAPTURE_SIZE = 1000
+
+
+def is_queue_supported():
+    """
+    Check if logging can be queued on this version of Python.
+
+    Python 2 has no QueueHandler. On POSIX, the writer thread also needs to be
+    restarted in forked children, which requires :func:`os.register_at_fork`.
+
+    :returns: ``True`` if logging can be queued, ``False`` otherwise.
+    """
+    return hasattr(logging.handlers, "QueueListener") and (
+        not hasattr(os, "fork") or hasattr(os, "register_at_fork")
+    )
+
+
+class QueuedLogging(object):
+    """
+    Moves the handlers of a logger behind a bounded queue.
+
+    While the records are queued, handlers added to or removed from the logger,
+    like the log file Toolkit replaces when an engine starts, are added to or
+    removed from the handlers behind the queue instead.
+    """
+
+    def __init__(self, logger, size=DEFAULT_QUEUE_SIZE, direct_handlers=()):
+        """
+        :param logger: The logger whose handlers are moved.
+        :param int size: Maximum number of records waiting to be written.
+        :param direct_handlers: Handlers left on the logger, which receive the
+            records as soon as they are logged.
+        """
+        self._logger = logger
+        self._size = size
+        self._direct_handlers = list(direct_handlers)
+        self._handlers = []
+        self._queue_handler = None
+        self._listener = None
+        self._shadowed = {}
+
+    @property
+    def handlers(self):
+        """
+        Handlers the records are written to by the background thread.
+        """
+        return list(self._handlers)
+
+    def start(self):
+        """
+        Replaces the handlers of the logger with a handler queueing the records
+        and starts writing them in a background thread.
+        """
+        self._handlers = [
+            handler
+            for handler in self._logger.handlers
+            if handler not in self._direct_handlers
+        ]
+        self._queue_handler = _BlockingQueueHandler(queue.Queue(self._size))
+        for handler in self._handlers:
+            self._logger.removeHandler(handler)
+        self._logger.addHandler(self._queue_handler)
+        # Shadows the methods of the class for this logger only.
+        self._shadowed = dict(
+            (name, vars(self._logger).get(name))
+            for name in ("addHandler", "removeHandler")
+        )
+        self._logger.addHandler = self._add_handler
+        self._logger.removeHandler = self._remove_handler
+        self._start_listener()
+        _started.add(self)
+
+    def _start_listener(self):
+        """
+        Starts the thread writing the queued records.
+        """
+        self._listener = logging.handlers.QueueListener(
+            self._queue_handler.queue, *self._handlers, respect_handler_level=True
+        )
+        self._listener.start()
+
+    def _add_handler(self, handler):
+        """
+        Adds a handler behind the queue.
+        """
+        if self._listener is None:
+            logging.Logger.addHandler(self._logger, handler)
+            return
+        if handler in self._handlers:
+            return
+        # Records logged before the handler was added aren't written to it.
+        self.flush()
+        self._handlers.append(handler)
+        self._listener.handlers = tuple(self._handlers)
+
+    def _remove_handler(self, handler):
+        """
+        Removes a handler from behind the queue or from the logger.
+        """
+        if self._listener is None or handler not in self._handlers:
+            logging.Logger.removeHandler(self._logger, handler)
+            return
+        # Records logged before the handler was removed are still written to it.
+        self.flush()
+        self._handlers.remove(handler)
+        self._listener.handlers = tuple(self._handlers)
+
+    def _after_fork_in_child(self):
+        """
+        Restarts the writer thread in a forked child, since threads don't
+        survive a fork. Records queued but not written by the parent are
+        left to the parent.
+        """
+        if self._listener is None:
+            return
+        self._queue_handler.queue = queue.Queue(self._size)
+        self._start_listener()
+
+    def flush(self):
+        """
+        Waits until every queued record was written and flushes the handlers.
+        """
+        if self._listener is None:
+            return
+        self._queue_handler.queue.join()
+        for handler in self._handlers:
+            handler.flush()
+
+    def stop(self):
+        """
+        Writes the queued records, stops the background thread and gives the
+        handlers back to the logger.
+        """
+        if self._listener is None:
+            return
+        _started.discard(self)
+        self._listener.stop()
+        self._listener = None
+        for name, method in self._shadowed.items():
+            if method is None:
+                vars(self._logger).pop(name, None)
+            else:
+                setattr(self._logger, name, method)
+        self._logger.removeHandler(self._queue_handler)
+        for handler in self._handlers:
+            handler.flush()
+            self._logger.addHandler(handler)
+
+
+# Instances whose writer thread needs to be restarted in forked children.
+_started = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    """
+    Restarts the writer threads in a forked child.
+    """
+    for queued_logging in list(_started):
+        queued_logging._after_fork_in_child()
+
+
+if is_queue_supported() and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _BlockingQueueHandler(getattr(logging.handlers, "QueueHandler", object)):
+    """
+    Queue handler waiting for room in the queue instead of dropping records.
+    """
+
+    def enqueue(self, record):
+        """
+        Puts a record in the queue, blocking while it is full.
+        """
+        self.queue.put(record)
+
+
+class LogCapture(logging.Handler):
+    """
+    Keeps the most recent records in memory.
+
+    Records are only formatted when the text is requested, so capturing
+    costs little more than appending to a list.
+    """
+
+    def __init__(self, size=DEFAULT_CAPTURE_SIZE):
+        """
+        :param int size: Maximum number of records kept.
+        """
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+        )
+        self._records = collections.deque(maxlen=size)
+        self.dropped = 0
+
+    @property
+    def records(self):
+        """
+        List of the records kept, oldest first.
+        """
+        return list(self._records)
+
+    @property
+    def text(self):
+        """
+        The records kept, formatted one per line.
+        """
+        lines = [self.format(record) for record in self._records]
+        if self.dropped:
+            lines.insert(0, "({0} older records were dropped)".format(self.dropped))
+        return "\n".join(lines)
+
+    def emit(self, record):
+        """
+        Keeps a record.
+        """
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+        self._records.append(record)
+
+    def clear(self):
+        """
+        Forgets every record.
+        """
+        self._records.clear()
+        self.dropped = 0
+
+
+class FailureLogReporter(object):
+    """
+    Adds the Toolkit records logged during a failed test phase to its report.
+
+    Registered as a pytest plugin when ``--tank-log-capture`` is set. Records
+    are captured once Toolkit logging is initialized.
+    """
+
+    def __init__(self, size=DEFAULT_CAPTURE_SIZE):
+        """
+        :param int size: Maximum number of records shown for a test phase.
+        """
+        self._capture = LogCapture(size)
+        self._logger = None
+
+    @property
+    def handler(self):
+        """
+        The handler capturing the records.
+        """
+        return self._capture
+
+    def attach(self, logger):
+        """
+        Starts capturing the records of a logger.
+
+        :param logger: Toolkit's root logger.
+        """
+        self._logger = logger
+        logger.addHandler(self._capture)
+
+    def detach(self):
+        """
+        Stops capturing records.
+        """
+        if self._logger is not None:
+            self._logger.removeHandler(self._capture)
+            self._logger = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        """
+        Adds the captured records to the report of a failed phase.
+        """
+        outcome = yield
+        report = outcome.get_result()
+        if report.failed and self._capture.records:
+            report.sections.append(
+                ("Captured Toolkit log {0}".format(report.when), self._capture.text)
+            )
+        self._capture.clear()
+
+    def pytest_unconfigure(self):
+        """
+        Stops capturing records.
+        """
+        self.detach()
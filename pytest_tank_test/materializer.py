@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Materializes test fixtures.
+
+Each fixture tree is copied once per test session into a snapshot. Tests then
+get a private view of the snapshot whose files are cloned with copy-on-write
+reflinks when the filesystem supports them, hardlinked if requested, and
+copied otherwise.
+"""
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+# From linux/fs.h
+_FICLONE = 0x40049409
+
+# Errors meaning the filesystem can't clone or link files.
+_UNSUPPORTED_ERRORS = (
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EPERM,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+    getattr(errno, "ENOSYS", errno.EOPNOTSUPP),
+)
+
+
+class FixtureModifiedError(RuntimeError):
+    """
+    Raised when a test modified a hardlinked fixture file in place.
+    """
+
+
+class FixtureMaterializer(object):
+    """
+    Hands out private copies of fixture trees.
+    """
+
+    # Clone files with reflinks if the filesystem supports them, copy otherwise.
+    AUTO = "auto"
+    # Always copy files.
+    COPY = "copy"
+    # Hardlink files. This is the fastest mode, but the files of a view share
+    # their content with the snapshot, so tests must not modify them in place.
+    HARDLINK = "hardlink"
+
+    MODES = (AUTO, COPY, HARDLINK)
+
+    def __init__(self, fixtures_root, snapshots_root, mode=AUTO):
+        """
+        :param str fixtures_root: Folder containing the fixtures.
+        :param str snapshots_root: Empty folder where snapshots of the fixtures
+            will be written. It should be on the same filesystem as the views.
+        :param str mode: How files are materialized. One of ``MODES``.
+
+        :raises ValueError: If the mode is unknown.
+        """
+        if mode not in self.MODES:
+            raise ValueError(
+                "Unknown fixture materialization mode {0}, expected one of {1}".format(
+                    mode, ", ".join(self.MODES)
+                )
+            )
+        self._fixtures_root = fixtures_root
+        self._snapshots_root = snapshots_root
+        self._mode = mode
+        self._can_reflink = mode == self.AUTO
+        self._can_hardlink = mode == self.HARDLINK
+        # Snapshot manifests, indexed by fixture name.
+        self._snapshots = {}
+        self._stats = {
+            "views": 0,
+            "reflinked": 0,
+            "hardlinked": 0,
+            "copied": 0,
+            "duration": 0.0,
+        }
+
+    @property
+    def mode(self):
+        """
+        How files are materialized.
+        """
+        return self._mode
+
+    @property
+    def stats(self):
+        """
+        Dictionary with the number of ``views`` created, the number of files
+        ``reflinked``, ``hardlinked`` and ``copied`` and the total ``duration``
+        of the materializations, in seconds.
+        """
+        return dict(self._stats)
+
+    def format_stats(self):
+        """
+        Describe the work done by the materializer.
+
+        :returns: A human readable string.
+        """
+        return (
+            "materialized {views} fixture view(s) in {duration:.3f}s: "
+            "{reflinked} file(s) reflinked, {hardlinked} hardlinked, "
+            "{copied} copied".format(**self._stats)
+        )
+
+    def get_snapshot(self, name):
+        """
+        Get the snapshot of a fixture, taking it if needed.
+
+        :param str name: Path of the fixture, relative to the fixtures folder.
+
+        :returns: Path to the snapshot.
+
+        :raises RuntimeError: If the fixture doesn't exist.
+        """
+        return self._get_manifest(name)["root"]
+
+    def materialize(self, name, destination):
+        """
+        Create a private view of a fixture.
+
+        :param str name: Path of the fixture, relative to the fixtures folder.
+        :param str destination: Folder to create. Its parent folder must exist.
+
+        :returns: The destination.
+
+        :raises RuntimeError: If the fixture doesn't exist.
+        """
+        start = timeit.default_timer()
+        manifest = self._get_manifest(name)
+        root = manifest["root"]
+
+        os.mkdir(destination)
+        for folder in manifest["folders"]:
+            os.mkdir(os.path.join(destination, folder))
+        for link, target in manifest["links"]:
+            os.symlink(target, os.path.join(destination, link))
+        for path in manifest["files"]:
+            self._materialize_file(
+                os.path.join(root, path), os.path.join(destination, path)
+            )
+
+        self._stats["views"] += 1
+        self._stats["duration"] += timeit.default_timer() - start
+        return destination
+
+    def check_snapshot(self, name):
+        """
+        Make sure the snapshot of a fixture wasn't modified through a hardlink.
+
+        A modified snapshot is taken again so later views are not affected.
+
+        :param str name: Path of the fixture, relative to the fixtures folder.
+
+        :raises FixtureModifiedError: If the snapshot was modified.
+        """
+        manifest = self._snapshots.get(name)
+        if manifest is None:
+            return
+
+        modified = []
+        for path, signature in manifest["signatures"].items():
+            try:
+                current = _get_signature(os.path.join(manifest["root"], path))
+            except OSError:
+                current = None
+            if current != signature:
+                modified.append(path)
+
+        if modified:
+            del self._snapshots[name]
+            raise FixtureModifiedError(
+                "The following files of fixture {0} were modified in place, which "
+                "is not supported with hardlinks: {1}".format(
+                    name, ", ".join(sorted(modified))
+                )
+            )
+
+    def _get_manifest(self, name):
+        """
+        Get the manifest of a fixture's snapshot, taking the snapshot if needed.
+
+        :param str name: Path of the fixture, relative to the fixtures folder.
+
+        :returns: Dictionary with the ``root`` of the snapshot, the relative paths
+            of its ``folders``, ``files`` and ``links`` and the ``signatures``
+            of its files.
+        """
+        manifest = self._snapshots.get(name)
+        if manifest is not None:
+            return manifest
+
+        source = os.path.join(self._fixtures_root, name)
+        if not os.path.isdir(source):
+            raise RuntimeError("Fixture {0} does not exist.".format(source))
+
+        # Snapshots are never overwritten, as views may still link to them.
+        root = os.path.join(
+            tempfile.mkdtemp(dir=self._snapshots_root), os.path.basename(source)
+        )
+        shutil.copytree(source, root, symlinks=True)
+
+        manifest = {
+            "root": root,
+            "folders": [],
+            "files": [],
+            "links": [],
+            "signatures": {},
+        }
+        for folder, folder_names, file_names in os.walk(root):
+            relative_folder = os.path.relpath(folder, root)
+            for entry in folder_names + file_names:
+                path = os.path.join(folder, entry)
+                relative_path = os.path.normpath(os.path.join(relative_folder, entry))
+                if os.path.islink(path):
+                    manifest["links"].append((relative_path, os.readlink(path)))
+                elif entry in folder_names:
+                    manifest["folders"].append(relative_path)
+                else:
+                    manifest["files"].append(relative_path)
+                    manifest["signatures"][relative_path] = _get_signature(path)
+
+        self._snapshots[name] = manifest
+        return manifest
+
+    def _materialize_file(self, source, destination):
+        """
+        Materialize a file with the fastest method available.
+
+        :param str source: File from a snapshot.
+        :param str destination: File to create.
+        """
+        if self._can_hardlink:
+            try:
+                os.link(source, destination)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+                self._can_hardlink = False
+            else:
+                self._stats["hardlinked"] += 1
+                return
+
+        if self._can_reflink:
+            try:
+                _reflink(source, destination)
+            except (IOError, OSError) as e:
+                if e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+                self._can_reflink = False
+                if os.path.exists(destination):
+                    os.remove(destination)
+            else:
+                shutil.copymode(source, destination)
+                self._stats["reflinked"] += 1
+                return
+
+        shutil.copy2(source, destination)
+        self._stats["copied"] += 1
+
+
+def _get_signature(path):
+    """
+    Get a value that changes when a file is modified.
+
+    :param str path: Path to the file.
+
+    :returns: A tuple of the file's size and modification time.
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def _reflink(source, destination):
+    """
+    Clone a file with a copy-on-write reflink.
+
+    :param str source: File to clone.
+    :param str destination: File to create.
+
+    :raises OSError: If the platform or filesystem doesn't support reflinks.
+    """
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(source, "rb") as src:
+            with open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+    elif sys.platform == "darwin":
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "clonefile"):
+            raise OSError(errno.ENOTSUP, "clonefile is not available")
+        if libc.clonefile(
+            source.encode(sys.getfilesystemencoding()),
+            destination.encode(sys.getfilesystemencoding()),
+            0,
+        ):
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hands out mock Shotgun connections cloned from per-session snapshots.
+
+Loading a Mockgun schema and seeding its database is done once per schema and
+seed file. The database of the resulting connection is pickled, and each test
+gets a clone whose database is unpickled from it, which is much faster than
+reading the schema again or deep copying the database.
+"""
+
+import copy
+import json
+import os
+import timeit
+
+from six.moves import cPickle as pickle
+
+# Names of the schema files inside a schema folder.
+_SCHEMA_FILE = "schema.pickle"
+_SCHEMA_ENTITY_FILE = "schema_entity.pickle"
+
+
+def get_default_schema_folder():
+    """
+    Get the folder of the schema used by tk-core's tests.
+
+    :returns: Path to the ``tests/fixtures/mockgun`` folder of tk-core.
+    """
+    import tank_test
+
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(tank_test.__file__))),
+        "fixtures",
+        "mockgun",
+    )
+
+
+def load_seed(path):
+    """
+    Read the entities a mock database is seeded with.
+
+    :param str path: A JSON or YAML file with a list of entity dictionaries,
+        each with a ``type`` and an ``id``.
+
+    :returns: The list of entities.
+
+    :raises RuntimeError: If the file doesn't contain a list of entities.
+    """
+    with open(path, "r") as fh:
+        if os.path.splitext(path)[1].lower() in (".yml", ".yaml"):
+            import yaml
+
+            entities = yaml.safe_load(fh)
+        else:
+            entities = json.load(fh)
+
+    if not isinstance(entities, list) or not all(
+        isinstance(entity, dict) and "type" in entity and "id" in entity
+        for entity in entities
+    ):
+        raise RuntimeError(
+            "{0} should contain a list of entities with a type and an id.".format(path)
+        )
+    return entities
+
+
+class MockgunSnapshots(object):
+    """
+    Snapshots of seeded mock Shotgun databases.
+    """
+
+    def __init__(self, shotgun_class=None):
+        """
+        :param shotgun_class: The Mockgun ``Shotgun`` class. Defaults to the one
+            vendored by tk-core.
+        """
+        if shotgun_class is None:
+            from tank_vendor.shotgun_api3.lib import mockgun
+
+            shotgun_class = mockgun.Shotgun
+        self._shotgun_class = shotgun_class
+        # Tuples of (connection, pickled database, build duration), indexed by
+        # schema folder and seed file.
+        self._snapshots = {}
+        # Number of clones of each snapshot.
+        self._clones = {}
+        self._stats = {
+            "snapshots": 0,
+            "clones": 0,
+            "build_duration": 0.0,
+            "clone_duration": 0.0,
+            "saved": 0.0,
+        }
+
+    @property
+    def stats(self):
+        """
+        Dictionary with the number of ``snapshots`` built and of ``clones``
+        handed out, the time spent building snapshots (``build_duration``)
+        and cloning them (``clone_duration``) and the time ``saved``
+        compared to building a database for every clone, in seconds.
+        """
+        return dict(self._stats)
+
+    def format_stats(self):
+        """
+        Describe the work done by the snapshots.
+
+        :returns: A human readable string.
+        """
+        return (
+            "built {snapshots} mock Shotgun snapshot(s) in {build_duration:.3f}s, "
+            "cloned them {clones} time(s) in {clone_duration:.3f}s, "
+            "saving about {saved:.3f}s".format(**self._stats)
+        )
+
+    def get_snapshot(self, schema_folder, seed=None):
+        """
+        Get a snapshot, building it if needed.
+
+        :param str schema_folder: Folder containing the ``schema.pickle`` and
+            ``schema_entity.pickle`` files.
+        :param str seed: Optional JSON or YAML file with the entities the
+            database is seeded with. See :func:`load_seed`.
+
+        :returns: A tuple of (connection, pickled database, build duration).
+        """
+        key = self._get_key(schema_folder, seed)
+        if key not in self._snapshots:
+            self._snapshots[key] = self._build(*key)
+        return self._snapshots[key]
+
+    def _get_key(self, schema_folder, seed):
+        """
+        Identify a snapshot.
+        """
+        return (os.path.abspath(schema_folder), os.path.abspath(seed) if seed else None)
+
+    def _build(self, schema_folder, seed):
+        """
+        Build a connection from a schema and seed its database.
+        """
+        start = timeit.default_timer()
+        for name in (_SCHEMA_FILE, _SCHEMA_ENTITY_FILE):
+            if not os.path.isfile(os.path.join(schema_folder, name)):
+                raise RuntimeError(
+                    "{0} does not contain a Mockgun schema.".format(schema_folder)
+                )
+
+        # The schema paths are global, so they are restored for tests that
+        # create their own connections.
+        previous_paths = self._shotgun_class.get_schema_paths()
+        self._shotgun_class.set_schema_paths(
+            os.path.join(schema_folder, _SCHEMA_FILE),
+            os.path.join(schema_folder, _SCHEMA_ENTITY_FILE),
+        )
+        try:
+            connection = self._shotgun_class(
+                "http://unit_test_mock_sg", "mock_user", "mock_key"
+            )
+        finally:
+            self._shotgun_class.set_schema_paths(*previous_paths)
+
+        for entity in load_seed(seed) if seed else []:
+            self._add_entity(connection, entity, seed)
+
+        database = pickle.dumps(connection._db, pickle.HIGHEST_PROTOCOL)
+        duration = timeit.default_timer() - start
+        self._stats["snapshots"] += 1
+        self._stats["build_duration"] += duration
+        return connection, database, duration
+
+    def _add_entity(self, connection, entity, seed):
+        """
+        Add an entity to a database, the way TankTestBase.add_to_sg_mock_db does.
+        """
+        entity_type = entity["type"]
+        fields = connection._schema.get(entity_type)
+        if fields is None:
+            raise RuntimeError(
+                "{0}: {1} is not an entity type of the schema.".format(
+                    seed, entity_type
+                )
+            )
+        # Mockgun expects every field of the schema to be set.
+        record = dict((field, None) for field in fields)
+        record.update(entity)
+        connection._db[entity_type][entity["id"]] = record
+
+    def clone(self, schema_folder, seed=None):
+        """
+        Get a connection with a private copy of a snapshot's database.
+
+        The schema is shared between the clones and must not be modified.
+
+        :param str schema_folder: Folder containing the schema.
+        :param str seed: Optional file with the entities the database is
+            seeded with.
+
+        :returns: A Mockgun connection.
+        """
+        template, database, build_duration = self.get_snapshot(schema_folder, seed)
+        start = timeit.default_timer()
+        connection = copy.copy(template)
+        connection._db = pickle.loads(database)
+        connection.finds = 0
+        duration = timeit.default_timer() - start
+
+        # The first clone of a snapshot needed the database to be built anyway.
+        key = self._get_key(schema_folder, seed)
+        if self._clones.get(key):
+            self._stats["saved"] += max(0.0, build_duration - duration)
+        self._clones[key] = self._clones.get(key, 0) + 1
+        self._stats["clones"] += 1
+        self._stats["clone_duration"] += duration
+        return connection
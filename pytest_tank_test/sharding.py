@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Splits the tests into shards of similar durations.
+
+The duration of each test is remembered in the pytest cache. Tests are then
+spread across shards with the longest processing time first heuristic: tests
+are sorted from slowest to fastest and each test is given to the shard with
+the smallest total so far.
+"""
+
+import heapq
+import zlib
+
+import pytest
+import six
+
+from tk_toolchain import util
+
+# Duration assumed for tests without history when no other test has one either.
+_DEFAULT_DURATION = 1.0
+
+
+def parse_shard(value):
+    """
+    Parse the value of ``--tank-shard``.
+
+    :param str value: Value like ``2/4``.
+
+    :returns: A tuple of (shard index starting at 0, number of shards).
+
+    :raises pytest.UsageError: If the value is invalid.
+    """
+    try:
+        index, count = [int(token) for token in value.split("/")]
+    except ValueError:
+        index, count = 0, 0
+    if count < 1 or not 1 <= index <= count:
+        raise pytest.UsageError(
+            "Invalid shard {0}, expected <index>/<count> with 1 <= index <= count".format(
+                value
+            )
+        )
+    return index - 1, count
+
+
+def load_durations(path):
+    """
+    Load test durations from a file.
+
+    :param str path: A JSON file with a ``durations`` dictionary of durations
+        indexed by node id or a timing report written by ``--tank-timing-report``.
+
+    :returns: Dictionary of durations, in seconds, indexed by node id.
+
+    :raises pytest.UsageError: If the file can't be read.
+    """
+    data = util.load_json(path)
+    if isinstance(data, dict) and isinstance(data.get("durations"), dict):
+        return data["durations"]
+    if isinstance(data, dict) and isinstance(data.get("tests"), list):
+        return dict(
+            (
+                test["nodeid"],
+                sum(test.get(when, 0.0) for when in ("setup", "call", "teardown")),
+            )
+            for test in data["tests"]
+        )
+    raise pytest.UsageError("{0} does not contain test durations.".format(path))
+
+
+def assign_shards(nodeids, count, durations):
+    """
+    Spread tests across shards.
+
+    The result only depends on the arguments, so every shard computes the
+    same assignment as long as they collect the same tests and use the
+    same durations.
+
+    :param list nodeids: Node ids of the tests.
+    :param int count: Number of shards.
+    :param dict durations: Known durations, indexed by node id.
+
+    :returns: A tuple of (dictionary of shard indices indexed by node id,
+        list of the estimated duration of each shard).
+    """
+    known = [durations[nodeid] for nodeid in nodeids if nodeid in durations]
+    if not known:
+        # Without any history, hashing is as good as anything else and
+        # doesn't depend on the other tests that were collected.
+        assignment = dict(
+            (nodeid, zlib.crc32(six.ensure_binary(nodeid)) % count)
+            for nodeid in nodeids
+        )
+        totals = [0.0] * count
+        for shard in assignment.values():
+            totals[shard] += _DEFAULT_DURATION
+        return assignment, totals
+
+    # Tests without history are assumed to be average.
+    known.sort()
+    estimate = known[len(known) // 2]
+
+    tests = sorted(
+        ((durations.get(nodeid, estimate), nodeid) for nodeid in set(nodeids)),
+        key=lambda test: (-test[0], test[1]),
+    )
+    shards = [(0.0, index) for index in range(count)]
+    assignment = {}
+    for duration, nodeid in tests:
+        total, index = heapq.heappop(shards)
+        assignment[nodeid] = index
+        heapq.heappush(shards, (total + duration, index))
+
+    totals = [0.0] * count
+    for total, index in shards:
+        totals[index] = total
+    return assignment, totals
+
+
+class DurationStore(object):
+    """
+    Durations of the tests from previous runs, stored in the pytest cache.
+
+    Registered as a pytest plugin by pytest_tank_test. Only the durations of
+    tests that ran are updated. Shard runs don't update them at all, since
+    shards run one after another with the same cache would otherwise see
+    different durations and disagree on which shard runs which test.
+    """
+
+    _CACHE_KEY = "tank/durations-v1"
+
+    def __init__(self, config, read_only=False):
+        """
+        :param config: The pytest config object.
+        :param bool read_only: If ``True``, durations are never saved.
+        """
+        self._config = config
+        self._read_only = read_only
+        self._durations = config.cache.get(self._CACHE_KEY, None) or {}
+        self._updates = {}
+
+    @property
+    def durations(self):
+        """
+        Dictionary of durations, in seconds, indexed by node id.
+        """
+        return dict(self._durations)
+
+    def pytest_runtest_logreport(self, report):
+        """
+        Accumulates the durations of the phases of a test.
+        """
+        self._updates[report.nodeid] = (
+            self._updates.get(report.nodeid, 0.0) + report.duration
+        )
+
+    def pytest_sessionfinish(self, session):
+        """
+        Saves the durations of the tests that ran.
+        """
+        if self._read_only or hasattr(self._config, "workerinput") or not self._updates:
+            return
+        self._durations.update(self._updates)
+        self._config.cache.set(self._CACHE_KEY, self._durations)
+
+
+class ShardSelector(object):
+    """
+    Deselects the tests that belong to other shards.
+
+    Registered as a pytest plugin when ``--tank-shard`` is set.
+    """
+
+    def __init__(self, index, count, durations):
+        """
+        :param int index: Index of this shard, starting at 0.
+        :param int count: Number of shards.
+        :param dict durations: Known durations, indexed by node id.
+        """
+        self._index = index
+        self._count = count
+        self._durations = durations
+        self._report = None
+
+    def pytest_collection_modifyitems(self, config, items):
+        """
+        Deselects the tests that belong to other shards.
+        """
+        assignment, totals = assign_shards(
+            [item.nodeid for item in items], self._count, self._durations
+        )
+        selected = []
+        deselected = []
+        for item in items:
+            if assignment[item.nodeid] == self._index:
+                selected.append(item)
+            else:
+                deselected.append(item)
+
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+        known = sum(1 for item in items if item.nodeid in self._durations)
+        self._report = (
+            "shard {0}/{1}: {2} of {3} tests, {4} with known durations, estimated "
+            "{5:.1f}s (shards range from {6:.1f}s to {7:.1f}s)".format(
+                self._index + 1,
+                self._count,
+                len(selected),
+                len(selected) + len(deselected),
+                known,
+                totals[self._index],
+                min(totals),
+                max(totals),
+            )
+        )
+
+    def pytest_report_collectionfinish(self, config):
+        """
+        Reports the content of the shard.
+        """
+        if self._report is None:
+            return None
+        return "pytest_tank_test: {0}".format(self._report)
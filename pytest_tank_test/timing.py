@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Records where the time goes during a test session.
+
+The timings of each phase of a test are attached to its reports, so they also
+make it back to the main process when running under pytest-xdist.
+"""
+
+import functools
+import sys
+import threading
+import time
+import timeit
+
+import pytest
+from six.moves import builtins
+
+from tk_toolchain import util
+
+# Module and class whose setUp and tearDown are timed.
+_TANK_TEST_BASE_MODULE = "tank_test.tank_test_base"
+_TANK_TEST_BASE_CLASS = "TankTestBase"
+
+
+class PhaseTimer(object):
+    """
+    Times the phases of a test session and of each test.
+
+    Registered as a pytest plugin when ``--tank-timing-report`` is set.
+    """
+
+    # Bump this whenever the format of the report changes.
+    _FORMAT_VERSION = 1
+
+    def __init__(self, config, report_path, top=10):
+        """
+        :param config: The pytest config object.
+        :param str report_path: Where to write the JSON report.
+        :param int top: Number of entries in each section of the terminal summary.
+        """
+        self._config = config
+        self._report_path = report_path
+        self._top = top
+        self._is_worker = hasattr(config, "workerinput")
+        self._session_phases = {}
+        self._session_imports = {}
+        self._tests = {}
+        # Timings of the test phase being run by this process.
+        self._current = None
+        self._local = threading.local()
+        self._original_import = None
+        self._patches = []
+
+    def install(self):
+        """
+        Starts timing the imports of modules.
+        """
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        """
+        Restores everything that was patched to time the session.
+        """
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        for cls, name, original in reversed(self._patches):
+            setattr(cls, name, original)
+        self._patches = []
+
+    def record(self, phase, duration):
+        """
+        Records the duration of a phase.
+
+        The duration is attributed to the test being run, if any, and to the
+        session otherwise.
+
+        :param str phase: Name of the phase.
+        :param float duration: Duration, in seconds.
+        """
+        phases = self._session_phases if self._current is None else self._current
+        phases[phase] = phases.get(phase, 0.0) + duration
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """
+        Times the first import of each module, excluding the time spent
+        importing the modules it imports, which are timed on their own.
+        """
+        args = (name, globals, locals, fromlist, level)
+        if level < 0:
+            # Python 2 implicit relative imports can't be resolved before
+            # they are done, so the modules they import are timed together.
+            if name in sys.modules:
+                return self._original_import(*args)
+            return self._time_import(name, args)
+
+        module_name = _resolve_module_name(name, globals, level)
+        # Parent packages and submodules listed after "from ... import" are
+        # imported by Python without calling __import__, so they are imported
+        # here first to be timed on their own.
+        parent = module_name.rpartition(".")[0]
+        if parent and parent not in sys.modules:
+            self._timed_import(parent)
+        if module_name not in sys.modules:
+            self._time_import(module_name, (module_name,))
+        module = sys.modules.get(module_name)
+        for item in fromlist or ():
+            submodule = "{0}.{1}".format(module_name, item)
+            if (
+                item == "*"
+                or not hasattr(module, "__path__")
+                or hasattr(module, item)
+                or submodule in sys.modules
+            ):
+                continue
+            try:
+                self._time_import(submodule, (submodule,))
+            except ImportError as e:
+                # The item isn't a submodule, which the import below reports
+                # if it isn't an attribute either.
+                if getattr(e, "name", submodule) != submodule:
+                    raise
+        return self._original_import(*args)
+
+    def _time_import(self, module_name, args):
+        """
+        Imports a module, recording the time it took minus the time spent in
+        the imports it did.
+
+        :param str module_name: Name the time is recorded under.
+        :param tuple args: Arguments of ``__import__``.
+
+        :returns: The result of ``__import__``.
+        """
+        # Imports in progress in this thread, as [start, time spent in nested
+        # imports] lists.
+        stack = self._local.__dict__.setdefault("imports", [])
+        stack.append([timeit.default_timer(), 0.0])
+        try:
+            return self._original_import(*args)
+        finally:
+            start, nested = stack.pop()
+            duration = timeit.default_timer() - start
+            if stack:
+                stack[-1][1] += duration
+            if self._current is None:
+                imports = self._session_imports
+            else:
+                imports = self._current.setdefault("imports", {})
+            imports[module_name] = imports.get(module_name, 0.0) + duration - nested
+
+    def _patch_tank_test_base(self):
+        """
+        Times TankTestBase's setUp and tearDown once tank_test has been imported.
+        """
+        if self._patches or _TANK_TEST_BASE_MODULE not in sys.modules:
+            return
+
+        cls = getattr(sys.modules[_TANK_TEST_BASE_MODULE], _TANK_TEST_BASE_CLASS, None)
+        if cls is None:
+            return
+
+        for name, phase in [
+            ("setUp", "tank_test_base_setup"),
+            ("tearDown", "tank_test_base_teardown"),
+        ]:
+            original = cls.__dict__[name]
+            setattr(cls, name, self._get_timed_method(original, phase))
+            self._patches.append((cls, name, original))
+
+    def _get_timed_method(self, method, phase):
+        """
+        Wraps a method so its duration is recorded.
+        """
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = timeit.default_timer()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(phase, timeit.default_timer() - start)
+
+        return wrapper
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_collection(self, session):
+        """
+        Times the collection of the tests.
+        """
+        start = timeit.default_timer()
+        yield
+        self.record("collection", timeit.default_timer() - start)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        """
+        Starts timing TankTestBase if it was imported during collection.
+        """
+        self._patch_tank_test_base()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        """
+        Attaches the timings of the phase that just ran to its report.
+        """
+        outcome = yield
+        report = outcome.get_result()
+        phases = self._current or {}
+        self._current = {}
+        phases["start"] = getattr(call, "start", None)
+        report.tank_timing = phases
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        """
+        Collects the timings of a test.
+        """
+        self._current = {}
+        yield
+        self._current = None
+        # Tests importing tank_test for the first time in their setup are
+        # only timed from the next test on.
+        self._patch_tank_test_base()
+
+    def pytest_runtest_logreport(self, report):
+        """
+        Merges the timings of a test phase, which may come from a
+        pytest-xdist worker.
+        """
+        if self._is_worker:
+            return
+
+        test = self._tests.setdefault(
+            report.nodeid, {"nodeid": report.nodeid, "imports": {}}
+        )
+        test[report.when] = report.duration
+        for phase, value in (getattr(report, "tank_timing", None) or {}).items():
+            if phase == "start":
+                if report.when == "setup" and value is not None:
+                    test["start"] = value
+            elif phase == "imports":
+                for name, duration in value.items():
+                    test["imports"][name] = test["imports"].get(name, 0.0) + duration
+            else:
+                test[phase] = test.get(phase, 0.0) + value
+        worker = getattr(report, "node", None)
+        if worker is not None:
+            test["worker"] = getattr(worker, "gateway", worker).id
+
+    def get_report(self):
+        """
+        Build the timing report.
+
+        :returns: A dictionary with the durations of the ``session`` phases,
+            the ``imports`` done outside of tests and the timings of every
+            ``tests``, sorted by start time.
+        """
+        return {
+            "version": self._FORMAT_VERSION,
+            "created": time.time(),
+            "session": dict(self._session_phases),
+            "imports": dict(self._session_imports),
+            "tests": sorted(
+                self._tests.values(),
+                key=lambda test: (test.get("start") or 0, test["nodeid"]),
+            ),
+        }
+
+    def pytest_sessionfinish(self, session):
+        """
+        Writes the report.
+        """
+        self.uninstall()
+        if self._is_worker:
+            return
+        util.save_json(self._report_path, self.get_report())
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """
+        Prints the slowest setups, imports and tests.
+        """
+        report = self.get_report()
+        write_line = terminalreporter.write_line
+        terminalreporter.write_sep("=", "pytest_tank_test timings")
+
+        for phase, duration in sorted(report["session"].items()):
+            write_line("{0:>9.3f}s session {1}".format(duration, phase))
+
+        imports = dict(report["imports"])
+        for test in report["tests"]:
+            for name, duration in test["imports"].items():
+                imports[name] = imports.get(name, 0.0) + duration
+
+        for title, entries in [
+            ("setups", [(get_setup_duration(test), test) for test in report["tests"]]),
+            (
+                "imports",
+                [(duration, {"nodeid": name}) for name, duration in imports.items()],
+            ),
+            ("tests", [(get_body_duration(test), test) for test in report["tests"]]),
+        ]:
+            entries = sorted(entries, key=lambda entry: entry[0], reverse=True)
+            write_line("slowest {0} {1}:".format(min(self._top, len(entries)), title))
+            for duration, test in entries[: self._top]:
+                write_line("{0:>9.3f}s {1}".format(duration, test["nodeid"]))
+
+        write_line("Timing report written to {0}".format(self._report_path))
+
+
+def get_setup_duration(test):
+    """
+    Get the time spent setting up a test, including TankTestBase.setUp.
+
+    :param dict test: Timings of a test from the report.
+
+    :returns: The duration, in seconds.
+    """
+    return test.get("setup", 0.0) + test.get("tank_test_base_setup", 0.0)
+
+
+def get_body_duration(test):
+    """
+    Get the time spent in a test, excluding TankTestBase.setUp and tearDown.
+
+    :param dict test: Timings of a test from the report.
+
+    :returns: The duration, in seconds.
+    """
+    return max(
+        0.0,
+        test.get("call", 0.0)
+        - test.get("tank_test_base_setup", 0.0)
+        - test.get("tank_test_base_teardown", 0.0),
+    )
+
+
+def _resolve_module_name(name, globals, level):
+    """
+    Get the absolute name of the module an import statement refers to.
+
+    :param str name: Name given to ``__import__``.
+    :param dict globals: Globals of the module doing the import.
+    :param int level: Number of parent packages of a relative import. 0 or
+        less for absolute imports.
+
+    :returns: The absolute name of the module.
+    """
+    if level <= 0:
+        return name
+    globals = globals or {}
+    package = globals.get("__package__")
+    if not package:
+        package = globals.get("__name__", "")
+        if "__path__" not in globals:
+            package = package.rpartition(".")[0]
+    base = package.rsplit(".", level - 1)[0]
+    return "{0}.{1}".format(base, name) if name else base
@@ -63,7 +63,6 @@ setup(
         "tk_toolchain": [
             os.path.join("tk_testengine", "*"),
             os.path.join("cmd_line_tools", "tk_docs_preview", "sphinx_data", "*"),
-            os.path.join("cmd_line_tools", "tk_run_app", "config", "env", "*"),
             os.path.join("cmd_line_tools", "tk_run_app", "config", "core", "*"),
             os.path.join(
                 "cmd_line_tools", "tk_run_app", "config", "core", "hooks", "*"
@@ -114,6 +113,8 @@ setup(
             "tk-docs-preview = tk_toolchain.cmd_line_tools.tk_docs_preview:main",
             "tk-run-app = tk_toolchain.cmd_line_tools.tk_run_app:main",
             "tk-config-update = tk_toolchain.cmd_line_tools.tk_config_update:main",
+            "tk-test-workspace = tk_toolchain.cmd_line_tools.tk_test_workspace:main",
+            "tk-test-forkserver = tk_toolchain.cmd_line_tools.tk_test_forkserver:main",
         ],
     },
 )
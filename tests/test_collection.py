@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+
+import pytest
+
+from pytest_tank_test.collection import (
+    CollectionIndex,
+    CollectionPruner,
+    IgnorePatterns,
+)
+
+
+class FakeCache(object):
+    """
+    Stands in for the pytest cache, which stores JSON values.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default):
+        return json.loads(self.values[key]) if key in self.values else default
+
+    def set(self, key, value):
+        self.values[key] = json.dumps(value)
+
+
+class FakeItem(object):
+    def __init__(self, fspath, nodeid):
+        self.fspath = fspath
+        self.nodeid = nodeid
+
+
+@pytest.fixture
+def rootdir(tmpdir):
+    root = tmpdir.mkdir("root")
+    root.join("tests", "test_a.py").write("def test_a(): pass", ensure=True)
+    root.join("tests", "test_b.py").write("def test_b(): pass")
+    return root
+
+
+def test_ignore_patterns():
+    """
+    Ensure patterns match trailing path components.
+    """
+    patterns = IgnorePatterns(["tests/fixtures", "tests/python/third_*", "*.pyc"])
+    for path in [
+        "/repo/tests/fixtures",
+        "/repo/tests/fixtures/config/hooks/hook.py",
+        "/repo/tests/python/third_party",
+        "/repo/tests/python/third_party/mock.py",
+        "/repo/tests/module.pyc",
+        os.path.join("C:", "repo", "tests", "fixtures"),
+    ]:
+        assert patterns.matches(path), path
+
+    for path in [
+        "/repo/tests/fixtures_test.py",
+        "/repo/mytests/fixtures",
+        "/repo/tests/test_fixtures.py",
+        "/repo/tests/other/third_party",
+    ]:
+        assert not patterns.matches(path), path
+
+    assert not IgnorePatterns([]).matches("/repo/tests/fixtures")
+
+
+def test_collection_index(rootdir):
+    """
+    Ensure node ids are only reused while the module and its conftest.py
+    files are unchanged.
+    """
+    cache = FakeCache()
+    module = str(rootdir.join("tests", "test_a.py"))
+    index = CollectionIndex(cache, str(rootdir))
+    assert index.get_nodeids(module) is None
+    index.update(module, ["tests/test_a.py::test_a"])
+    index.save()
+
+    index = CollectionIndex(cache, str(rootdir))
+    assert index.get_nodeids(module) == ["tests/test_a.py::test_a"]
+
+    # Adding a conftest invalidates the entries.
+    rootdir.join("tests", "conftest.py").write("")
+    assert index.get_nodeids(module) is None
+    index.update(module, ["tests/test_a.py::test_a"])
+    assert index.get_nodeids(module) == ["tests/test_a.py::test_a"]
+
+    rootdir.join("tests", "test_a.py").write("def test_a(): pass\ndef test_c(): pass")
+    assert index.get_nodeids(module) is None
+
+    # Entries from another root folder are not used.
+    assert CollectionIndex(cache, str(rootdir.dirpath())).get_nodeids(module) is None
+
+
+def test_pruner(rootdir):
+    """
+    Ensure only modules whose tests are all deselected are pruned.
+    """
+    cache = FakeCache()
+    index = CollectionIndex(cache, str(rootdir))
+    selectors = []
+    pruner = CollectionPruner(index, selectors)
+    module_a = str(rootdir.join("tests", "test_a.py"))
+    module_b = str(rootdir.join("tests", "test_b.py"))
+
+    pruner.pytest_collection_modifyitems(
+        [
+            FakeItem(module_a, "tests/test_a.py::test_a"),
+            FakeItem(module_b, "tests/test_b.py::test_b"),
+            FakeItem(module_b, "tests/test_b.py::test_c"),
+        ]
+    )
+    # No selectors, nothing is pruned.
+    assert not pruner.is_pruned(module_a)
+
+    selectors.append(lambda nodeid: nodeid == "tests/test_b.py::test_c")
+    assert pruner.is_pruned(module_a)
+    assert not pruner.is_pruned(module_b)
+    assert not pruner.is_pruned(str(rootdir.join("tests", "test_new.py")))
+    assert pruner.pruned_tests == 1
+    assert "skipped collecting 1 module(s)" in pruner.pytest_report_collectionfinish()
+
+    # Partial collections are not remembered.
+    pruner = CollectionPruner(index, selectors, update_index=False)
+    pruner.pytest_collection_modifyitems(
+        [FakeItem(module_b, "tests/test_b.py::test_b")]
+    )
+    assert not pruner.is_pruned(module_b)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import sys
+
+from tk_toolchain.tk_testengine import metrics
+from tk_toolchain.tk_testengine.metrics import EngineMetrics, wrap_attribute
+
+
+class FakeMemory(object):
+    """
+    Memory usage growing by one mebibyte each time it is read.
+    """
+
+    def __init__(self):
+        self.usage = 0
+
+    def __call__(self):
+        self.usage += 1024 * 1024
+        return self.usage
+
+
+class Bundle(object):
+    def execute_hook_method(self, name):
+        return "{0} executed".format(name)
+
+
+def test_measures():
+    """
+    Ensure measures are recorded per bundle and phase, ignoring nested ones.
+    """
+    engine_metrics = EngineMetrics(FakeMemory())
+    with engine_metrics.measure(metrics.STARTUP, "tk-testengine"):
+        with engine_metrics.measure(metrics.IMPORT) as entry:
+            entry["bundle"] = "tk-multi-app"
+        with engine_metrics.measure(metrics.INIT, "tk-multi-app"):
+            assert engine_metrics.current(metrics.INIT) == "tk-multi-app"
+            with engine_metrics.measure(metrics.HOOK, "tk-multi-app"):
+                with engine_metrics.measure(metrics.HOOK, "tk-multi-app"):
+                    pass
+            with engine_metrics.measure(metrics.REGISTER_COMMAND, "tk-multi-app"):
+                pass
+        assert engine_metrics.current(metrics.INIT) is None
+
+    assert [entry["phase"] for entry in engine_metrics.entries()] == [
+        metrics.IMPORT,
+        metrics.HOOK,
+        metrics.REGISTER_COMMAND,
+        metrics.INIT,
+        metrics.STARTUP,
+    ]
+    deltas = [entry["memory_delta"] for entry in engine_metrics.entries()]
+    # The memory is read once when a measure starts and once when it stops.
+    assert deltas[0] == 1024 * 1024
+    assert deltas[1] == 3 * 1024 * 1024
+    assert engine_metrics.duration("tk-multi-app", metrics.INIT) >= 0
+    assert engine_metrics.duration() > 0
+
+    summary = engine_metrics.by_bundle()
+    assert sorted(summary) == ["tk-multi-app", "tk-testengine"]
+    assert summary["tk-multi-app"][metrics.HOOK]["count"] == 1
+
+    table = engine_metrics.format_table().splitlines()
+    assert table[0] == "tk-testengine"
+    assert table[1].split()[0] == metrics.STARTUP
+    assert "MiB" in table[1]
+
+    engine_metrics.clear()
+    assert engine_metrics.entries() == []
+
+
+def test_dump(tmpdir):
+    """
+    Ensure the measures can be written to JSON, without memory if unknown.
+    """
+    engine_metrics = EngineMetrics(lambda: None)
+    with engine_metrics.measure(metrics.LOAD, "tk-framework-qtwidgets"):
+        pass
+    path = str(tmpdir.join("metrics.json"))
+    engine_metrics.dump(path)
+    with open(path) as fh:
+        data = json.load(fh)
+    assert data["entries"][0]["bundle"] == "tk-framework-qtwidgets"
+    assert data["entries"][0]["memory_delta"] is None
+    assert data["bundles"]["tk-framework-qtwidgets"][metrics.LOAD]["count"] == 1
+
+
+def test_wrap_attribute():
+    """
+    Ensure functions of classes and modules are wrapped and restored.
+    """
+    calls = []
+
+    def make_wrapper(function):
+        def wrapper(*args, **kwargs):
+            calls.append(args)
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    original = vars(Bundle)["execute_hook_method"]
+    restore = wrap_attribute(Bundle, "execute_hook_method", make_wrapper)
+    bundle = Bundle()
+    assert bundle.execute_hook_method("hook") == "hook executed"
+    assert calls == [(bundle, "hook")]
+    restore()
+    assert vars(Bundle)["execute_hook_method"] is original
+
+    # Inherited functions are wrapped on the subclass only.
+    class SubBundle(Bundle):
+        pass
+
+    restore = wrap_attribute(SubBundle, "execute_hook_method", make_wrapper)
+    assert SubBundle().execute_hook_method("other") == "other executed"
+    assert len(calls) == 2
+    restore()
+    assert "execute_hook_method" not in vars(SubBundle)
+
+    # Missing functions are not wrapped.
+    module = sys.modules[__name__]
+    wrap_attribute(module, "missing_function", make_wrapper)()
+    assert not hasattr(module, "missing_function")
+
+    assert metrics.get_memory_usage() is None or metrics.get_memory_usage() > 0
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from pytest_tank_test.engine_pool import EnginePool
+
+
+class FakePipelineConfiguration(object):
+    def __init__(self, path):
+        self._path = path
+
+    def get_path(self):
+        return self._path
+
+
+class FakeTk(object):
+    def __init__(self, path):
+        self.pipeline_configuration = FakePipelineConfiguration(path)
+
+
+class FakeDialog(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeLogBuffer(object):
+    def __init__(self):
+        self.records = ["previous test"]
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+    def clear(self):
+        self.records = []
+
+
+class FakeApp(object):
+    def __init__(self, engine, name):
+        self._engine = engine
+        self._name = name
+        self.inits = 0
+        self.destroys = 0
+        self.init_app()
+
+    def init_app(self):
+        self.inits += 1
+        self._engine.commands[self._name] = {
+            "callback": None,
+            "properties": {"app": self},
+        }
+
+    def destroy_app(self):
+        self.destroys += 1
+
+
+class FakeEngine(object):
+    def __init__(self, platform, instance_name, tk, context):
+        self._platform = platform
+        self.instance_name = instance_name
+        self.sgtk = tk
+        self.context = context
+        self.created_qt_dialogs = []
+        self.log_buffer = FakeLogBuffer()
+        self.commands = {"engine command": {"callback": None, "properties": {}}}
+        self.apps = {"tk-multi-app": FakeApp(self, "app command")}
+
+    def change_context(self, context):
+        self.context = context
+
+    def destroy(self):
+        self._platform.engine = None
+
+
+class FakePlatform(object):
+    """
+    Stands in for the sgtk.platform module.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.started = []
+
+    def current_engine(self):
+        return self.engine
+
+    def start_engine(self, instance_name, tk, context):
+        assert self.engine is None, "An engine is already running."
+        self.engine = FakeEngine(self, instance_name, tk, context)
+        self.started.append(self.engine)
+        return self.engine
+
+
+def test_engine_is_reused():
+    """
+    Ensure the engine is started once and its context changed when needed.
+    """
+    platform = FakePlatform()
+    pool = EnginePool(platform)
+    tk = FakeTk("/config")
+
+    engine = pool.acquire("tk-testengine", tk, "project")
+    dialog = FakeDialog()
+    engine.created_qt_dialogs.append(dialog)
+    flushes = engine.log_buffer.flushes
+    pool.release()
+    assert dialog.closed
+    assert engine.log_buffer.flushes == flushes + 1
+
+    engine.log_buffer.records.append("test")
+    assert (
+        pool.acquire("tk-testengine", FakeTk("/config"), "project", shared=True)
+        is engine
+    )
+    assert engine.log_buffer.records == []
+    pool.release()
+    assert pool.acquire("tk-testengine", tk, "shot") is engine
+    assert engine.context == "shot"
+    pool.release()
+
+    # The apps are reset in place for tests in the same context.
+    app = engine.apps["tk-multi-app"]
+    app_command = engine.commands["app command"]
+    assert pool.acquire("tk-testengine", tk, "shot") is engine
+    assert engine.context == "shot"
+    assert app.destroys == 1
+    assert app.inits == 2
+    assert engine.commands["app command"] is not app_command
+    assert sorted(engine.commands) == ["app command", "engine command"]
+    pool.release()
+
+    assert len(platform.started) == 1
+    stats = pool.stats
+    assert stats["starts"] == 1
+    assert stats["resets"] == 1
+    assert stats["reuses"] == 1
+    assert stats["context_changes"] == 1
+    summary = pool.format_stats()
+    assert summary.startswith("started 1 engine(s)")
+    assert "reset their apps 1 time(s)" in summary
+
+    pool.destroy()
+    assert platform.engine is None
+    assert pool.engine is None
+
+
+def test_engine_is_restarted():
+    """
+    Ensure a new engine is started when the engine can't be reused.
+    """
+    platform = FakePlatform()
+    pool = EnginePool(platform)
+    tk = FakeTk("/config")
+
+    first = pool.acquire("tk-testengine", tk, "project")
+    pool.release()
+    second = pool.acquire("tk-testengine", FakeTk("/other/config"), "project")
+    assert second is not first
+    pool.release()
+    third = pool.acquire("tk-shell", FakeTk("/other/config"), "project")
+    assert third is not second
+    pool.release()
+
+    # The test destroyed the engine itself.
+    third.destroy()
+    fourth = pool.acquire("tk-shell", FakeTk("/other/config"), "project")
+    assert fourth is not third
+    pool.release()
+
+    isolated = pool.acquire("tk-shell", FakeTk("/other/config"), "project", True)
+    assert isolated is not fourth
+    pool.release(True)
+    assert platform.engine is None
+    assert len(platform.started) == 5
+    assert pool.stats["reuses"] == 0
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+import six
+
+from pytest_tank_test import forkserver
+
+pytestmark = pytest.mark.skipif(
+    not forkserver.is_supported(), reason="Forking requires a POSIX platform."
+)
+
+
+def test_prewarm(monkeypatch):
+    """
+    Ensure modules are imported and failures are reported.
+    """
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    results = forkserver.prewarm(["colorsys", "tk_toolchain_missing_module"])
+
+    assert "colorsys" in sys.modules
+    assert [(name, error is None) for name, _, error in results] == [
+        ("colorsys", True),
+        ("tk_toolchain_missing_module", False),
+    ]
+    message = forkserver.format_prewarm(results)
+    assert message.startswith("prewarmed colorsys in ")
+    assert message.endswith("(could not import tk_toolchain_missing_module)")
+
+
+def test_call_forked():
+    """
+    Ensure values sent by the child are received along with its exit status.
+    """
+
+    def succeed(send):
+        send({"pid": os.getpid()})
+        send([1, 2])
+
+    messages, status = forkserver.call_forked(succeed)
+    assert messages[0]["pid"] != os.getpid()
+    assert messages[1] == [1, 2]
+    assert forkserver.get_returncode(status) == 0
+
+    def fail(send):
+        send("before")
+        raise RuntimeError("failure")
+
+    messages, status = forkserver.call_forked(fail)
+    assert messages == ["before"]
+    assert forkserver.get_returncode(status) == 1
+    assert forkserver.describe_status(status) == "exited with code 1"
+
+    def crash(send):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    messages, status = forkserver.call_forked(crash)
+    assert messages == []
+    assert forkserver.get_returncode(status) == 128 + signal.SIGKILL
+    assert forkserver.describe_status(status) == "was killed by signal {0}".format(
+        signal.SIGKILL
+    )
+
+
+def test_socket_location():
+    """
+    Ensure each repository gets its own short socket path.
+    """
+    first = forkserver.get_socket_location("/a/tk-core")
+    assert first != forkserver.get_socket_location("/a/tk-multi-app")
+    assert len(os.path.basename(first)) == len("0123456789abcdef.sock")
+
+
+def runner(args):
+    """
+    Fake test run, printing its arguments and exiting with the first one.
+    """
+    print("running {0} in {1}".format(" ".join(args), os.getcwd()))
+    print("variable={0}".format(os.environ.get("TK_FORKSERVER_TEST")))
+    return int(args[0])
+
+
+@pytest.fixture
+def server(tmpdir):
+    """
+    Fork server running in a forked process.
+    """
+    watched = tmpdir.join("watched.py")
+    watched.write("")
+    socket_path = str(tmpdir.join("server.sock"))
+    server = forkserver.ForkServer(socket_path, [str(watched)], runner=runner)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+
+    try:
+        assert forkserver.wait_for_server(socket_path, 30) is not None
+        yield socket_path, watched
+    finally:
+        try:
+            forkserver.send_command(socket_path, "stop")
+        except (IOError, OSError):
+            pass
+        os.waitpid(pid, 0)
+
+
+def test_server(server, tmpdir):
+    """
+    Ensure tests run in a child using the client's folder, environment and outputs.
+    """
+    socket_path, watched = server
+    output = tmpdir.join("output.txt")
+
+    # The child writes to the standard output of the client.
+    sys.stdout.flush()
+    stdout = os.dup(1)
+    with open(str(output), "w") as fh:
+        os.dup2(fh.fileno(), 1)
+    try:
+        returncode = forkserver.run(
+            socket_path,
+            ["3", "-x"],
+            cwd=str(tmpdir),
+            environment={"TK_FORKSERVER_TEST": "value"},
+        )
+    finally:
+        os.dup2(stdout, 1)
+        os.close(stdout)
+
+    assert returncode == 3
+    out = output.read()
+    assert "running 3 -x in {0}".format(os.path.realpath(str(tmpdir))) in out
+    assert "variable=value" in out
+
+    status = forkserver.send_command(socket_path, "status")
+    assert status["running"] == 0
+    assert status["stale"] is False
+
+
+def test_stale_server(server):
+    """
+    Ensure the server stops when the sources it imported are modified.
+    """
+    socket_path, watched = server
+    watched.write("# Modified")
+
+    assert forkserver.send_command(socket_path, "status")["stale"] is True
+    with pytest.raises(forkserver.StaleServerError):
+        forkserver.run(socket_path, ["0"])
+    assert forkserver.wait_for_server(socket_path, 0) is None
+
+
+def test_module_forker(tmpdir, current_repo_root):
+    """
+    Ensure each module runs in its own process and crashes are reported.
+    """
+    tmpdir.join("conftest.py").write(
+        "from pytest_tank_test.forkserver import ModuleForker\n"
+        "\n"
+        "def pytest_configure(config):\n"
+        "    config.pluginmanager.register(ModuleForker(config), 'tank_forker')\n"
+    )
+    tmpdir.join("test_a.py").write(
+        "import os, signal, sys\n"
+        "\n"
+        "def test_state():\n"
+        "    sys.tank_forker_test = True\n"
+        "\n"
+        "def test_crash():\n"
+        "    os.kill(os.getpid(), signal.SIGKILL)\n"
+    )
+    tmpdir.join("test_b.py").write(
+        "import sys\n"
+        "\n"
+        "def test_isolated():\n"
+        "    assert not hasattr(sys, 'tank_forker_test')\n"
+        "\n"
+        "def test_failure():\n"
+        "    assert False\n"
+    )
+
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [current_repo_root] + environment.get("PYTHONPATH", "").split(os.pathsep)
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "pytest", "-p", "no:cacheprovider", "-rf"],
+        cwd=str(tmpdir),
+        env=environment,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    output = six.ensure_text(process.communicate()[0])
+
+    assert process.returncode == 1, output
+    assert "2 failed, 2 passed" in output
+    assert "FAILED test_a.py::test_crash" in output
+    assert "FAILED test_b.py::test_failure" in output
+    assert "was killed by signal {0}".format(signal.SIGKILL) in output
+    assert "ran 2 module(s) in forked processes, 1 test(s) did not complete" in output
+
+
+class FakeHook(object):
+    def pytest_report_to_serializable(self, config, report):
+        pass
+
+
+class FakeConfig(object):
+    def __init__(self, **options):
+        self._options = options
+        self.hook = FakeHook()
+
+    def getoption(self, name, default=None):
+        return self._options.get(name, default)
+
+
+@pytest.mark.parametrize(
+    "options", [{"numprocesses": 2}, {"numprocesses": "auto"}, {"dist": "load"}]
+)
+def test_module_forker_with_xdist(options):
+    """
+    Ensure forking each module is refused when the tests are spread across
+    pytest-xdist workers, which are only handed some tests of each module.
+    """
+    import pytest_tank_test
+
+    config = FakeConfig(tank_fork="module", **options)
+    with pytest.raises(pytest.UsageError) as error:
+        pytest_tank_test._register_forker(config)
+    assert "pytest-xdist" in str(error.value)
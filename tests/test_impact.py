@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import subprocess
+import sys
+
+import pytest
+
+from pytest_tank_test import impact
+from pytest_tank_test.impact import ImpactDatabase, ImpactRecorder, ImpactSelector
+
+
+class FakeItem(object):
+    def __init__(self, nodeid, fspath):
+        self.nodeid = nodeid
+        self.fspath = fspath
+
+
+class FakeHook(object):
+    def __init__(self):
+        self.deselected = []
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+class FakeConfig(object):
+    def __init__(self):
+        self.hook = FakeHook()
+
+
+def git(repo, *args):
+    subprocess.check_call(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@test.com"] + list(args),
+        cwd=str(repo),
+        stdout=subprocess.PIPE,
+    )
+
+
+@pytest.fixture
+def repo(tmpdir):
+    """
+    Git repository with two modules and a test for each.
+    """
+    repo = tmpdir.mkdir("tk-multi-app")
+    repo.join("app.py").write("")
+    repo.join("first.py").write("def first():\n    return 1\n")
+    repo.join("second.py").write("def second():\n    return 2\n")
+    repo.join("README.md").write("")
+    git(repo, "init", "-q")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "Initial commit")
+    return repo
+
+
+@pytest.fixture
+def database_path(tmpdir):
+    return str(tmpdir.join("impact.sqlite"))
+
+
+def record(repo, database_path, executed_files):
+    database = ImpactDatabase(database_path)
+    try:
+        database.record(impact.get_revision(str(repo)), executed_files)
+    finally:
+        database.close()
+
+
+def select(repo, database_path, ref="HEAD"):
+    """
+    Run the selection on the tests of the repository.
+
+    :returns: The selector and the node ids of the deselected tests.
+    """
+    selector = ImpactSelector(str(repo), database_path, ref)
+    config = FakeConfig()
+    items = [
+        FakeItem("tests/test_first.py::test_first", None),
+        FakeItem("tests/test_second.py::test_second", None),
+    ]
+    selector.pytest_collection_modifyitems(config, items)
+    return selector, sorted(item.nodeid for item in config.hook.deselected)
+
+
+def test_database(database_path):
+    """
+    Ensure tests can be found by the files they executed.
+    """
+    database = ImpactDatabase(database_path)
+    database.record("abc", {"test_a": ["a.py", "common.py"], "test_b": ["b.py"]})
+    assert database.revision == "abc"
+    assert database.get_tests() == set(["test_a", "test_b"])
+    assert database.get_affected_tests(["common.py"]) == set(["test_a"])
+    assert database.get_affected_tests(["b.py", "a.py"]) == set(["test_a", "test_b"])
+
+    # Recording again at the same revision merges the results.
+    database.record("abc", {"test_b": ["common.py"]})
+    assert database.get_affected_tests(["common.py"]) == set(["test_a", "test_b"])
+    assert database.get_affected_tests(["b.py"]) == set()
+
+    # Recording at another revision discards everything.
+    database.record("def", {"test_c": ["c.py"]})
+    assert database.revision == "def"
+    assert database.get_tests() == set(["test_c"])
+    database.close()
+
+
+def test_recorder(repo, database_path):
+    """
+    Ensure the recorder measures the files executed by each test.
+    """
+    recorder = ImpactRecorder(str(repo), database_path)
+    sys.path.insert(0, str(repo))
+    try:
+        for nodeid, module in [
+            ("tests/test_first.py::test_first", "first"),
+            ("tests/test_second.py::test_second", "second"),
+        ]:
+            item = FakeItem(nodeid, repo.join("tests", "test_{0}.py".format(module)))
+            protocol = recorder.pytest_runtest_protocol(item, None)
+            next(protocol)
+            __import__(module)
+            with pytest.raises(StopIteration):
+                next(protocol)
+        recorder.pytest_sessionfinish(None)
+    finally:
+        sys.path.remove(str(repo))
+        sys.modules.pop("first", None)
+        sys.modules.pop("second", None)
+
+    database = ImpactDatabase(database_path)
+    assert database.revision == impact.get_revision(str(repo))
+    assert database.get_affected_tests(["first.py"]) == set(
+        ["tests/test_first.py::test_first"]
+    )
+    assert database.get_affected_tests(["tests/test_second.py"]) == set(
+        ["tests/test_second.py::test_second"]
+    )
+    database.close()
+
+
+def test_selection(repo, database_path):
+    """
+    Ensure only the tests affected by the changes are selected.
+    """
+    record(
+        repo,
+        database_path,
+        {
+            "tests/test_first.py::test_first": ["first.py", "tests/test_first.py"],
+            "tests/test_second.py::test_second": ["second.py", "tests/test_second.py"],
+        },
+    )
+
+    # Nothing changed.
+    selector, deselected = select(repo, database_path)
+    assert selector.affected_tests == set()
+    assert deselected == [
+        "tests/test_first.py::test_first",
+        "tests/test_second.py::test_second",
+    ]
+
+    # Documentation changes don't affect the tests.
+    repo.join("README.md").write("Some documentation")
+    assert len(select(repo, database_path)[1]) == 2
+
+    repo.join("second.py").write("def second():\n    return 3\n")
+    selector, deselected = select(repo, database_path)
+    assert deselected == ["tests/test_first.py::test_first"]
+    assert "selected 1 of 2 tests" in selector.pytest_report_collectionfinish(None)
+
+    # Once committed, the changes are still found against the previous commit.
+    git(repo, "commit", "-q", "-am", "Change second")
+    assert select(repo, database_path, "HEAD~1")[1] == [
+        "tests/test_first.py::test_first"
+    ]
+
+
+def test_new_tests_are_selected(repo, database_path):
+    """
+    Ensure tests that were never recorded are always run.
+    """
+    record(repo, database_path, {"tests/test_first.py::test_first": ["first.py"]})
+    assert select(repo, database_path)[1] == ["tests/test_first.py::test_first"]
+
+
+@pytest.mark.parametrize(
+    "change,reason",
+    [
+        (None, "no test impact was recorded"),
+        ("dirty", "uncommitted changes"),
+        ("commit", "which differs from HEAD"),
+        ("resource", "resource.yml changed"),
+    ],
+)
+def test_full_run(repo, database_path, change, reason):
+    """
+    Ensure every test runs when the recorded impact can't be trusted.
+    """
+    if change == "dirty":
+        repo.join("first.py").write("")
+    if change is not None:
+        record(repo, database_path, {"tests/test_first.py::test_first": ["first.py"]})
+    if change == "commit":
+        git(repo, "commit", "-q", "-am", "Change first", "--allow-empty")
+        repo.join("second.py").write("")
+        git(repo, "commit", "-q", "-am", "Change second")
+    if change == "resource":
+        repo.join("resource.yml").write("")
+
+    selector, deselected = select(repo, database_path)
+    assert selector.affected_tests is None
+    assert deselected == []
+    assert reason in selector.pytest_report_collectionfinish(None)
+
+
+def test_unknown_ref(repo, database_path):
+    """
+    Ensure an invalid reference is reported.
+    """
+    with pytest.raises(pytest.UsageError):
+        ImpactSelector(str(repo), database_path, "does-not-exist")
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import logging
+import weakref
+
+import pytest
+from six import StringIO
+
+from tk_toolchain.tk_testengine import log_buffer
+from tk_toolchain.tk_testengine.log_buffer import LogBuffer
+
+
+class FakeStream(StringIO):
+    """
+    Counts the writes made to the console.
+    """
+
+    writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        StringIO.write(self, text)
+
+
+def make_record(name, level, message):
+    return logging.makeLogRecord(
+        {
+            "name": name,
+            "levelno": level,
+            "levelname": logging.getLevelName(level),
+            "msg": message,
+        }
+    )
+
+
+def test_query():
+    """
+    Ensure the most recent records are kept and can be filtered.
+    """
+    buffer = LogBuffer(size=3, echo_level=None)
+    buffer.add(make_record("sgtk.core", logging.DEBUG, "dropped"))
+    buffer.add(make_record("sgtk.env.app", logging.INFO, "app started"))
+    buffer.add(make_record("sgtk.envelope", logging.WARNING, "careful"))
+    buffer.add(
+        make_record("sgtk.env.app.child", logging.ERROR, "app failed"),
+        logging.Formatter("%(levelname)s %(message)s"),
+    )
+
+    assert len(buffer) == 3
+    assert buffer.dropped == 1
+    assert buffer.messages() == ["app started", "careful", "app failed"]
+    assert buffer.messages(level="warning") == ["careful", "app failed"]
+    assert buffer.messages(logger="sgtk.env") == ["app started", "app failed"]
+    assert buffer.messages(contains="app", formatted=True) == [
+        "app started",
+        "ERROR app failed",
+    ]
+    assert [record.levelno for record in buffer.records(level=logging.ERROR)] == [
+        logging.ERROR
+    ]
+
+    with pytest.raises(RuntimeError, match="loud is not a logging level"):
+        buffer.records(level="loud")
+
+    buffer.clear()
+    assert buffer.records() == []
+    assert buffer.dropped == 0
+
+
+def test_echo_is_batched():
+    """
+    Ensure records are echoed in batches, errors and flushes writing right away.
+    """
+    stream = FakeStream()
+    buffer = LogBuffer(
+        echo_level="INFO", stream=stream, batch_size=3, flush_interval=60
+    )
+    buffer.add(make_record("sgtk", logging.DEBUG, "hidden"))
+    for index in range(4):
+        buffer.add(make_record("sgtk", logging.INFO, "line {0}".format(index)))
+    assert stream.getvalue() == "line 0\nline 1\nline 2\n"
+    assert stream.writes == 1
+
+    buffer.add(make_record("sgtk", logging.ERROR, "failure"))
+    assert stream.getvalue().endswith("line 3\nfailure\n")
+    assert stream.writes == 2
+
+    buffer.add(make_record("sgtk", logging.INFO, "last"))
+    buffer.flush()
+    buffer.flush()
+    assert stream.getvalue().endswith("failure\nlast\n")
+    assert stream.writes == 3
+    assert len(buffer) == 7
+
+
+def test_echo_rate_limit():
+    """
+    Ensure records over the rate limit are only buffered and counted.
+    """
+    stream = FakeStream()
+    buffer = LogBuffer(echo_rate=2, stream=stream, flush_interval=60)
+    for index in range(10):
+        buffer.add(make_record("sgtk", logging.INFO, "line {0}".format(index)))
+    buffer.flush()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[:2] == ["line 0", "line 1"]
+    assert buffer.suppressed == 10 - (len(lines) - 1)
+    assert lines[-1] == (
+        "({0} log records were not printed because of the rate limit)".format(
+            buffer.suppressed
+        )
+    )
+    assert len(buffer) == 10
+
+
+def test_from_settings():
+    """
+    Ensure environment variables override the engine's settings.
+    """
+    buffer = LogBuffer.from_settings(5, "WARNING", 0.0, {})
+    assert buffer._size == 5
+    assert buffer._echo_level == logging.WARNING
+    assert buffer._echo_rate is None
+
+    buffer = LogBuffer.from_settings(
+        5,
+        "WARNING",
+        0.0,
+        {
+            log_buffer.BUFFER_SIZE_ENV_VAR: "50",
+            log_buffer.ECHO_LEVEL_ENV_VAR: "none",
+            log_buffer.ECHO_RATE_ENV_VAR: "10",
+        },
+    )
+    assert buffer._size == 50
+    assert buffer._echo_level is None
+    assert buffer._echo_rate == 10.0
+
+
+def test_flush_at_exit():
+    """
+    Ensure pending lines are written at exit without keeping buffers alive.
+    """
+    stream = FakeStream()
+    buffer = LogBuffer(stream=stream, flush_interval=60)
+    buffer.add(make_record("sgtk", logging.INFO, "pending"))
+    assert stream.getvalue() == ""
+    log_buffer._flush_buffers()
+    assert stream.getvalue() == "pending\n"
+
+    buffer = weakref.ref(buffer)
+    assert buffer() is None
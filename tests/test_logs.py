@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+from pytest_tank_test.logs import (
+    FailureLogReporter,
+    LogCapture,
+    QueuedLogging,
+    is_queue_supported,
+)
+
+requires_queue = pytest.mark.skipif(
+    not is_queue_supported(), reason="Logging can't be queued on this Python."
+)
+
+
+class SlowHandler(LogCapture):
+    """
+    Handler remembering the thread records are written from.
+    """
+
+    def __init__(self):
+        LogCapture.__init__(self, None)
+        self.threads = set()
+
+    def emit(self, record):
+        time.sleep(0.001)
+        self.threads.add(threading.current_thread())
+        LogCapture.emit(self, record)
+
+
+class FakeReport(object):
+    def __init__(self, when, failed):
+        self.when = when
+        self.failed = failed
+        self.sections = []
+
+
+class FakeOutcome(object):
+    def __init__(self, result):
+        self._result = result
+
+    def get_result(self):
+        return self._result
+
+
+@pytest.fixture
+def logger(request):
+    logger = logging.getLogger("tk-toolchain-test-{0}".format(request.node.name))
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    yield logger
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+@requires_queue
+def test_queued_logging(logger):
+    """
+    Ensure records are written in order by another thread, without any being dropped.
+    """
+    handler = SlowHandler()
+    logger.addHandler(handler)
+    queued = QueuedLogging(logger, size=2)
+    queued.start()
+    assert handler not in logger.handlers
+    assert handler in queued.handlers
+
+    for index in range(20):
+        logger.debug("record %d", index)
+    queued.flush()
+
+    assert [record.getMessage() for record in handler.records] == [
+        "record {0}".format(index) for index in range(20)
+    ]
+    assert threading.current_thread() not in handler.threads
+
+    queued.stop()
+    assert handler in logger.handlers
+    logger.debug("after")
+    assert handler.records[-1].getMessage() == "after"
+
+
+@requires_queue
+def test_queued_logging_follows_handler_changes(logger):
+    """
+    Ensure handlers replaced while records are queued are replaced behind the queue.
+    """
+    old_handler = LogCapture()
+    direct_handler = LogCapture()
+    logger.addHandler(old_handler)
+    logger.addHandler(direct_handler)
+    queued = QueuedLogging(logger, direct_handlers=[direct_handler])
+    queued.start()
+    assert direct_handler in logger.handlers
+    logger.info("before")
+
+    # Like Toolkit replacing its log file when an engine starts.
+    logger.removeHandler(old_handler)
+    new_handler = SlowHandler()
+    logger.addHandler(new_handler)
+    assert new_handler not in logger.handlers
+    assert new_handler in queued.handlers
+    assert old_handler not in queued.handlers
+    logger.info("after")
+    queued.flush()
+
+    assert [record.getMessage() for record in old_handler.records] == ["before"]
+    assert [record.getMessage() for record in new_handler.records] == ["after"]
+    assert threading.current_thread() not in new_handler.threads
+    assert len(direct_handler.records) == 2
+
+    queued.stop()
+    assert new_handler in logger.handlers
+    assert old_handler not in logger.handlers
+    logger.removeHandler(new_handler)
+    assert new_handler not in logger.handlers
+    assert direct_handler in logger.handlers
+
+
+@requires_queue
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork.")
+def test_queued_logging_after_fork(logger, tmpdir):
+    """
+    Ensure forked children write their own records.
+    """
+    log_path = str(tmpdir.join("test.log"))
+    handler = logging.FileHandler(log_path)
+    logger.addHandler(handler)
+    queued = QueuedLogging(logger)
+    queued.start()
+    try:
+        logger.info("parent")
+        queued.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logger.info("child")
+                queued.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+    finally:
+        queued.stop()
+        handler.close()
+
+    with open(log_path) as fh:
+        assert fh.read().split() == ["parent", "child"]
+
+
+def test_log_capture():
+    """
+    Ensure the most recent records are kept and formatted on demand.
+    """
+    capture = LogCapture(2)
+    for index in range(3):
+        capture.emit(logging.makeLogRecord({"msg": "record %d", "args": (index,)}))
+
+    assert [record.getMessage() for record in capture.records] == [
+        "record 1",
+        "record 2",
+    ]
+    lines = capture.text.splitlines()
+    assert lines[0] == "(1 older records were dropped)"
+    assert lines[1].endswith("record 1")
+
+    capture.clear()
+    assert capture.records == []
+    assert capture.text == ""
+
+
+def test_failure_log_reporter(logger):
+    """
+    Ensure records are only added to the reports of failed phases.
+    """
+    reporter = FailureLogReporter()
+    reporter.attach(logger)
+
+    def make_report(when, failed):
+        report = FakeReport(when, failed)
+        hook = reporter.pytest_runtest_makereport(None, None)
+        next(hook)
+        with pytest.raises(StopIteration):
+            hook.send(FakeOutcome(report))
+        return report
+
+    logger.info("setting up")
+    assert make_report("setup", False).sections == []
+
+    logger.warning("calling")
+    sections = make_report("call", True).sections
+    assert [title for title, _ in sections] == ["Captured Toolkit log call"]
+    assert "calling" in sections[0][1]
+    assert "setting up" not in sections[0][1]
+
+    assert make_report("teardown", True).sections == []
+
+    reporter.pytest_unconfigure()
+    assert not any(isinstance(handler, LogCapture) for handler in logger.handlers)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sys
+
+import pytest
+
+from pytest_tank_test.materializer import FixtureMaterializer, FixtureModifiedError
+
+
+@pytest.fixture
+def fixtures_root(tmpdir):
+    """
+    Fixtures folder with a small configuration.
+    """
+    fixtures = tmpdir.mkdir("fixtures")
+    config = fixtures.mkdir("config")
+    config.join("env").ensure(dir=True).join("project.yml").write("engines: {}")
+    config.join("core").ensure(dir=True).join("roots.yml").write("primary: {}")
+    config.mkdir("empty")
+    if sys.platform != "win32":
+        os.symlink("env/project.yml", str(config.join("link.yml")))
+    return fixtures
+
+
+def create_materializer(tmpdir, fixtures_root, mode=FixtureMaterializer.AUTO):
+    return FixtureMaterializer(
+        str(fixtures_root), str(tmpdir.mkdir("snapshots-" + mode)), mode
+    )
+
+
+@pytest.mark.parametrize("mode", FixtureMaterializer.MODES)
+def test_materialize(tmpdir, fixtures_root, mode):
+    """
+    Ensure views contain the whole fixture.
+    """
+    materializer = create_materializer(tmpdir, fixtures_root, mode)
+    view = tmpdir.join("view")
+    assert materializer.materialize("config", str(view)) == str(view)
+
+    assert view.join("env", "project.yml").read() == "engines: {}"
+    assert view.join("core", "roots.yml").read() == "primary: {}"
+    assert view.join("empty").check(dir=True)
+    if sys.platform != "win32":
+        assert view.join("link.yml").readlink() == "env/project.yml"
+
+    stats = materializer.stats
+    assert stats["views"] == 1
+    assert stats["reflinked"] + stats["hardlinked"] + stats["copied"] == 2
+    if mode == FixtureMaterializer.COPY:
+        assert stats["copied"] == 2
+    if mode == FixtureMaterializer.HARDLINK:
+        assert stats["hardlinked"] == 2
+        snapshot = materializer.get_snapshot("config")
+        assert os.path.samefile(
+            str(view.join("env", "project.yml")),
+            os.path.join(snapshot, "env", "project.yml"),
+        )
+    assert "materialized 1 fixture view(s)" in materializer.format_stats()
+
+
+@pytest.mark.parametrize("mode", [FixtureMaterializer.AUTO, FixtureMaterializer.COPY])
+def test_views_are_isolated(tmpdir, fixtures_root, mode):
+    """
+    Ensure modifying a view doesn't affect the fixture or other views.
+    """
+    materializer = create_materializer(tmpdir, fixtures_root, mode)
+    first = tmpdir.join("first")
+    materializer.materialize("config", str(first))
+    first.join("env", "project.yml").write("modified")
+    first.join("core", "roots.yml").remove()
+
+    second = tmpdir.join("second")
+    materializer.materialize("config", str(second))
+    assert second.join("env", "project.yml").read() == "engines: {}"
+    assert second.join("core", "roots.yml").check()
+    assert fixtures_root.join("config", "env", "project.yml").read() == "engines: {}"
+
+
+def test_snapshot_is_taken_once(tmpdir, fixtures_root):
+    """
+    Ensure fixtures are only read once per session.
+    """
+    materializer = create_materializer(tmpdir, fixtures_root)
+    materializer.materialize("config", str(tmpdir.join("first")))
+    fixtures_root.join("config", "env", "project.yml").write("changed")
+    materializer.materialize("config", str(tmpdir.join("second")))
+    assert tmpdir.join("second", "env", "project.yml").read() == "engines: {}"
+
+
+def test_hardlink_modifications_are_detected(tmpdir, fixtures_root):
+    """
+    Ensure in-place modifications of hardlinked files are reported and
+    don't leak into later views.
+    """
+    materializer = create_materializer(
+        tmpdir, fixtures_root, FixtureMaterializer.HARDLINK
+    )
+    first = tmpdir.join("first")
+    materializer.materialize("config", str(first))
+    materializer.check_snapshot("config")
+
+    # Replacing a file is fine.
+    first.join("core", "roots.yml").remove()
+    first.join("core", "roots.yml").write("replaced")
+    materializer.check_snapshot("config")
+
+    first.join("env", "project.yml").write("modified in place")
+    with pytest.raises(FixtureModifiedError) as e:
+        materializer.check_snapshot("config")
+    assert os.path.join("env", "project.yml") in str(e.value)
+
+    second = tmpdir.join("second")
+    materializer.materialize("config", str(second))
+    assert second.join("env", "project.yml").read() == "engines: {}"
+
+
+def test_errors(tmpdir, fixtures_root):
+    """
+    Ensure invalid modes and missing fixtures are reported.
+    """
+    with pytest.raises(ValueError):
+        FixtureMaterializer(str(fixtures_root), str(tmpdir), "overlay")
+
+    materializer = create_materializer(tmpdir, fixtures_root)
+    with pytest.raises(RuntimeError):
+        materializer.materialize("missing", str(tmpdir.join("view")))
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+
+import pytest
+from six.moves import cPickle as pickle
+
+from pytest_tank_test.mockgun_snapshots import MockgunSnapshots, load_seed
+
+
+class FakeShotgun(object):
+    """
+    Stands in for Mockgun's Shotgun class.
+    """
+
+    _schema_paths = (None, None)
+    loads = 0
+
+    @classmethod
+    def set_schema_paths(cls, schema_path, schema_entity_path):
+        cls._schema_paths = (schema_path, schema_entity_path)
+
+    @classmethod
+    def get_schema_paths(cls):
+        return cls._schema_paths
+
+    def __init__(self, base_url, script_name, api_key):
+        schema_path, schema_entity_path = self.get_schema_paths()
+        with open(schema_path, "rb") as fh:
+            self._schema = pickle.load(fh)
+        with open(schema_entity_path, "rb") as fh:
+            self._schema_entity = pickle.load(fh)
+        self._db = dict((entity, {}) for entity in self._schema)
+        self.finds = 0
+        FakeShotgun.loads += 1
+
+
+@pytest.fixture
+def schema_folder(tmpdir):
+    folder = tmpdir.mkdir("schema")
+    schema = {
+        "Project": {"name": {}, "id": {}, "type": {}},
+        "Shot": {"code": {}, "project": {}, "id": {}, "type": {}},
+    }
+    with open(str(folder.join("schema.pickle")), "wb") as fh:
+        pickle.dump(schema, fh)
+    with open(str(folder.join("schema_entity.pickle")), "wb") as fh:
+        pickle.dump(dict((name, {}) for name in schema), fh)
+    FakeShotgun.loads = 0
+    return str(folder)
+
+
+@pytest.fixture
+def seed(tmpdir):
+    path = tmpdir.join("seed.json")
+    path.write(
+        json.dumps(
+            [
+                {"type": "Project", "id": 1, "name": "Big Buck Bunny"},
+                {
+                    "type": "Shot",
+                    "id": 2,
+                    "code": "shot_010",
+                    "project": {"type": "Project", "id": 1},
+                },
+            ]
+        )
+    )
+    return str(path)
+
+
+def test_clones_are_isolated(schema_folder, seed):
+    """
+    Ensure the database is built once and each clone gets its own copy.
+    """
+    snapshots = MockgunSnapshots(FakeShotgun)
+    first = snapshots.clone(schema_folder, seed)
+    first._db["Shot"][2]["code"] = "modified"
+    first._db["Shot"][3] = {"type": "Shot", "id": 3}
+    first.finds = 5
+
+    second = snapshots.clone(schema_folder, seed)
+    assert second is not first
+    assert second._db["Shot"] == {
+        2: {
+            "type": "Shot",
+            "id": 2,
+            "code": "shot_010",
+            "project": {"type": "Project", "id": 1},
+        }
+    }
+    assert second._db["Project"][1]["name"] == "Big Buck Bunny"
+    assert second.finds == 0
+    assert second._schema is first._schema
+
+    empty = snapshots.clone(schema_folder)
+    assert empty._db == {"Project": {}, "Shot": {}}
+
+    assert FakeShotgun.loads == 2
+    assert FakeShotgun.get_schema_paths() == (None, None)
+    stats = snapshots.stats
+    assert stats["snapshots"] == 2
+    assert stats["clones"] == 3
+    assert stats["saved"] >= 0
+    assert snapshots.format_stats().startswith("built 2 mock Shotgun snapshot(s)")
+
+
+def test_invalid_inputs(schema_folder, tmpdir):
+    """
+    Ensure invalid schemas and seeds are reported.
+    """
+    snapshots = MockgunSnapshots(FakeShotgun)
+    with pytest.raises(RuntimeError, match="does not contain a Mockgun schema"):
+        snapshots.clone(str(tmpdir))
+
+    unknown = tmpdir.join("unknown.yml")
+    unknown.write("- {type: Asset, id: 1}\n")
+    assert load_seed(str(unknown)) == [{"type": "Asset", "id": 1}]
+    with pytest.raises(RuntimeError, match="Asset is not an entity type"):
+        snapshots.clone(schema_folder, str(unknown))
+
+    invalid = tmpdir.join("invalid.json")
+    invalid.write(json.dumps({"type": "Shot"}))
+    with pytest.raises(RuntimeError, match="should contain a list of entities"):
+        load_seed(str(invalid))
@@ -9,7 +9,16 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import json
+import logging
 import os
+import sys
+import types
+
+import pytest
+
+import pytest_tank_test
+from tk_toolchain.bootstrap import compute_bootstrap
 
 
 def test_shotgun_repos_root(repos_root):
@@ -33,3 +42,161 @@ def test_shotgun_test_engine_env_var(current_repo_root):
     assert os.environ.get("SHOTGUN_TEST_ENGINE") == os.path.join(
         os.path.join(current_repo_root, "tk_toolchain", "tk_testengine")
     )
+
+
+class FakeLogManager(object):
+    """
+    Stands in for tank.LogManager.
+    """
+
+    log_names = []
+    log_file = "tk-test.log"
+    root_logger = logging.getLogger("tk-toolchain-fake-sgtk")
+
+    def initialize_base_file_handler(self, log_name):
+        self.log_names.append(log_name)
+
+    def initialize_custom_handler(self):
+        pass
+
+
+class FakeConfig(object):
+    """
+    Stands in for the pytest config object.
+    """
+
+    def __init__(self, workerinput=None):
+        if workerinput is not None:
+            self.workerinput = workerinput
+
+    def getoption(self, name, default=None):
+        return default
+
+    def getini(self, name):
+        return []
+
+    def addinivalue_line(self, name, line):
+        pass
+
+
+class FakeNode(object):
+    """
+    Stands in for a pytest-xdist worker node.
+    """
+
+    def __init__(self, config, workerinput):
+        self.config = config
+        self.workerinput = workerinput
+
+
+@pytest.fixture
+def isolated_process(tmpdir, monkeypatch):
+    """
+    Ensure the bootstrap can't leak into the test process.
+    """
+    monkeypatch.setenv("TK_TOOLCHAIN_CACHE_LOCATION", tmpdir.join("cache").strpath)
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setattr(os, "environ", dict(os.environ))
+    tank = types.ModuleType("tank")
+    tank.LogManager = FakeLogManager
+    monkeypatch.setitem(sys.modules, "tank", tank)
+    FakeLogManager.log_names = []
+
+
+@pytest.fixture
+def fake_app_root(tmpdir):
+    """
+    Create an app cloned next to tk-core.
+    """
+    repos = tmpdir.mkdir("repos")
+    tk_core = repos.mkdir("tk-core")
+    for path in [".git", "python", "tests/python"]:
+        tk_core.ensure(path, dir=True)
+    tk_core.ensure("_core_upgrader.py")
+
+    app = repos.mkdir("tk-multi-app")
+    for path in [".git", "tests/python", "tests/fixtures"]:
+        app.ensure(path, dir=True)
+    app.ensure("app.py")
+    return app
+
+
+def test_compute_bootstrap(isolated_process, fake_app_root):
+    """
+    Ensure the bootstrap only contains serializable values.
+    """
+    repos_root = fake_app_root.dirpath()
+    bootstrap = compute_bootstrap(fake_app_root.strpath)
+
+    assert [path for _, path in bootstrap["sys_paths"]] == [
+        repos_root.join("tk-core", "python").strpath,
+        repos_root.join("tk-core", "tests", "python").strpath,
+        fake_app_root.join("tests", "python").strpath,
+    ]
+    assert bootstrap["environment"]["SHOTGUN_REPOS_ROOT"] == repos_root.strpath
+    assert bootstrap["environment"]["SHOTGUN_CURRENT_REPO_ROOT"] == (
+        fake_app_root.strpath
+    )
+    assert "SHOTGUN_TEST_ENGINE" in bootstrap["environment"]
+    assert bootstrap["fixtures"] == fake_app_root.join("tests", "fixtures").strpath
+    assert json.loads(json.dumps(bootstrap)) == bootstrap
+
+    assert compute_bootstrap(repos_root.strpath) is None
+
+
+def test_xdist_workers_reuse_bootstrap(isolated_process, fake_app_root, monkeypatch):
+    """
+    Ensure workers apply the controller's bootstrap without discovering it again.
+    """
+    controller = FakeConfig()
+    monkeypatch.chdir(fake_app_root.strpath)
+    pytest_tank_test.pytest_configure(controller)
+    pytest_tank_test._ensure_logging_initialized(controller)
+    assert FakeLogManager.log_names == ["tk-test"]
+
+    node = FakeNode(controller, {"workerid": "gw3"})
+    pytest_tank_test.pytest_configure_node(node)
+
+    def fail(cur_dir):
+        raise AssertionError("Workers should not discover the environment.")
+
+    monkeypatch.setattr(pytest_tank_test, "compute_bootstrap", fail)
+    os.environ.pop("TK_TEST_FIXTURES")
+    sys.path.remove(fake_app_root.join("tests", "python").strpath)
+
+    worker = FakeConfig(node.workerinput)
+    pytest_tank_test.pytest_configure(worker)
+    pytest_tank_test._ensure_logging_initialized(worker)
+    assert FakeLogManager.log_names == ["tk-test", "tk-test-gw3"]
+    assert os.environ["TK_TEST_FIXTURES"] == (
+        fake_app_root.join("tests", "fixtures").strpath
+    )
+    assert sys.path[0] == fake_app_root.join("tests", "python").strpath
+
+    pytest_tank_test.pytest_unconfigure(controller)
+    pytest_tank_test.pytest_unconfigure(worker)
+
+
+def test_logging_is_lazy(isolated_process, fake_app_root, monkeypatch):
+    """
+    Ensure Toolkit logging is only initialized once Toolkit has been imported.
+    """
+    monkeypatch.delitem(sys.modules, "tank")
+    config = FakeConfig()
+    monkeypatch.chdir(fake_app_root.strpath)
+    pytest_tank_test.pytest_configure(config)
+    assert config._tank_test_startup_duration > 0
+    assert "pytest_tank_test: ready" in pytest_tank_test.pytest_report_header(config)
+
+    pytest_tank_test._ensure_logging_initialized(config)
+    assert FakeLogManager.log_names == []
+    assert config._tank_test_logging_duration is None
+
+    tank = types.ModuleType("tank")
+    tank.LogManager = FakeLogManager
+    monkeypatch.setitem(sys.modules, "tank", tank)
+    pytest_tank_test._ensure_logging_initialized(config)
+    pytest_tank_test._ensure_logging_initialized(config)
+    assert FakeLogManager.log_names == ["tk-test"]
+    assert config._tank_test_logging_duration is not None
+    pytest_tank_test.pytest_unconfigure(config)
@@ -9,11 +9,13 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import pickle
+
 import pytest
 import os
 
 
-from tk_toolchain.repo import Repository
+from tk_toolchain.repo import Repository, RepoProfile
 
 
 def test_find_root(current_repo_root, tmpdir):
@@ -30,6 +32,91 @@ def test_find_root(current_repo_root, tmpdir):
     assert "is not inside a repository" in str(exception)
 
 
+@pytest.fixture
+def listdir_calls(monkeypatch):
+    """
+    Count the folders listed while resolving repository roots.
+    """
+    Repository.clear_root_cache()
+    calls = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        calls.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(os, "listdir", counting_listdir)
+    yield calls
+    Repository.clear_root_cache()
+
+
+def test_find_root_is_memoized(tmpdir, listdir_calls):
+    """
+    Ensure folders visited while finding a root are not listed again.
+    """
+    root = tmpdir.ensure(".git", dir=True).dirpath()
+    deep_folder = root.ensure("a", "b", "c", dir=True)
+
+    assert Repository.find_root(deep_folder.strpath) == root.strpath
+    assert len(listdir_calls) == 4
+
+    del listdir_calls[:]
+    assert Repository.find_root(deep_folder.strpath) == root.strpath
+    assert Repository.find_root(root.join("a").strpath) == root.strpath
+    assert Repository.find_root(root.strpath) == root.strpath
+    assert listdir_calls == []
+
+    # Only the new folder and the folder it was created in need to be listed
+    # when a sibling is looked up.
+    sibling = root.ensure("a", "d", dir=True)
+    assert Repository.find_root(sibling.strpath) == root.strpath
+    assert listdir_calls == [sibling.strpath, root.join("a").strpath]
+
+
+def test_find_root_cache_invalidation(tmpdir, listdir_calls):
+    """
+    Ensure cached roots are discarded when the source control folder changes.
+    """
+    root = tmpdir.ensure("repo", ".git", dir=True).dirpath()
+    folder = root.ensure("folder", dir=True)
+    assert Repository.find_root(folder.strpath) == root.strpath
+
+    # The repository went away, so the folder is not inside a repository anymore.
+    root.join(".git").remove()
+    with pytest.raises(RuntimeError):
+        Repository.find_root(folder.strpath)
+
+    # And the failure is remembered until a repository is created again.
+    del listdir_calls[:]
+    with pytest.raises(RuntimeError):
+        Repository.find_root(folder.strpath)
+    assert listdir_calls == []
+
+    root.ensure(".hg", dir=True)
+    assert Repository.find_root(folder.strpath) == root.strpath
+
+
+def test_find_root_nested_repository(tmpdir, listdir_calls):
+    """
+    Ensure cached roots are discarded when a repository is created in between
+    or when the folder is removed.
+    """
+    root = tmpdir.ensure("repo", ".git", dir=True).dirpath()
+    deep_folder = root.ensure("nested", "a", "b", dir=True)
+    assert Repository.find_root(deep_folder.strpath) == root.strpath
+
+    nested_root = root.ensure("nested", ".git", dir=True).dirpath()
+    assert Repository.find_root(deep_folder.strpath) == nested_root.strpath
+    assert Repository.find_root(root.join("nested", "a").strpath) == (
+        nested_root.strpath
+    )
+
+    # Removed folders are looked up again, like folders that were never seen.
+    deep_folder.remove()
+    with pytest.raises(OSError):
+        Repository.find_root(deep_folder.strpath)
+
+
 def test_repo_init(current_repo_root):
     """
     Ensure we can create a repository from a folder.
@@ -168,3 +255,39 @@ def test_ensure_test_repositories_exists(repo_name):
         "Repository %s does not exist. Clone the master branch from Github for the test suite to pass."
         % repo_path
     )
+
+
+def test_profile_answers_predicates(tmpdir, monkeypatch):
+    """
+    Ensure the is_* methods are answered from a single listing of the root.
+    """
+    root = tmpdir.ensure(".git", dir=True).dirpath()
+    root.ensure("app.py")
+    root.ensure("core", dir=True)
+    repo = Repository(root.strpath)
+
+    def fail(path):
+        raise AssertionError("{0} should not have been tested.".format(path))
+
+    monkeypatch.setattr(os.path, "exists", fail)
+    _test_component(repo, is_app=True)
+    assert repo.is_config() is False
+    assert repo.profile.contains("core")
+
+
+def test_profile_is_immutable():
+    """
+    Ensure profiles can't be modified, but can be compared and pickled.
+    """
+    profile = RepoProfile.from_names(["engine.py", "README.md", "env"])
+    assert profile.contains("engine.py")
+    assert profile.contains("env")
+    assert profile.contains("app.py") is False
+    assert profile == RepoProfile(profile.flags)
+    assert pickle.loads(pickle.dumps(profile)) == profile
+
+    with pytest.raises(AttributeError):
+        profile._flags = 0
+
+    with pytest.raises(ValueError):
+        profile.contains("README.md")
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+
+import pytest
+
+from pytest_tank_test import sharding
+
+
+class FakeItem(object):
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+
+
+class FakeHook(object):
+    def pytest_deselected(self, items):
+        pass
+
+
+class FakeConfig(object):
+    hook = FakeHook()
+
+
+NODEIDS = ["tests/test_module.py::test_{0}".format(index) for index in range(20)]
+
+
+@pytest.mark.parametrize(
+    "value,expected", [("1/1", (0, 1)), ("2/4", (1, 4)), ("4/4", (3, 4))]
+)
+def test_parse_shard(value, expected):
+    """
+    Ensure shards are numbered from 1.
+    """
+    assert sharding.parse_shard(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "1/0", "1", "a/b", "1/2/3"])
+def test_parse_invalid_shard(value):
+    """
+    Ensure invalid shards are reported.
+    """
+    with pytest.raises(pytest.UsageError):
+        sharding.parse_shard(value)
+
+
+def test_hashing_without_history():
+    """
+    Ensure tests are hashed when no durations are known.
+    """
+    assignment = sharding.assign_shards(NODEIDS, 3, {})[0]
+    assert sorted(assignment) == sorted(NODEIDS)
+    # Each test's shard doesn't depend on the other tests.
+    assert sharding.assign_shards(NODEIDS[:5], 3, {})[0] == dict(
+        (nodeid, assignment[nodeid]) for nodeid in NODEIDS[:5]
+    )
+
+
+def test_balancing():
+    """
+    Ensure shards are balanced based on durations.
+    """
+    durations = {"a": 5.0, "b": 4.0, "c": 3.0, "d": 3.0, "e": 3.0}
+    assignment, totals = sharding.assign_shards(sorted(durations), 2, durations)
+    assert sorted(totals) == [8.0, 10.0]
+    assert assignment["a"] != assignment["b"]
+
+    # Unknown tests are assumed to take the median duration.
+    assignment, totals = sharding.assign_shards(sorted(durations) + ["f"], 2, durations)
+    assert sorted(totals) == [10.0, 11.0]
+
+
+def test_shards_are_complete():
+    """
+    Ensure every test runs in exactly one shard.
+    """
+    durations = dict((nodeid, float(index)) for index, nodeid in enumerate(NODEIDS))
+    durations.pop(NODEIDS[3])
+
+    selected = []
+    for index in range(4):
+        selector = sharding.ShardSelector(index, 4, durations)
+        items = [FakeItem(nodeid) for nodeid in reversed(NODEIDS)]
+        selector.pytest_collection_modifyitems(FakeConfig(), items)
+        assert "shard {0}/4".format(index + 1) in (
+            selector.pytest_report_collectionfinish(None)
+        )
+        selected.extend(item.nodeid for item in items)
+
+    assert sorted(selected) == sorted(NODEIDS)
+
+
+def test_load_durations(tmpdir):
+    """
+    Ensure durations can be read from a file or from a timing report.
+    """
+    path = tmpdir.join("durations.json")
+    path.write(json.dumps({"durations": {"a": 1.0}}))
+    assert sharding.load_durations(str(path)) == {"a": 1.0}
+
+    path.write(
+        json.dumps(
+            {"tests": [{"nodeid": "a", "setup": 1.0, "call": 2.0, "imports": {}}]}
+        )
+    )
+    assert sharding.load_durations(str(path)) == {"a": 3.0}
+
+    with pytest.raises(pytest.UsageError):
+        sharding.load_durations(str(tmpdir.join("missing.json")))
+
+
+class FakeCache(object):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class FakeReport(object):
+    def __init__(self, nodeid, duration):
+        self.nodeid = nodeid
+        self.duration = duration
+
+
+def run_session(cache, nodeids, read_only):
+    """
+    Run the tests, taking a different time than in previous sessions, and
+    remember their durations.
+    """
+    config = FakeConfig()
+    config.cache = cache
+    store = sharding.DurationStore(config, read_only=read_only)
+    for index, nodeid in enumerate(nodeids):
+        store.pytest_runtest_logreport(FakeReport(nodeid, float(len(nodeids) - index)))
+    store.pytest_sessionfinish(None)
+    return store
+
+
+def test_shards_run_in_turn_are_complete():
+    """
+    Ensure shards run one after another with the same cache run every test once.
+    """
+    cache = FakeCache()
+    run_session(cache, sorted(NODEIDS), read_only=False)
+
+    selected = []
+    for index in range(4):
+        config = FakeConfig()
+        config.cache = cache
+        store = sharding.DurationStore(config, read_only=True)
+        items = [FakeItem(nodeid) for nodeid in NODEIDS]
+        sharding.ShardSelector(index, 4, store.durations).pytest_collection_modifyitems(
+            FakeConfig(), items
+        )
+        selected.extend(item.nodeid for item in items)
+        run_session(cache, [item.nodeid for item in reversed(items)], read_only=True)
+
+    assert sorted(selected) == sorted(NODEIDS)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import sys
+import types
+
+import pytest
+from six.moves import builtins
+
+from pytest_tank_test.timing import PhaseTimer
+
+
+class FakeConfig(object):
+    pass
+
+
+class FakeCall(object):
+    def __init__(self, when, start):
+        self.when = when
+        self.start = start
+
+
+class FakeReport(object):
+    def __init__(self, nodeid, when, duration):
+        self.nodeid = nodeid
+        self.when = when
+        self.duration = duration
+
+
+class FakeOutcome(object):
+    def __init__(self, result):
+        self._result = result
+
+    def get_result(self):
+        return self._result
+
+
+class FakeTerminalReporter(object):
+    def __init__(self):
+        self.lines = []
+
+    def write_sep(self, sep, title):
+        self.lines.append(title)
+
+    def write_line(self, line):
+        self.lines.append(line)
+
+
+class TankTestBase(object):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+
+@pytest.fixture
+def tank_test_base(monkeypatch):
+    """
+    Fake tank_test.tank_test_base module.
+    """
+    module = types.ModuleType("tank_test.tank_test_base")
+    module.TankTestBase = TankTestBase
+    monkeypatch.setitem(sys.modules, "tank_test.tank_test_base", module)
+    return module
+
+
+@pytest.fixture
+def timer(tmpdir):
+    timer = PhaseTimer(FakeConfig(), str(tmpdir.join("timings.json")), top=1)
+    timer.install()
+    yield timer
+    timer.uninstall()
+
+
+def run_test(timer, nodeid, body):
+    """
+    Drive the hooks of the timer as pytest would for a test.
+    """
+    protocol = timer.pytest_runtest_protocol(None, None)
+    next(protocol)
+    timer.pytest_runtest_setup(None)
+    for index, when in enumerate(["setup", "call", "teardown"]):
+        if when == "call":
+            body()
+        makereport = timer.pytest_runtest_makereport(None, FakeCall(when, index))
+        next(makereport)
+        report = FakeReport(nodeid, when, 1.0)
+        with pytest.raises(StopIteration):
+            makereport.send(FakeOutcome(report))
+        # Reports are serialized when sent by pytest-xdist workers.
+        report.tank_timing = json.loads(json.dumps(report.tank_timing))
+        timer.pytest_runtest_logreport(report)
+    with pytest.raises(StopIteration):
+        next(protocol)
+
+
+def test_phases(timer, tank_test_base, tmpdir, monkeypatch):
+    """
+    Ensure the phases of the session and of the tests are reported.
+    """
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+    timer.record("bootstrap", 0.5)
+
+    def body():
+        test = tank_test_base.TankTestBase()
+        test.setUp()
+        timer.record("logging", 0.25)
+        __import__("colorsys")
+        test.tearDown()
+
+    run_test(timer, "test_a.py::test_a", body)
+    run_test(timer, "test_b.py::test_b", lambda: None)
+
+    report = timer.get_report()
+    assert report["session"] == {"bootstrap": 0.5}
+    assert [test["nodeid"] for test in report["tests"]] == [
+        "test_a.py::test_a",
+        "test_b.py::test_b",
+    ]
+    test = report["tests"][0]
+    assert test["setup"] == test["call"] == test["teardown"] == 1.0
+    assert test["logging"] == 0.25
+    assert "colorsys" in test["imports"]
+    assert test["tank_test_base_setup"] >= 0
+    assert test["tank_test_base_teardown"] >= 0
+    assert "logging" not in report["tests"][1]
+
+    terminal = FakeTerminalReporter()
+    timer.pytest_terminal_summary(terminal)
+    assert "slowest 1 imports:" in terminal.lines
+
+    timer.pytest_sessionfinish(None)
+    with open(str(tmpdir.join("timings.json"))) as fh:
+        assert json.load(fh)["tests"] == report["tests"]
+
+    # Everything was restored.
+    assert tank_test_base.TankTestBase.setUp is TankTestBase.__dict__["setUp"]
+    assert builtins.__import__ != timer._timed_import
+
+
+def test_nested_imports(timer, tmpdir, monkeypatch):
+    """
+    Ensure nested and relative imports are timed separately.
+    """
+    package = tmpdir.mkdir("tk_timed_package")
+    package.join("__init__.py").write("")
+    package.join("outer.py").write("from . import inner\n")
+    package.join("inner.py").write("import time\ntime.sleep(0.2)\n")
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    def body():
+        __import__("tk_timed_package.outer")
+        # Already imported modules are not timed again.
+        __import__("tk_timed_package.inner")
+
+    try:
+        run_test(timer, "test_a.py::test_a", body)
+    finally:
+        for name in [
+            "tk_timed_package",
+            "tk_timed_package.outer",
+            "tk_timed_package.inner",
+        ]:
+            sys.modules.pop(name, None)
+
+    imports = timer.get_report()["tests"][0]["imports"]
+    assert sorted(imports) == [
+        "tk_timed_package",
+        "tk_timed_package.inner",
+        "tk_timed_package.outer",
+    ]
+    assert imports["tk_timed_package.inner"] >= 0.2
+    assert imports["tk_timed_package.outer"] < 0.2
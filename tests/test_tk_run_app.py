@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import stat
+import sys
+import types
+
+import pytest
+import yaml
+
+from tk_toolchain.cmd_line_tools import tk_run_app
+from tk_toolchain.cmd_line_tools.tk_run_app import config_generator
+from tk_toolchain.cmd_line_tools.tk_run_app.context_cache import ContextCache
+from tk_toolchain.cmd_line_tools.tk_run_app.session_cache import SessionCache
+from tk_toolchain.cmd_line_tools.tk_run_app.watcher import SourceWatcher
+
+
+def create_bundle(parent, name, frameworks=()):
+    """
+    Create a bundle requiring the given frameworks.
+    """
+    info = {"frameworks": [{"name": fw, "version": ver} for fw, ver in frameworks]}
+    bundle = parent.ensure(name, dir=True)
+    bundle.join("info.yml").write(yaml.safe_dump(info))
+    return bundle
+
+
+@pytest.fixture
+def repos_root(tmpdir, monkeypatch):
+    """
+    Folder with an app using frameworks that depend on each other.
+    """
+    monkeypatch.setenv("TK_TOOLCHAIN_CACHE_LOCATION", tmpdir.join("cache").strpath)
+    repos_root = tmpdir.mkdir("repos")
+    create_bundle(
+        repos_root,
+        "tk-multi-app",
+        [("tk-framework-qtwidgets", "v2.x.x"), ("tk-framework-shotgunutils", "v5.x.x")],
+    )
+    create_bundle(
+        repos_root, "tk-framework-qtwidgets", [("tk-framework-shotgunutils", "v4.x.x")],
+    )
+    create_bundle(
+        repos_root, "tk-framework-shotgunutils", [("tk-framework-qtwidgets", "v2.x.x")],
+    )
+    create_bundle(repos_root, "tk-framework-unused")
+    return repos_root
+
+
+def test_resolve_frameworks(repos_root):
+    """
+    Ensure frameworks are resolved transitively and only once.
+    """
+    assert config_generator.resolve_frameworks(
+        repos_root.join("tk-multi-app").strpath, repos_root.strpath
+    ) == {
+        "tk-framework-qtwidgets_v2.x.x": "tk-framework-qtwidgets",
+        "tk-framework-shotgunutils_v5.x.x": "tk-framework-shotgunutils",
+        "tk-framework-shotgunutils_v4.x.x": "tk-framework-shotgunutils",
+    }
+
+    assert (
+        config_generator.resolve_frameworks(
+            repos_root.join("tk-framework-unused").strpath, repos_root.strpath
+        )
+        == {}
+    )
+
+
+def test_missing_framework(repos_root):
+    """
+    Ensure missing frameworks are reported.
+    """
+    create_bundle(repos_root, "tk-multi-broken", [("tk-framework-missing", "v1.x.x")])
+    with pytest.raises(RuntimeError) as exception:
+        config_generator.resolve_frameworks(
+            repos_root.join("tk-multi-broken").strpath, repos_root.strpath
+        )
+    assert "tk-framework-missing_v1.x.x (required by tk-multi-broken)" in str(
+        exception.value
+    )
+
+
+def test_config_generation(repos_root):
+    """
+    Ensure the configuration is generated once per set of info.yml files.
+    """
+    app_root = repos_root.join("tk-multi-app")
+    config_location = config_generator.get_config_location(
+        app_root.strpath, repos_root.strpath
+    )
+
+    assert os.path.exists(os.path.join(config_location, "core", "core_api.yml"))
+    assert os.path.exists(
+        os.path.join(config_location, "core", "hooks", "pick_environment.py")
+    )
+    with open(os.path.join(config_location, "env", "test.yml")) as fh:
+        environment = yaml.safe_load(fh)
+
+    assert sorted(environment["frameworks"]) == [
+        "tk-framework-qtwidgets_v2.x.x",
+        "tk-framework-shotgunutils_v4.x.x",
+        "tk-framework-shotgunutils_v5.x.x",
+    ]
+    assert environment["frameworks"]["tk-framework-qtwidgets_v2.x.x"] == {
+        "location": {
+            "type": "path",
+            "path": "$SHOTGUN_REPOS_ROOT/tk-framework-qtwidgets",
+        }
+    }
+    apps = environment["engines"]["tk-testengine"]["apps"]
+    assert list(apps) == [config_generator.APP_INSTANCE_NAME]
+
+    # Same info.yml files, same configuration.
+    assert (
+        config_generator.get_config_location(app_root.strpath, repos_root.strpath)
+        == config_location
+    )
+
+    # Changing a framework's requirements generates a new configuration.
+    create_bundle(repos_root, "tk-framework-qtwidgets")
+    new_location = config_generator.get_config_location(
+        app_root.strpath, repos_root.strpath
+    )
+    assert new_location != config_location
+    with open(os.path.join(new_location, "env", "test.yml")) as fh:
+        assert sorted(yaml.safe_load(fh)["frameworks"]) == [
+            "tk-framework-qtwidgets_v2.x.x",
+            "tk-framework-shotgunutils_v5.x.x",
+        ]
+
+
+def test_multi_app_config_generation(repos_root, tmpdir):
+    """
+    Ensure several applications share one environment, each with its own instance.
+    """
+    first = repos_root.join("tk-multi-app")
+    second = create_bundle(
+        repos_root, "tk-multi-other", [("tk-framework-widget", "v1.x.x")]
+    )
+    create_bundle(repos_root, "tk-framework-widget")
+    # Another clone of an app with the same name.
+    third = create_bundle(tmpdir.mkdir("forks"), "tk-multi-app")
+
+    app_roots = [first.strpath, second.strpath, third.strpath]
+    assert config_generator.get_app_instance_names(app_roots) == [
+        ("tk-multi-app", first.strpath),
+        ("tk-multi-other", second.strpath),
+        ("tk-multi-app_2", third.strpath),
+    ]
+
+    config_location = config_generator.get_config_location(
+        app_roots, repos_root.strpath
+    )
+    with open(os.path.join(config_location, "env", "test.yml")) as fh:
+        environment = yaml.safe_load(fh)
+    assert environment["engines"]["tk-testengine"]["apps"] == {
+        "tk-multi-app": {"location": {"type": "path", "path": first.strpath}},
+        "tk-multi-other": {"location": {"type": "path", "path": second.strpath}},
+        "tk-multi-app_2": {"location": {"type": "path", "path": third.strpath}},
+    }
+    assert sorted(environment["frameworks"]) == [
+        "tk-framework-qtwidgets_v2.x.x",
+        "tk-framework-shotgunutils_v4.x.x",
+        "tk-framework-shotgunutils_v5.x.x",
+        "tk-framework-widget_v1.x.x",
+    ]
+
+    # Same applications, same configuration.
+    assert (
+        config_generator.get_config_location(app_roots, repos_root.strpath)
+        == config_location
+    )
+    # A single application keeps its usual configuration.
+    assert config_generator.get_config_location(
+        first.strpath, repos_root.strpath
+    ) == config_generator.get_config_location([first.strpath], repos_root.strpath)
+
+
+def test_source_watcher(tmpdir):
+    """
+    Ensure changes are reported once files stop changing, ignoring generated files.
+    """
+    app = tmpdir.mkdir("tk-multi-app")
+    app.join("app.py").write("import sgtk\n")
+    app.join("info.yml").write("frameworks: []\n")
+    app.mkdir("python").join("dialog.py").write("")
+    app.mkdir("tests").join("test_app.py").write("")
+
+    watcher = SourceWatcher([app.strpath])
+    assert watcher.poll() == []
+
+    app.join("app.py").write("import sgtk\nimport os\n")
+    app.join("python", "widget.py").write("")
+    app.join("info.yml").remove()
+    app.join("python", "dialog.pyc").write("")
+    app.join("tests", "test_app.py").write("assert True\n")
+    app.join("python", "dialog.py.swp").write("")
+    # Changes are held back while files keep changing.
+    assert watcher.poll() == []
+    app.join("python", "dialog.py").write("import os\n")
+    assert watcher.poll() == []
+
+    assert watcher.poll() == sorted(
+        [
+            app.join("app.py").strpath,
+            app.join("info.yml").strpath,
+            app.join("python", "dialog.py").strpath,
+            app.join("python", "widget.py").strpath,
+        ]
+    )
+    assert watcher.poll() == []
+
+
+class FakeShotgun(object):
+    def __init__(self):
+        self.queries = []
+
+    def find_one(self, entity_type, filters, fields=None, order=None):
+        self.queries.append((entity_type, filters, fields))
+        if entity_type == "Shot" and filters == [["id", "is", 404]]:
+            return None
+        return {"type": entity_type, "id": 1, "name": "Big Buck Bunny"}
+
+
+class FakeUser(object):
+    host = "https://example.shotgunstudio.com"
+
+    def __init__(self):
+        self.connections = []
+
+    def create_sg_connection(self):
+        self.connections.append(FakeShotgun())
+        return self.connections[-1]
+
+
+def test_context_cache(tmpdir):
+    """
+    Ensure context entities are cached per site, type and id until they expire.
+    """
+    now = [1000.0]
+    path = tmpdir.join("contexts.json").strpath
+    cache = ContextCache(path, ttl_hours=1, clock=lambda: now[0])
+    cache.set("https://a", "Project", None, {"type": "Project", "id": 1})
+    cache.set("https://a", "Shot", 2, {"type": "Shot", "id": 2})
+    cache.save()
+
+    cache = ContextCache(path, ttl_hours=1, clock=lambda: now[0])
+    assert cache.get("https://a", "Project", None) == {"type": "Project", "id": 1}
+    assert cache.get("https://a", "Shot", 2) == {"type": "Shot", "id": 2}
+    assert cache.get("https://a", "Shot", None) is None
+    assert cache.get("https://b", "Project", None) is None
+
+    now[0] += 3601
+    assert cache.get("https://a", "Shot", 2) is None
+    assert cache.get("https://a", "Shot", 2, ignore_ttl=True) == {
+        "type": "Shot",
+        "id": 2,
+    }
+
+
+def test_find_context_entity(tmpdir):
+    """
+    Ensure Shotgun is only queried once per context, over a single connection.
+    """
+    cache = ContextCache(tmpdir.join("contexts.json").strpath)
+    user = FakeUser()
+
+    with pytest.raises(RuntimeError, match="is not cached"):
+        tk_run_app._find_context_entity(user, "Project", None, cache, True)
+
+    project = tk_run_app._find_context_entity(user, "Project", None, cache, False)
+    assert project["name"] == "Big Buck Bunny"
+    assert user.connections[0].queries == [
+        ("Project", [["is_template", "is", False]], ["name"])
+    ]
+    assert (
+        tk_run_app._find_context_entity(user, "Project", None, cache, True) == project
+    )
+    assert tk_run_app._find_context_entity(user, "Project", None, cache, False) == (
+        project
+    )
+    assert len(user.connections) == 1
+
+    tk_run_app._find_context_entity(user, "Shot", 3, cache, False)
+    assert user.connections[1].queries == [
+        ("Shot", [["id", "is", 3]], ["code", "project"])
+    ]
+    with pytest.raises(RuntimeError, match="could not be found"):
+        tk_run_app._find_context_entity(user, "Shot", 404, cache, False)
+    with pytest.raises(RuntimeError, match="Bad context argument"):
+        tk_run_app._find_context_entity(user, None, 3, cache, False)
+
+
+def test_find_context_entity_cache_failure(tmpdir):
+    """
+    Ensure the context entity is returned when it can't be cached.
+    """
+    tmpdir.join("file").write("")
+    cache = ContextCache(tmpdir.join("file", "contexts.json").strpath)
+    project = tk_run_app._find_context_entity(FakeUser(), "Project", None, cache, False)
+    assert project["name"] == "Big Buck Bunny"
+
+
+def test_session_cache(tmpdir):
+    """
+    Ensure sessions are cached per site and login in private files.
+    """
+    cache = SessionCache(tmpdir.join("sessions").strpath)
+    assert cache.load("https://a", "jane") is None
+
+    cache.save("https://a", "jane", "serialized jane")
+    cache.save("https://b", "jane", "serialized jane on b")
+    assert cache.load("https://a", "jane") == "serialized jane"
+    assert cache.load("https://b", "jane") == "serialized jane on b"
+    assert cache.load("https://a", "john") is None
+
+    (path,) = [
+        path
+        for path in tmpdir.join("sessions").listdir()
+        if 'serialized jane"' in path.read()
+    ]
+    if sys.platform != "win32":
+        assert stat.S_IMODE(os.stat(path.strpath).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(tmpdir.join("sessions").strpath).st_mode) == 0o700
+        # Sessions other users could have read are not trusted.
+        path.chmod(0o644)
+        assert cache.load("https://a", "jane") is None
+        path.chmod(0o600)
+        tmpdir.join("sessions").chmod(0o755)
+        assert cache.load("https://a", "jane") is None
+        # Saving a session makes the folder private again.
+        cache.save("https://b", "jane", "serialized jane on b")
+        assert stat.S_IMODE(os.stat(tmpdir.join("sessions").strpath).st_mode) == 0o700
+        assert cache.load("https://a", "jane") == "serialized jane"
+
+    cache.remove("https://a", "jane")
+    assert cache.load("https://a", "jane") is None
+    cache.remove("https://a", "jane")
+
+
+class FakeShotgunAuthenticator(object):
+    def create_session_user(self, login, password, host):
+        return FakeUser()
+
+
+def test_authenticate_cache_failure(tmpdir, monkeypatch):
+    """
+    Ensure the user is authenticated when the session can't be cached.
+    """
+    authentication = types.ModuleType("sgtk.authentication")
+    authentication.ShotgunAuthenticator = FakeShotgunAuthenticator
+    authentication.serialize_user = lambda user: "serialized user"
+    authentication.deserialize_user = lambda payload: FakeUser()
+    monkeypatch.setitem(sys.modules, "sgtk", types.ModuleType("sgtk"))
+    monkeypatch.setitem(sys.modules, "sgtk.authentication", authentication)
+    tmpdir.join("file").write("")
+    monkeypatch.setattr(
+        tk_run_app,
+        "SessionCache",
+        lambda: SessionCache(tmpdir.join("file", "sessions").strpath),
+    )
+    monkeypatch.setenv("SHOTGUN_HOST", FakeUser.host)
+    monkeypatch.setenv("SHOTGUN_USER_LOGIN", "jane")
+    monkeypatch.setenv("SHOTGUN_USER_PASSWORD", "secret")
+
+    user, method = tk_run_app._authenticate()
+    assert isinstance(user, FakeUser)
+    assert method == "from environment variables"
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from tk_toolchain.cmd_line_tools import tk_test_workspace
+
+
+def create_component(parent, name, marker, tests=None):
+    repo = parent.mkdir(name)
+    repo.mkdir(".git")
+    repo.ensure(marker)
+    for filename, content in (tests or {}).items():
+        repo.join("tests", filename).write(content, ensure=True)
+    return repo
+
+
+@pytest.fixture
+def repos_root(tmpdir, monkeypatch):
+    """
+    Workspace with components that pass, fail or can't be tested.
+    """
+    monkeypatch.setenv("TK_TOOLCHAIN_CACHE_LOCATION", str(tmpdir.join("cache")))
+    root = tmpdir.mkdir("repos")
+    create_component(
+        root,
+        "tk-multi-passing",
+        "app.py",
+        {"test_passing.py": "def test_one(): pass\ndef test_two(): pass\n"},
+    )
+    create_component(
+        root,
+        "tk-framework-failing",
+        "framework.py",
+        {"test_failing.py": "def test_one(): assert False\n"},
+    )
+    create_component(
+        root,
+        "tk-multi-broken",
+        "app.py",
+        {"conftest.py": "raise RuntimeError('Broken conftest')\n"},
+    )
+    create_component(root, "tk-multi-untested", "app.py")
+    create_component(root, "not-a-component", "README.md", {"test_x.py": ""})
+    return root
+
+
+def test_find_components(repos_root):
+    """
+    Ensure only Shotgun components with tests are found.
+    """
+    assert [
+        repo.name for repo in tk_test_workspace.find_components(str(repos_root))
+    ] == ["tk-framework-failing", "tk-multi-broken", "tk-multi-passing"]
+
+    assert [
+        repo.name
+        for repo in tk_test_workspace.find_components(
+            str(repos_root), includes=["tk-multi-*"], excludes=["*-broken"]
+        )
+    ] == ["tk-multi-passing"]
+
+
+def test_get_environment(repos_root, monkeypatch):
+    """
+    Ensure each component logs to its own file and doesn't inherit the
+    variables of the current repository.
+    """
+    monkeypatch.setenv("TK_TEST_FIXTURES", "fixtures")
+    repo = tk_test_workspace.find_components(str(repos_root))[0]
+    environment = tk_test_workspace.get_environment(repo)
+    assert environment["TK_TEST_LOG_NAME"] == "tk-test-tk-framework-failing"
+    assert "TK_TEST_FIXTURES" not in environment
+
+
+def test_run(repos_root, tmpdir):
+    """
+    Ensure the results of every component are merged.
+    """
+    output = tmpdir.join("output")
+    assert (
+        tk_test_workspace.main(
+            [
+                "--repos-root={0}".format(repos_root),
+                "--jobs=2",
+                "--output={0}".format(output),
+                "--",
+                "-p",
+                "no:cacheprovider",
+            ]
+        )
+        == 1
+    )
+
+    report = ElementTree.parse(str(output.join("junit.xml"))).getroot()
+    assert report.tag == "testsuites"
+    assert report.get("tests") == "4"
+    assert report.get("failures") == "1"
+    assert report.get("errors") == "1"
+    suites = dict((suite.get("name"), suite) for suite in report.findall("testsuite"))
+    assert sorted(suites) == [
+        "tk-framework-failing",
+        "tk-multi-broken",
+        "tk-multi-passing",
+    ]
+    assert "Broken conftest" in ElementTree.tostring(suites["tk-multi-broken"]).decode(
+        "utf-8"
+    )
+    for testcase in suites["tk-multi-passing"].iter("testcase"):
+        assert testcase.get("classname").startswith("tk-multi-passing.")
+
+    with open(str(output.join("timings.json"))) as fh:
+        timings = json.load(fh)
+    assert [repo["returncode"] == 0 for repo in timings["repos"]] == [
+        False,
+        False,
+        True,
+    ]
+    assert all(repo["duration"] > 0 for repo in timings["repos"])
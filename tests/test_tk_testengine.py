@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+import pytest
+
+from tk_toolchain import tk_testengine
+
+
+class FakeStyle(object):
+    def __init__(self, name):
+        self._name = name
+
+    def objectName(self):
+        return self._name
+
+
+class FakeApplication(object):
+    """
+    Stands in for QtGui.QApplication.
+    """
+
+    _instance = None
+    created = 0
+
+    def __init__(self, args):
+        FakeApplication._instance = self
+        FakeApplication.created += 1
+        self.platform = os.environ.get("QT_QPA_PLATFORM")
+        self._style = "windows"
+        self._palette = "light"
+        self._style_sheet = ""
+        self.changes = 0
+
+    @classmethod
+    def instance(cls):
+        return cls._instance
+
+    def style(self):
+        return FakeStyle(self._style)
+
+    def setStyle(self, style):
+        self._style = style
+        self.changes += 1
+
+    def palette(self):
+        return self._palette
+
+    def setPalette(self, palette):
+        self._palette = palette
+        self.changes += 1
+
+    def styleSheet(self):
+        return self._style_sheet
+
+    def setStyleSheet(self, style_sheet):
+        self._style_sheet = style_sheet
+        self.changes += 1
+
+
+class FakeQtGui(object):
+    QApplication = FakeApplication
+
+
+@pytest.fixture
+def environment(monkeypatch):
+    for name in [
+        tk_testengine.HEADLESS_ENV_VAR,
+        "DISPLAY",
+        "WAYLAND_DISPLAY",
+        "QT_QPA_PLATFORM",
+    ]:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(tk_testengine, "_q_app", None)
+    monkeypatch.setattr(tk_testengine, "_look_and_feel", None)
+    FakeApplication._instance = None
+    FakeApplication.created = 0
+
+
+def test_is_headless(environment, monkeypatch):
+    """
+    Ensure headless mode is detected on Linux without a display and can be forced.
+    """
+    monkeypatch.setattr(tk_testengine.sys, "platform", "linux2")
+    assert tk_testengine.is_headless() is True
+    monkeypatch.setenv("DISPLAY", ":0")
+    assert tk_testengine.is_headless() is False
+    monkeypatch.setenv(tk_testengine.HEADLESS_ENV_VAR, "1")
+    assert tk_testengine.is_headless() is True
+
+    monkeypatch.delenv("DISPLAY")
+    monkeypatch.setenv(tk_testengine.HEADLESS_ENV_VAR, "0")
+    assert tk_testengine.is_headless() is False
+
+    monkeypatch.delenv(tk_testengine.HEADLESS_ENV_VAR)
+    monkeypatch.setattr(tk_testengine.sys, "platform", "darwin")
+    assert tk_testengine.is_headless() is False
+
+
+def test_environment(environment):
+    """
+    Ensure the offscreen platform is requested in headless mode.
+    """
+    headless = tk_testengine.get_test_engine_enviroment(headless=True)
+    assert headless[tk_testengine.HEADLESS_ENV_VAR] == "1"
+    assert headless["QT_QPA_PLATFORM"] == "offscreen"
+
+    default = tk_testengine.get_test_engine_enviroment(headless=False)
+    assert default[tk_testengine.HEADLESS_ENV_VAR] == "0"
+    assert "QT_QPA_PLATFORM" not in default
+    assert default["SHOTGUN_TEST_ENGINE"] == headless["SHOTGUN_TEST_ENGINE"]
+
+
+def test_q_application_is_shared(environment, monkeypatch):
+    """
+    Ensure a single application is created, offscreen when headless.
+    """
+    monkeypatch.setenv(tk_testengine.HEADLESS_ENV_VAR, "1")
+    q_app = tk_testengine.get_q_application(FakeQtGui)
+    assert q_app.platform == "offscreen"
+    assert tk_testengine.get_q_application(FakeQtGui) is q_app
+    assert FakeApplication.created == 1
+    assert tk_testengine._q_app is q_app
+
+
+def test_look_and_feel_is_cached(environment):
+    """
+    Ensure the look and feel is computed once and restored if modified.
+    """
+    q_app = tk_testengine.get_q_application(FakeQtGui)
+    calls = []
+
+    def initialize():
+        calls.append(None)
+        q_app.setStyle("fusion")
+        q_app.setPalette("dark")
+        q_app.setStyleSheet("QWidget { color: white; }")
+
+    tk_testengine.apply_look_and_feel(q_app, initialize)
+    tk_testengine.apply_look_and_feel(q_app, initialize)
+    assert len(calls) == 1
+    assert q_app.changes == 3
+
+    q_app.setStyleSheet("")
+    tk_testengine.apply_look_and_feel(q_app, initialize)
+    assert len(calls) == 1
+    assert q_app.styleSheet() == "QWidget { color: white; }"
+    assert q_app.changes == 5
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sys
+
+import pytest
+
+from tk_toolchain import util
+
+
+def test_cache_location_override(tmpdir, monkeypatch):
+    """
+    Ensure the cache location can be overridden.
+    """
+    monkeypatch.setenv("TK_TOOLCHAIN_CACHE_LOCATION", tmpdir.strpath)
+    assert util.get_cache_location("a", "b.json") == os.path.join(
+        tmpdir.strpath, "a", "b.json"
+    )
+
+
+def test_json_round_trip(tmpdir):
+    """
+    Ensure JSON files are written and read back, creating folders as needed.
+    """
+    path = tmpdir.join("folder", "file.json").strpath
+    assert util.load_json(path, default={}) == {}
+
+    util.save_json(path, {"key": [1, 2]})
+    assert util.load_json(path) == {"key": [1, 2]}
+    # No temporary files should be left behind.
+    assert os.listdir(os.path.dirname(path)) == ["file.json"]
+
+    with open(path, "w") as fh:
+        fh.write("not json")
+    assert util.load_json(path, default=0) == 0
+
+
+@pytest.mark.skipif(
+    sys.platform == "win32", reason="Windows doesn't support Unix permissions."
+)
+def test_save_json_permissions(tmpdir):
+    """
+    Ensure permissions can be restricted to the current user.
+    """
+    path = tmpdir.join("private", "file.json").strpath
+    util.save_json(path, {}, mode=0o600)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+
+@pytest.mark.skipif(
+    sys.platform == "win32", reason="Windows doesn't support Unix permissions."
+)
+def test_save_json_umask(tmpdir):
+    """
+    Ensure the umask restricts the default permissions.
+    """
+    path = tmpdir.join("file.json").strpath
+    umask = os.umask(0o022)
+    try:
+        util.save_json(path, {})
+    finally:
+        os.umask(umask)
+    assert os.stat(path).st_mode & 0o777 == 0o644
+
+
+def test_save_json_keeps_umask(tmpdir, monkeypatch):
+    """
+    Ensure the umask isn't changed, which would affect files created by other
+    threads in the meantime.
+    """
+
+    def umask(mask):
+        raise AssertionError("The umask was changed.")
+
+    monkeypatch.setattr(os, "umask", umask)
+    util.save_json(tmpdir.join("file.json").strpath, {})
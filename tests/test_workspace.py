@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import pytest
+
+from tk_toolchain import workspace
+from tk_toolchain.repo import Repository
+from tk_toolchain.workspace import Workspace, WorkspaceIndex
+
+# Files identifying each type of component.
+COMPONENT_MARKERS = {
+    workspace.TK_CORE: ["_core_upgrader.py"],
+    workspace.PYTHON_API: ["shotgun_api3/"],
+    workspace.TK_TOOLCHAIN: ["pytest_tank_test/"],
+    workspace.ENGINE: ["engine.py"],
+    workspace.FRAMEWORK: ["framework.py"],
+    workspace.APP: ["app.py"],
+    workspace.CONFIG: ["core/", "env/"],
+}
+
+
+def create_repository(parent, name, markers, source_control=".git"):
+    """
+    Create a fake repository containing the given files and folders.
+    """
+    repo = parent.ensure(name, dir=True)
+    if source_control:
+        repo.ensure(source_control, dir=True)
+    for marker in markers:
+        repo.ensure(marker.rstrip("/"), dir=marker.endswith("/"))
+    return repo
+
+
+@pytest.fixture
+def repos_folder(tmpdir):
+    """
+    Folder with one repository of each type and a few things that
+    are not repositories.
+    """
+    tmpdir = tmpdir.mkdir("repos")
+    for component_type, markers in COMPONENT_MARKERS.items():
+        create_repository(tmpdir, "tk-" + component_type, markers)
+    create_repository(tmpdir, "hg-app", ["app.py"], source_control=".hg")
+    create_repository(tmpdir, "not-a-component", ["README.md"])
+    create_repository(tmpdir, "not-a-repo", ["app.py"], source_control=None)
+    tmpdir.ensure("some-file.txt")
+    return tmpdir
+
+
+def test_scan(repos_folder):
+    """
+    Ensure every repository is classified properly.
+    """
+    index = Workspace(repos_folder.strpath).index
+
+    assert set(index) == set(workspace.COMPONENT_TYPES)
+    for component_type in COMPONENT_MARKERS:
+        expected = ["tk-" + component_type]
+        if component_type == workspace.APP:
+            expected.insert(0, "hg-app")
+        assert sorted(index[component_type]) == expected
+
+    repo = index[workspace.ENGINE]["tk-engine"]
+    assert repo.root == repos_folder.join("tk-engine").strpath
+    assert repo.parent == repos_folder.strpath
+    assert repo.is_engine()
+
+
+def test_get(repos_folder):
+    """
+    Ensure repositories can be retrieved by name and type.
+    """
+    ws = Workspace(repos_folder.strpath, max_workers=2)
+
+    assert ws.get("tk-framework").is_framework()
+    assert ws.get("tk-framework", workspace.FRAMEWORK).is_framework()
+    assert ws.get("tk-framework", workspace.APP) is None
+    assert ws.get("not-a-component") is None
+    assert ws.get("not-a-repo") is None
+
+    assert [repo.name for repo in ws.get_repositories(workspace.APP)] == [
+        "hg-app",
+        "tk-app",
+    ]
+    assert len(ws.get_repositories()) == len(COMPONENT_MARKERS) + 1
+
+
+def test_rescan(repos_folder):
+    """
+    Ensure new repositories are found when rescanning.
+    """
+    ws = Workspace(repos_folder.strpath)
+    assert ws.get("tk-new-app") is None
+
+    create_repository(repos_folder, "tk-new-app", ["app.py"])
+    assert ws.get("tk-new-app") is None
+    ws.scan()
+    assert ws.get("tk-new-app").is_app()
+
+
+def test_default_location(repos_folder, monkeypatch):
+    """
+    Ensure SHOTGUN_REPOS_ROOT is used when no folder is specified.
+    """
+    monkeypatch.setenv("SHOTGUN_REPOS_ROOT", repos_folder.strpath)
+    assert Workspace().path == repos_folder.strpath
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    """
+    Location of the index for the test.
+    """
+    return tmpdir.ensure("cache", dir=True).join("index.json").strpath
+
+
+def test_index_reused_across_instances(repos_folder, cache_path):
+    """
+    Ensure the index is saved to disk and answers lookups afterwards.
+    """
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert index.get("tk-engine").is_engine()
+    assert index.get("not-a-repo") is None
+    assert (index.hits, index.misses) == (0, 2)
+    assert index.save()
+    assert index.save() is False
+
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    repo = index.get("tk-engine")
+    assert repo.is_engine()
+    assert repo.root == repos_folder.join("tk-engine").strpath
+    assert index.get("not-a-repo") is None
+    assert (index.hits, index.misses) == (2, 0)
+    assert "2 hit(s), 0 miss(es)" in index.format_stats()
+
+
+def test_index_invalidation(repos_folder, cache_path):
+    """
+    Ensure entries are refreshed when a repository's folder changes.
+    """
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert index.get("not-a-repo") is None
+    index.save()
+
+    repos_folder.ensure("not-a-repo", ".git", dir=True)
+
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert index.get("not-a-repo").is_app()
+    assert (index.hits, index.misses) == (0, 1)
+
+
+def test_index_list_repositories(repos_folder, cache_path):
+    """
+    Ensure the index lists the same repositories as a scan.
+    """
+    expected = [
+        repo.root for repo in Workspace(repos_folder.strpath).get_repositories()
+    ]
+
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert [repo.root for repo in index.get_repositories()] == expected
+    index.save()
+
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert [repo.root for repo in index.get_repositories()] == expected
+    assert index.misses == 0
+    assert [repo.name for repo in index.get_repositories(workspace.CONFIG)] == [
+        "tk-config"
+    ]
+
+    # New repositories are found once the workspace folder changes.
+    create_repository(repos_folder, "tk-new-app", ["app.py"])
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert "tk-new-app" in [repo.name for repo in index.get_repositories()]
+    assert index.misses == 2
+
+
+def test_index_resolve(repos_folder, cache_path):
+    """
+    Ensure repositories from the workspace are resolved from the index.
+    """
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    repo = index.resolve(Repository(repos_folder.join("tk-app").strpath))
+    assert repo.root == repos_folder.join("tk-app").strpath
+    assert index.misses == 1
+
+    # Repositories outside the workspace are returned as is.
+    outside = Repository(create_repository(repos_folder, "outside", []).strpath)
+    other_index = WorkspaceIndex(repos_folder.join("tk-app").strpath, cache_path)
+    assert other_index.resolve(outside) is outside
+
+
+def test_index_corrupted(repos_folder, cache_path):
+    """
+    Ensure a corrupted index is ignored.
+    """
+    with open(cache_path, "w") as fh:
+        fh.write("{")
+    index = WorkspaceIndex(repos_folder.strpath, cache_path=cache_path)
+    assert index.get("tk-app").is_app()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Discovers how the tests of a Shotgun repository need to be run.
+"""
+
+from __future__ import print_function
+
+import os
+
+from tk_toolchain.repo import Repository
+from tk_toolchain.workspace import WorkspaceIndex
+from tk_toolchain.tk_testengine import get_test_engine_enviroment
+
+
+def compute_bootstrap(cur_dir):
+    """
+    Discovers how the test environment needs to be configured.
+
+    Used by pytest_tank_test and by the forkserver, which prepares the
+    environment before pytest starts. The result only contains builtin types
+    so it can be sent to pytest-xdist workers.
+
+    :param str cur_dir: Folder the tests are run from.
+
+    :returns: A dictionary with the folders to add to the PYTHONPATH, the
+        environment variables to set and the location of the fixtures, or
+        ``None`` if the folder is not inside a Shotgun repository.
+    """
+    # The path to the current repo root
+    try:
+        repo = Repository(cur_dir)
+    except RuntimeError:
+        valid_repo = False
+    else:
+        # The type of the repository is remembered across test runs.
+        index = WorkspaceIndex.for_repository(repo)
+        repo = index.resolve(repo)
+        # Make sure we're in a toolkit component
+        valid_repo = repo.is_shotgun_component()
+        print(index.format_stats())
+        index.save()
+    # If we were unable to construct a Repository object, or if we're not in a
+    # shotgun component repo, bail.
+    if valid_repo is False:
+        print(
+            "%s does not appear to be inside Shotgun repository. Skipping initialization of 'pytest_tank_test.'"
+            % cur_dir
+        )
+        return None
+
+    print("Repository found at {0}".format(repo.root))
+
+    # tk-toolchain assumes that the other repositories are clone alongside
+    # the current one with their real name. However, for the current repo,
+    # we can't make such an assumption.
+    #
+    # On Azure Pipeline for example, when testing an app we will clone alongside
+    # the repo all the dependencies, including tk-core, which means we'll have
+    # control over the folder names used for the repositories. However, when
+    # Azure runs a build for tk-core, it will clone it inside a folder not named
+    # after the repo. As such, we have to use whatever name we're given for
+    # tk-core.
+    if repo.is_tk_core() is False:
+        tk_core_repo_root = os.path.join(repo.parent, "tk-core")
+    else:
+        tk_core_repo_root = repo.root
+
+    sys_paths = [
+        # Adds the tk-core/python folder to the PYTHONPATH so we can import Toolkit
+        ("Adding Toolkit folder", os.path.join(tk_core_repo_root, "python")),
+        # Adds the tk-core/tests/python folder to the PYTHONPATH so TanTestBase
+        # is available.
+        (
+            "Adding Toolkit test framework",
+            os.path.join(tk_core_repo_root, "tests", "python"),
+        ),
+    ]
+
+    # Add the <current-repo>/tests/python folder to the PYTHONPATH so custom
+    # python modules from it can be used in the tests.
+    # If we're running tests inside tk-core, we shouldn't add it as tk-toolchain
+    # includes everything we need.
+    if repo.is_tk_core() is False:
+        sys_paths.append(
+            (
+                "Adding repository tests/python folder",
+                os.path.join(repo.root, "tests", "python"),
+            )
+        )
+
+    environment = {}
+    environment.update(repo.get_roots_environment_variables())
+    environment.update(get_test_engine_enviroment())
+
+    return {
+        "sys_paths": [list(item) for item in sys_paths if os.path.exists(item[1])],
+        "environment": environment,
+        "fixtures": os.path.join(repo.root, "tests", "fixtures"),
+    }
@@ -22,6 +22,7 @@ import sys
 from .sphinx_processor import SphinxProcessor
 
 from tk_toolchain.repo import Repository
+from tk_toolchain.workspace import WorkspaceIndex
 from tk_toolchain import util
 
 # set up logging channel for this script
@@ -171,6 +172,12 @@ to type "tk-docs-preview" to preview the documentation.
             log.info("This does not appear to be a known repository type.")
             return 0
 
+        # The type of the repository is remembered across invocations.
+        index = WorkspaceIndex.for_repository(repo)
+        repo = index.resolve(repo)
+        log.info(index.format_stats())
+        index.save()
+
         if not os.path.exists(os.path.join(repo.root, "docs")):
             log.info("No documentation was found.")
             return 0
@@ -17,7 +17,7 @@ Launch a Toolkit application from the command line by running this tool in any
 Toolkit repository.
 
 Usage:
-    tk-run-app [--context-entity-type=<entity-type>] [--context-entity-id=<entity-id>] [--location=<location>]
+    tk-run-app [--context-entity-type=<entity-type>] [--context-entity-id=<entity-id>] [--location=<location>]... [--metrics=<path>] [--watch] [--offline] [--context-ttl=<hours>]
 
 Options:
 
@@ -31,51 +31,108 @@ Options:
                         Specifies the location where the Toolkit application is.
                         If missing, the tk-run-app assumes it is run from inside
                         the repository and launch the application at the root of
-                        it.
+                        it. Can be repeated to launch several applications in
+                        the same engine, bootstrapping only once. Toolkit Core
+                        and the frameworks are then taken from the folder of the
+                        first location.
+
+    --metrics=<path>    Prints how long each bundle took to import, initialize
+                        and register its commands, and how much memory it used,
+                        and writes these metrics to a JSON file.
+
+    --watch             Keeps running after the application is closed and
+                        reloads it each time a file of the repository changes.
+                        Press Ctrl+C to stop.
+
+    --offline           Uses the cached context entity without querying Shotgun,
+                        even if it expired.
+
+    --context-ttl=<hours>
+                        Number of hours the context entity is cached for.
+                        [default: 24]
 """
 
 import os
+import signal
 import sys
+import timeit
+import traceback
 from pprint import pprint
 
 import docopt
 
 from tk_toolchain.repo import Repository
+from tk_toolchain.workspace import WorkspaceIndex
 from tk_toolchain import util
-from tk_toolchain.tk_testengine import get_test_engine_enviroment
+from tk_toolchain.tk_testengine import get_test_engine_enviroment, metrics
+from tk_toolchain.cmd_line_tools.tk_run_app import config_generator, context_cache
+from tk_toolchain.cmd_line_tools.tk_run_app.context_cache import (
+    ContextCache,
+    get_fields,
+)
+from tk_toolchain.cmd_line_tools.tk_run_app.session_cache import SessionCache
+from tk_toolchain.cmd_line_tools.tk_run_app.watcher import SourceWatcher
 
+# How often the repository is checked for changes in --watch mode.
+_WATCH_INTERVAL_MS = 250
 
-def get_config_location():
-    """
-    Return the location of the configuration tk-run-app uses.
+
+def _get_cached_user(cache, host, login):
     """
-    return os.path.join(os.path.dirname(__file__), "config")
+    Get the user of a cached session, if it hasn't expired.
 
+    :param cache: The :class:`SessionCache`.
+    :param str host: The Shotgun site.
+    :param str login: The login of the user.
 
-def _get_user():
+    :returns: A Shotgun user or ``None``.
+    """
+    from sgtk.authentication import deserialize_user
+
+    payload = cache.load(host, login)
+    if payload is None:
+        return None
+    try:
+        user = deserialize_user(payload)
+        if not user.are_credentials_expired():
+            return user
+    except Exception as e:
+        print("The cached session could not be used: {0}".format(e))
+    cache.remove(host, login)
+    return None
+
+
+def _authenticate():
     """
     Authenticate with a Shotgun site.
 
-    If SHOTGUN_HOST, SHOTGUN_USER_LOGIN and SHOGUN_USER_PASSWORD
-    are set, then they will be used for authentication. If not,
-    the user will be prompted for their credentials if they
-    are not already logged into Shotgun.
+    See :func:`_get_user`.
 
-    :returns: A Shotgun user.
-    :rtype: sgtk.authentication.ShotgunUser
+    :returns: A tuple of the Shotgun user and a description of how it was
+        authenticated.
     """
     host = os.environ.get("SHOTGUN_HOST")
     login = os.environ.get("SHOTGUN_USER_LOGIN")
     password = os.environ.get("SHOTGUN_USER_PASSWORD")
 
-    from sgtk.authentication import ShotgunAuthenticator
+    from sgtk.authentication import ShotgunAuthenticator, serialize_user
 
     sg_auth = ShotgunAuthenticator()
 
     # If all the variables were set, we can authenticate.
     if host and login and password:
+        cache = SessionCache()
+        user = _get_cached_user(cache, host, login)
+        if user is not None:
+            return user, "with the cached session"
+
         print("Authenticating from environment variables.")
-        return sg_auth.create_session_user(login, password=password, host=host)
+        user = sg_auth.create_session_user(login, password=password, host=host)
+        try:
+            cache.save(host, login, serialize_user(user))
+        except (IOError, OSError) as e:
+            print("The session could not be cached: {0}".format(e))
+        return user, "from environment variables"
     elif host or login or password:
         # Something was set, but not everything.
         # Do not print the values, as this can be used in CI.
@@ -91,7 +148,29 @@ def _get_user():
             )
         )
 
-    return sg_auth.get_user()
+    return sg_auth.get_user(), "interactively"
+
+
+def _get_user():
+    """
+    Authenticate with a Shotgun site.
+
+    If SHOTGUN_HOST, SHOTGUN_USER_LOGIN and SHOGUN_USER_PASSWORD
+    are set, then they will be used for authentication. The session is cached
+    in a file only the current user can read and reused until it expires, so
+    the password is only sent when needed. If the variables are not set, the
+    user will be prompted for their credentials if they are not already
+    logged into Shotgun.
+
+    :returns: A Shotgun user.
+    :rtype: sgtk.authentication.ShotgunUser
+    """
+    start = timeit.default_timer()
+    user, method = _authenticate()
+    print(
+        "Authenticated {0} in {1:.3f}s.".format(method, timeit.default_timer() - start)
+    )
+    return user
 
 
 def _progress_callback(value, message):
@@ -104,22 +183,100 @@ def _progress_callback(value, message):
     print("[%s] %s" % (value, message))
 
 
-def _start_engine(repo, entity_type, entity_id):
+def _find_context_entity(user, entity_type, entity_id, cache, offline):
+    """
+    Find the entity of the context, using the cached entity if possible.
+
+    :param user: The Shotgun user.
+    :param str entity_type: Type of the entity.
+    :param int entity_id: Id of the entity, or ``None`` to use the first one.
+    :param cache: The :class:`ContextCache` of the entities.
+    :param bool offline: If ``True``, Shotgun is never queried and the cached
+        entity is used even if it expired.
+
+    :returns: The entity dictionary.
+
+    :raises RuntimeError: If the entity can't be found.
     """
-    Bootstraps Toolkit and uses the app in the current repo.
+    if not entity_type or entity_id == 0:
+        raise RuntimeError(
+            "Bad context argument for {0}@{1}".format(entity_type, entity_id)
+        )
+
+    context = cache.get(user.host, entity_type, entity_id, ignore_ttl=offline)
+    if context is not None:
+        print("Using the cached context entity.")
+        return context
 
-    :param tk_toolchain.repo.Repository: Repository for the current folder.
+    if offline:
+        raise RuntimeError(
+            "Context entity {0} with id {1} is not cached for {2}. Run tk-run-app "
+            "once without --offline to cache it.".format(
+                entity_type, entity_id, user.host
+            )
+        )
+
+    sg = user.create_sg_connection()
+    fields = get_fields(entity_type)
+    if entity_type == "Project" and entity_id is None:
+        context = sg.find_one(
+            "Project",
+            [["is_template", "is", False]],
+            fields,
+            order=[{"direction": "asc", "field_name": "id"}],
+        )
+    elif entity_id is None:
+        context = sg.find_one(
+            entity_type, [], fields, order=[{"direction": "asc", "field_name": "id"}]
+        )
+    else:
+        context = sg.find_one(entity_type, [["id", "is", entity_id]], fields)
+
+    if context is None:
+        raise RuntimeError(
+            "Context enity {0} with id {1} could not be found.".format(
+                entity_type, entity_id
+            )
+        )
+
+    cache.set(user.host, entity_type, entity_id, context)
+    try:
+        cache.save()
+    except (IOError, OSError) as e:
+        print("The context entity could not be cached: {0}".format(e))
+    return context
+
+
+def _start_engine(
+    repos,
+    entity_type,
+    entity_id,
+    offline=False,
+    context_ttl=context_cache.DEFAULT_TTL_HOURS,
+):
+    """
+    Bootstraps Toolkit once and uses the apps of the given repos.
+
+    :param list repos: The :class:`tk_toolchain.repo.Repository` of each
+        application. The first one is also used to find Toolkit Core and the
+        frameworks.
+    :param bool offline: If ``True``, the cached context entity is used
+        without querying Shotgun.
+    :param float context_ttl: Number of hours the cached context entity is
+        used for.
 
     :returns: An engine instance.
     """
     import sgtk
 
+    repo = repos[0]
+
     # Initialize logging to disk and on screen.
     sgtk.LogManager().initialize_base_file_handler("tk-run-app-{0}".format(repo.name))
     sgtk.LogManager().initialize_custom_handler()
 
     util.merge_into_environment_variables(repo.get_roots_environment_variables())
-    util.merge_into_environment_variables(get_test_engine_enviroment())
+    util.merge_into_environment_variables(get_test_engine_enviroment(headless=False))
     os.environ["SHOTGUN_TK_APP_LOCATION"] = repo.root
 
     # Standard Toolkit bootstrap code.
@@ -130,34 +287,14 @@ def _start_engine(repo, entity_type, entity_id):
     # use the config referenced by the base_configuration.
     mgr.do_shotgun_config_lookup = False
     mgr.base_configuration = "sgtk:descriptor:path?path={0}".format(
-        get_config_location()
-    )
-
-    if entity_type == "Project" and entity_id is None:
-        context = user.create_sg_connection().find_one(
-            "Project",
-            [["is_template", "is", False]],
-            order=[{"direction": "asc", "field_name": "id"}],
-        )
-    elif entity_id is None:
-        context = user.create_sg_connection().find_one(
-            entity_type, [], order=[{"direction": "asc", "field_name": "id"}]
-        )
-    elif entity_type and entity_id:
-        context = user.create_sg_connection().find_one(
-            entity_type, [["id", "is", entity_id]]
-        )
-    else:
-        raise RuntimeError(
-            "Bad context argument for {0}@{1}".format(entity_type, entity_id)
+        config_generator.get_config_location(
+            [app_repo.root for app_repo in repos], repo.parent
         )
+    )
 
-    if context is None:
-        raise RuntimeError(
-            "Context enity {0} with id {1} could not be found.".format(
-                entity_type, entity_id
-            )
-        )
+    context = _find_context_entity(
+        user, entity_type, entity_id, ContextCache(ttl_hours=context_ttl), offline
+    )
 
     print("Launching test engine in context {0}".format(context))
 
@@ -167,6 +304,161 @@ def _start_engine(repo, entity_type, entity_id):
     return engine
 
 
+def _report_app_init(engine, instance_names):
+    """
+    Prints how long each application took to import and initialize.
+
+    :param engine: The engine the applications run in.
+    :param list instance_names: Names of the application instances.
+    """
+    print("Application init times:")
+    for instance_name in instance_names:
+        if instance_name not in engine.apps:
+            print("    {0}: not loaded".format(instance_name))
+            continue
+        import_duration = engine.metrics.duration(instance_name, metrics.IMPORT)
+        init_duration = engine.metrics.duration(instance_name, metrics.INIT)
+        print(
+            "    {0}: {1:.3f}s (import {2:.3f}s, init {3:.3f}s)".format(
+                instance_name,
+                import_duration + init_duration,
+                import_duration,
+                init_duration,
+            )
+        )
+
+
+def _launch_apps(engine, instance_names):
+    """
+    Launches the commands registered by the applications.
+
+    :param engine: The engine the applications run in.
+    :param list instance_names: Names of the application instances.
+
+    :returns: ``True`` if a command was launched, ``False`` otherwise.
+    """
+    # Sample command:
+    # 'Work Area Info...': {'callback': <function Engine.register_command.<locals>.callback_wrapper at 0x127affe18>,
+    #                       'properties': {'app': <Sgtk App 0x11ec862b0: tk-multi-about, engine: <Sgtk Engine 0x11ce680f0: tk-shell, env: test>>,
+    #                                      'description': 'Shows a breakdown of '
+    #                                                     'your current environment '
+    #                                                     'and configuration.',
+    #                                      'icon': '/Users/boismej/gitlocal/tk-multi-about/icon_256.png',
+    #                                      'prefix': None,
+    #                                      'short_name': 'work_area_info',
+    #                                      'type': 'context_menu'}}}
+    launched = set()
+    for name, info in engine.commands.items():
+        # We'll iterate on every app and when we find an app instance that is inside the
+        # configuration, we'll launch it.
+        if "app" not in info["properties"]:
+            # Certain commands are not coming from apps, so skip those for now.
+            continue
+        instance_name = info["properties"]["app"].instance_name
+        if instance_name in instance_names:
+            info["callback"]()
+            launched.add(instance_name)
+
+    for instance_name in instance_names:
+        if instance_name not in launched:
+            print(
+                "No commands were found for {0}. It is possible the application "
+                "failed to initialize?".format(instance_name)
+            )
+    return bool(launched)
+
+
+def _reload_apps(repos, instance_names, changes, tk, context):
+    """
+    Restarts the engine and launches the applications again.
+
+    Authentication, the bootstrap and the QApplication are kept, so only the
+    bundles of the generated environment, the applications and their
+    frameworks, are loaded again.
+
+    :param list repos: Repositories of the applications.
+    :param list instance_names: Names of the application instances.
+    :param list changes: Paths of the files that changed.
+    :param tk: The Toolkit instance to start the engine with if a previous
+        reload failed.
+    :param context: The context to start the engine in if a previous reload
+        failed.
+    """
+    import sgtk
+
+    print(
+        "{0} file(s) changed, reloading {1}.".format(
+            len(changes), ", ".join(instance_names)
+        )
+    )
+    if any(os.path.join(repo.root, "info.yml") in changes for repo in repos):
+        print(
+            "An info.yml file changed. Restart tk-run-app if the frameworks "
+            "required by the applications changed."
+        )
+
+    start = timeit.default_timer()
+    engine = sgtk.platform.current_engine()
+    try:
+        if engine is None:
+            sgtk.platform.start_engine("tk-testengine", tk, context)
+        else:
+            for dialog in list(getattr(engine, "created_qt_dialogs", [])):
+                dialog.close()
+            sgtk.platform.restart()
+        _launch_apps(sgtk.platform.current_engine(), instance_names)
+    except Exception:
+        # Keep watching so the error can be fixed.
+        traceback.print_exc()
+        return
+
+    print("Reloaded in {0:.3f}s.".format(timeit.default_timer() - start))
+
+
+def _watch(engine, repos, instance_names):
+    """
+    Reloads the applications each time a file of their repositories changes,
+    until interrupted.
+
+    :param engine: The engine the applications run in.
+    :param list repos: Repositories of the applications.
+    :param list instance_names: Names of the application instances.
+
+    :returns: The exit code.
+    """
+    if engine.q_app is None:
+        print("--watch requires Qt.")
+        return 1
+
+    from sgtk.platform.qt import QtCore
+
+    q_app = engine.q_app
+    # Closing the dialogs to reload the applications must not exit.
+    q_app.setQuitOnLastWindowClosed(False)
+    # The timer regularly hands control back to Python, which handles Ctrl+C.
+    signal.signal(signal.SIGINT, lambda *args: q_app.quit())
+
+    watcher = SourceWatcher([repo.root for repo in repos])
+    tk, context = engine.sgtk, engine.context
+
+    def poll():
+        changes = watcher.poll()
+        if changes:
+            _reload_apps(repos, instance_names, changes, tk, context)
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(poll)
+    timer.start(_WATCH_INTERVAL_MS)
+    print(
+        "Watching {0} for changes, press Ctrl+C to stop.".format(
+            ", ".join(repo.root for repo in repos)
+        )
+    )
+    q_app.exec_()
+    timer.stop()
+    return 0
+
+
 ####################################################################################
 # script entry point
 def main(arguments=None):
@@ -180,55 +472,60 @@ def main(arguments=None):
     # get an error.
     options = docopt.docopt(__doc__, argv=arguments)
 
-    # Find the current repo and add Toolkit to the PYTHONPATH so we ca import it.
-    repo = Repository(util.expand_path(options["--location"] or os.getcwd()))
-    tk_core = os.path.join(repo.parent, "tk-core", "python")
+    # Find the repos and add Toolkit to the PYTHONPATH so we ca import it. The
+    # first repo decides which workspace Toolkit and the frameworks come from.
+    repos = []
+    index = None
+    for location in options["--location"] or [os.getcwd()]:
+        repo = Repository(util.expand_path(location))
+        if index is None:
+            index = WorkspaceIndex.for_repository(repo)
+        repo = index.resolve(repo)
+        if repo.is_app() is False:
+            print("{0} does not have a Toolkit application.".format(repo.root))
+            return 1
+        if repo.root not in [app_repo.root for app_repo in repos]:
+            repos.append(repo)
+    print(index.format_stats())
+    index.save()
+    tk_core = os.path.join(repos[0].parent, "tk-core", "python")
     sys.path.insert(0, tk_core)
 
-    if repo.is_app() is False:
-        print("This location does not have a Toolkit application.")
-        return 1
+    instance_names = [
+        instance_name
+        for instance_name, _ in config_generator.get_app_instance_names(
+            [repo.root for repo in repos]
+        )
+    ]
 
     engine = _start_engine(
-        repo,
+        repos,
         options["--context-entity-type"]
         if options["--context-entity-type"] is not None
         else "Project",
         int(options["--context-entity-id"])
         if options["--context-entity-id"] is not None
         else None,
+        offline=options["--offline"],
+        context_ttl=float(options["--context-ttl"]),
     )
 
+    _report_app_init(engine, instance_names)
+
+    if options["--metrics"]:
+        print("Startup metrics:")
+        print(engine.metrics.format_table())
+        engine.metrics.dump(util.expand_path(options["--metrics"]))
+
     print("Available commands:")
     pprint(sorted(engine.commands))
 
-    # Sample command:
-    # 'Work Area Info...': {'callback': <function Engine.register_command.<locals>.callback_wrapper at 0x127affe18>,
-    #                       'properties': {'app': <Sgtk App 0x11ec862b0: tk-multi-about, engine: <Sgtk Engine 0x11ce680f0: tk-shell, env: test>>,
-    #                                      'description': 'Shows a breakdown of '
-    #                                                     'your current environment '
-    #                                                     'and configuration.',
-    #                                      'icon': '/Users/boismej/gitlocal/tk-multi-about/icon_256.png',
-    #                                      'prefix': None,
-    #                                      'short_name': 'work_area_info',
-    #                                      'type': 'context_menu'}}}
-    app_launched = False
-    for name, info in engine.commands.items():
-        # We'll iterate on every app and when we find the app instance that is inside the
-        # configuration, we'll launch it.
-        if "app" not in info["properties"]:
-            # Certain commands are not coming from apps, so skip those for now.
-            continue
-        if info["properties"]["app"].instance_name == "tk-multi-run-this-app":
-            info["callback"]()
-            app_launched = True
-
-    if app_launched is False:
-        print(
-            "No commands were found. It is possible the application failed to initialize?"
-        )
+    if _launch_apps(engine, instance_names) is False:
         return 1
 
+    if options["--watch"]:
+        return _watch(engine, repos, instance_names)
+
     # Loops until all dialogs are closed.
     engine.q_app.exec_()
 
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Generates the configuration tk-run-app bootstraps into.
+
+Only the frameworks the applications actually require, directly or through
+other frameworks, are added to the environment. Generated configurations are
+cached based on the content of the info.yml files involved.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import six
+import yaml
+
+from tk_toolchain import util
+
+# Bump this whenever the generated configuration changes so previously
+# cached configurations are not reused.
+_GENERATOR_VERSION = "1"
+
+# Name of the app instance in the generated environment, when there is a
+# single application.
+APP_INSTANCE_NAME = "tk-multi-run-this-app"
+
+
+def get_template_location():
+    """
+    Return the location of the files shared by all generated configurations.
+    """
+    return os.path.join(os.path.dirname(__file__), "config")
+
+
+def get_framework_requirements(bundle_root):
+    """
+    Read the frameworks required by a bundle.
+
+    :param str bundle_root: Root of the bundle.
+
+    :returns: List of (name, version) tuples.
+
+    :raises RuntimeError: If the bundle's info.yml can't be read.
+    """
+    info = _read_info_yml(bundle_root)[1]
+    return [
+        (framework["name"], framework["version"])
+        for framework in info.get("frameworks") or []
+    ]
+
+
+def resolve_frameworks(app_root, repos_root):
+    """
+    Find every framework required by an application, transitively.
+
+    Frameworks are expected to be cloned next to the application under
+    their real name.
+
+    :param str app_root: Root of the application.
+    :param str repos_root: Folder containing the framework repositories.
+
+    :returns: Dictionary of framework instance names, like
+        ``tk-framework-qtwidgets_v2.x.x``, to framework repository names.
+
+    :raises RuntimeError: If a required framework is missing.
+    """
+    frameworks = {}
+    missing = []
+    bundles_to_visit = [app_root]
+    visited = set(bundles_to_visit)
+
+    while bundles_to_visit:
+        bundle_root = bundles_to_visit.pop(0)
+        for name, version in get_framework_requirements(bundle_root):
+            instance_name = "{0}_{1}".format(name, version)
+            if instance_name in frameworks:
+                continue
+
+            framework_root = os.path.join(repos_root, name)
+            if not os.path.exists(os.path.join(framework_root, "info.yml")):
+                missing.append(
+                    "{0} (required by {1})".format(
+                        instance_name, os.path.basename(bundle_root)
+                    )
+                )
+                continue
+
+            frameworks[instance_name] = name
+            if framework_root not in visited:
+                visited.add(framework_root)
+                bundles_to_visit.append(framework_root)
+
+    if missing:
+        raise RuntimeError(
+            "The following frameworks could not be found in {0}:\n{1}".format(
+                repos_root, "\n".join("- {0}".format(item) for item in missing)
+            )
+        )
+
+    return frameworks
+
+
+def get_app_instance_names(app_roots):
+    """
+    Name the instances of applications in the generated environment.
+
+    :param list app_roots: Roots of the applications.
+
+    :returns: List of (instance name, application root) tuples, in the same
+        order. A single application is named ``tk-multi-run-this-app``.
+        Otherwise, applications are named after their folder, with a suffix
+        when folders share a name.
+    """
+    if len(app_roots) == 1:
+        return [(APP_INSTANCE_NAME, app_roots[0])]
+
+    instances = []
+    used = set()
+    for app_root in app_roots:
+        name = os.path.basename(os.path.normpath(app_root))
+        instance_name = name
+        index = 1
+        while instance_name in used:
+            index += 1
+            instance_name = "{0}_{1}".format(name, index)
+        used.add(instance_name)
+        instances.append((instance_name, app_root))
+    return instances
+
+
+def get_environment(frameworks, apps=None):
+    """
+    Build the environment running the applications with their frameworks.
+
+    Locations are expressed with the environment variables tk-run-app sets so
+    the environment doesn't depend on where the repositories are.
+
+    :param dict frameworks: Framework instance names to repository names.
+    :param dict apps: Application instance names to locations. Defaults to
+        ``tk-multi-run-this-app`` at ``$SHOTGUN_TK_APP_LOCATION``.
+
+    :returns: The content of the environment file.
+    """
+    if apps is None:
+        apps = {APP_INSTANCE_NAME: "$SHOTGUN_TK_APP_LOCATION"}
+    return {
+        "engines": {
+            "tk-testengine": {
+                "location": {"type": "path", "path": "$SHOTGUN_TEST_ENGINE"},
+                "apps": dict(
+                    (instance_name, {"location": {"type": "path", "path": path}})
+                    for instance_name, path in apps.items()
+                ),
+            }
+        },
+        "frameworks": dict(
+            (
+                instance_name,
+                {
+                    "location": {
+                        "type": "path",
+                        "path": "$SHOTGUN_REPOS_ROOT/{0}".format(name),
+                    }
+                },
+            )
+            for instance_name, name in frameworks.items()
+        ),
+    }
+
+
+def get_config_location(app_roots, repos_root):
+    """
+    Get a configuration for applications, generating it if needed.
+
+    :param app_roots: Root of the application, or list of roots of the
+        applications. See :func:`get_app_instance_names` for their names.
+    :param str repos_root: Folder containing the framework repositories.
+
+    :returns: Path to the configuration.
+
+    :raises RuntimeError: If a required framework is missing.
+    """
+    if isinstance(app_roots, six.string_types):
+        app_roots = [app_roots]
+
+    frameworks = {}
+    for app_root in app_roots:
+        frameworks.update(resolve_frameworks(app_root, repos_root))
+
+    instances = get_app_instance_names(app_roots)
+    if len(instances) == 1:
+        apps = None
+    else:
+        # Applications are found through their absolute path.
+        apps = dict(
+            (instance_name, os.path.abspath(app_root))
+            for instance_name, app_root in instances
+        )
+
+    # The configuration only depends on the content of the info.yml files,
+    # and on the locations of the applications when there are several.
+    digest = hashlib.sha1(six.ensure_binary(_GENERATOR_VERSION))
+    for bundle_root in list(app_roots) + [
+        os.path.join(repos_root, name) for name in sorted(set(frameworks.values()))
+    ]:
+        digest.update(_read_info_yml(bundle_root)[0])
+    for instance_name, path in sorted((apps or {}).items()):
+        digest.update(six.ensure_binary("{0}={1}\n".format(instance_name, path)))
+
+    config_location = util.get_cache_location(
+        "tk-run-app", "configs", digest.hexdigest()
+    )
+
+    if os.path.exists(config_location):
+        print("Reusing configuration at {0}".format(config_location))
+        return config_location
+
+    print(
+        "Generating configuration at {0} with frameworks {1}".format(
+            config_location, sorted(frameworks) or "(none)"
+        )
+    )
+    _write_config(config_location, get_environment(frameworks, apps))
+    return config_location
+
+
+def _write_config(config_location, environment):
+    """
+    Write a configuration atomically.
+
+    :param str config_location: Where the configuration should be written.
+    :param dict environment: Content of the environment file.
+    """
+    parent = os.path.dirname(config_location)
+    util.ensure_folder_exists(parent)
+    tmp_location = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        shutil.copytree(
+            os.path.join(get_template_location(), "core"),
+            os.path.join(tmp_location, "core"),
+        )
+        os.mkdir(os.path.join(tmp_location, "env"))
+        with open(os.path.join(tmp_location, "env", "test.yml"), "w") as fh:
+            yaml.safe_dump(environment, fh, default_flow_style=False)
+
+        try:
+            os.rename(tmp_location, config_location)
+        except OSError:
+            # Another process generated the same configuration in the meantime.
+            if not os.path.exists(config_location):
+                raise
+    finally:
+        if os.path.exists(tmp_location):
+            shutil.rmtree(tmp_location)
+
+
+def _read_info_yml(bundle_root):
+    """
+    Read the info.yml file of a bundle.
+
+    :param str bundle_root: Root of the bundle.
+
+    :returns: A tuple of (raw content, parsed content).
+
+    :raises RuntimeError: If the file can't be read.
+    """
+    path = os.path.join(bundle_root, "info.yml")
+    try:
+        with open(path, "rb") as fh:
+            content = fh.read()
+    except (IOError, OSError) as e:
+        raise RuntimeError("Could not read {0}: {1}".format(path, e))
+    return content, yaml.safe_load(content) or {}
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Remembers the entities tk-run-app launched applications in.
+
+Entities are cached per site, entity type and id, so launching an application
+again in the same context doesn't need to query Shotgun.
+"""
+
+import time
+
+from tk_toolchain import util
+
+# Number of hours a cached entity is used for before it is looked up again.
+DEFAULT_TTL_HOURS = 24
+
+# Field holding the name of entities, when it isn't code. Requesting the name
+# and project of an entity lets Toolkit create its context without a query.
+_NAME_FIELDS = {"Project": "name", "Task": "content", "HumanUser": "name"}
+
+
+def get_fields(entity_type):
+    """
+    Get the fields to request for an entity used as a context.
+
+    :param str entity_type: The entity type.
+
+    :returns: List of field names.
+    """
+    name_field = _NAME_FIELDS.get(entity_type, "code")
+    if entity_type == "Project":
+        return [name_field]
+    return [name_field, "project"]
+
+
+class ContextCache(object):
+    """
+    Entities used as contexts, cached on disk.
+    """
+
+    def __init__(self, path=None, ttl_hours=DEFAULT_TTL_HOURS, clock=time.time):
+        """
+        :param str path: Path of the cache file. Defaults to a file in the
+            tk-toolchain cache folder.
+        :param float ttl_hours: Number of hours an entity is used for.
+        :param clock: Callable returning the current time, in seconds.
+        """
+        self._path = path or util.get_cache_location("tk-run-app", "contexts.json")
+        self._ttl = ttl_hours * 3600
+        self._clock = clock
+        self._data = util.load_json(self._path, {})
+        if not isinstance(self._data, dict):
+            self._data = {}
+
+    def get(self, host, entity_type, entity_id, ignore_ttl=False):
+        """
+        Get a cached entity.
+
+        :param str host: The Shotgun site.
+        :param str entity_type: The entity type.
+        :param int entity_id: The entity id, or ``None`` for the default
+            entity of that type.
+        :param bool ignore_ttl: If ``True``, expired entities are returned.
+
+        :returns: The entity dictionary, or ``None`` if it isn't cached or has
+            expired.
+        """
+        cached = self._data.get(host, {}).get(self._get_key(entity_type, entity_id))
+        if cached is None:
+            return None
+        if not ignore_ttl and self._clock() - cached["time"] > self._ttl:
+            return None
+        return cached["entity"]
+
+    def set(self, host, entity_type, entity_id, entity):
+        """
+        Cache an entity.
+
+        See :meth:`get` for the parameters.
+
+        :param dict entity: The entity dictionary.
+        """
+        self._data.setdefault(host, {})[self._get_key(entity_type, entity_id)] = {
+            "entity": entity,
+            "time": self._clock(),
+        }
+
+    def save(self):
+        """
+        Write the cache to disk.
+        """
+        util.save_json(self._path, self._data)
+
+    def _get_key(self, entity_type, entity_id):
+        """
+        Identify an entity inside a site.
+        """
+        return "{0}:{1}".format(
+            entity_type, "default" if entity_id is None else entity_id
+        )
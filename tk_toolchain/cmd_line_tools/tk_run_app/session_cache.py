@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Remembers the sessions of the users tk-run-app authenticated with a password.
+
+Sessions contain a session token, so they are stored in files only readable
+by the current user, one per site and login.
+"""
+
+import hashlib
+import os
+import stat
+import sys
+
+import six
+
+from tk_toolchain import util
+
+
+class SessionCache(object):
+    """
+    Serialized Toolkit users, cached on disk.
+    """
+
+    def __init__(self, folder=None):
+        """
+        :param str folder: Folder of the cache files. Defaults to a folder in
+            the tk-toolchain cache folder.
+        """
+        self._folder = folder or util.get_cache_location("tk-run-app", "sessions")
+
+    def load(self, host, login):
+        """
+        Get a cached session.
+
+        :param str host: The Shotgun site.
+        :param str login: The login of the user.
+
+        :returns: The serialized user, or ``None`` if there isn't one or if
+            the file or its folder could be accessed by other users.
+        """
+        path = self._get_path(host, login)
+        if (
+            not os.path.isfile(path)
+            or not self._is_private(self._folder)
+            or not self._is_private(path)
+        ):
+            return None
+        data = util.load_json(path)
+        if (
+            not isinstance(data, dict)
+            or data.get("host") != host
+            or data.get("login") != login
+        ):
+            return None
+        return data.get("user")
+
+    def save(self, host, login, user):
+        """
+        Cache a session.
+
+        :param str host: The Shotgun site.
+        :param str login: The login of the user.
+        :param str user: The serialized user.
+        """
+        util.ensure_folder_exists(self._folder, 0o700)
+        # The folder may have been created by something else.
+        if sys.platform != "win32":
+            os.chmod(self._folder, 0o700)
+        util.save_json(
+            self._get_path(host, login),
+            {"host": host, "login": login, "user": user},
+            mode=0o600,
+        )
+
+    def remove(self, host, login):
+        """
+        Forget a session.
+
+        :param str host: The Shotgun site.
+        :param str login: The login of the user.
+        """
+        path = self._get_path(host, login)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _get_path(self, host, login):
+        """
+        Get the file caching the session of a user.
+        """
+        return os.path.join(
+            self._folder,
+            "{0}.json".format(
+                hashlib.sha1(
+                    six.ensure_binary("{0}\n{1}".format(host, login))
+                ).hexdigest()
+            ),
+        )
+
+    def _is_private(self, path):
+        """
+        Check if a file or folder belongs to the current user and can only be
+        accessed by them.
+        """
+        # Windows doesn't report permissions beyond the read-only flag.
+        if sys.platform == "win32":
+            return True
+        path_stat = os.stat(path)
+        return path_stat.st_uid == os.getuid() and not path_stat.st_mode & (
+            stat.S_IRWXG | stat.S_IRWXO
+        )
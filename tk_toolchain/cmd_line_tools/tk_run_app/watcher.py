@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Detects changes to the source files of a repository.
+
+The files are polled, which works the same on every platform and is cheap for
+the size of a Toolkit application.
+"""
+
+import os
+
+# Folders whose content never requires the application to be reloaded.
+IGNORED_FOLDERS = [".git", "__pycache__", ".pytest_cache", "tests", "docs"]
+
+# Files written by Python and editors.
+IGNORED_SUFFIXES = [".pyc", ".pyo", ".swp", ".swx", "~", ".tmp"]
+
+
+class SourceWatcher(object):
+    """
+    Polls folders for added, modified and removed files.
+    """
+
+    def __init__(
+        self, roots, ignored_folders=IGNORED_FOLDERS, ignored_suffixes=IGNORED_SUFFIXES
+    ):
+        """
+        :param list roots: Folders to watch.
+        :param list ignored_folders: Names of the folders that are not watched.
+        :param list ignored_suffixes: Suffixes of the files that are not watched.
+        """
+        self._roots = roots
+        self._ignored_folders = set(ignored_folders)
+        self._ignored_suffixes = tuple(ignored_suffixes)
+        self._snapshot = self._scan()
+        # Changes waiting for the files to stop changing.
+        self._pending = set()
+
+    def poll(self):
+        """
+        Check if files changed since the last poll.
+
+        Changes are only reported once a poll finds no new changes, so that
+        saving several files at once only reports them once.
+
+        :returns: Sorted list of the paths of the files that changed.
+        """
+        snapshot = self._scan()
+        changes = set(
+            path
+            for path in set(snapshot) | set(self._snapshot)
+            if snapshot.get(path) != self._snapshot.get(path)
+        )
+        self._snapshot = snapshot
+        if changes:
+            self._pending.update(changes)
+            return []
+        changes, self._pending = self._pending, set()
+        return sorted(changes)
+
+    def _scan(self):
+        """
+        Get the modification time and size of every watched file.
+
+        :returns: Dictionary of (mtime, size) tuples indexed by path.
+        """
+        snapshot = {}
+        for root in self._roots:
+            for folder, folders, files in os.walk(root):
+                folders[:] = [
+                    name for name in folders if name not in self._ignored_folders
+                ]
+                for name in files:
+                    if name.endswith(self._ignored_suffixes):
+                        continue
+                    path = os.path.join(folder, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        # The file was removed while scanning.
+                        continue
+                    snapshot[path] = (stat.st_mtime, stat.st_size)
+        return snapshot
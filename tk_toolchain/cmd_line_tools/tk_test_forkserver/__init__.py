@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Toolkit Test Fork Server
+
+Keep a process with Toolkit, Qt and TankTestBase already imported and run the
+tests of the current repository in processes forked from it.
+
+Usage:
+    tk-test-forkserver start [--foreground] [--idle-timeout=<hours>] [--prewarm=<module>...]
+    tk-test-forkserver stop
+    tk-test-forkserver status
+    tk-test-forkserver run [--] [<pytest-args>...]
+
+Options:
+
+    --foreground            Run the server in this process instead of in the
+                            background.
+
+    --idle-timeout=<hours>  Stop the server after this many hours without
+                            running tests. [default: 24]
+
+    --prewarm=<module>      Import this module in addition to tank, sgtk and
+                            tank_test. Can be repeated.
+
+The run command starts the server if needed and restarts it when the modules
+it imported were modified. Any argument after -- is passed to pytest, for
+example:
+
+    tk-test-forkserver run -- -x tests/test_my_app.py
+
+Only POSIX platforms are supported.
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+import docopt
+
+from tk_toolchain.repo import Repository
+from tk_toolchain import util
+from tk_toolchain.bootstrap import compute_bootstrap
+from pytest_tank_test import forkserver
+
+# How long to wait for a server to import everything and start listening.
+_STARTUP_TIMEOUT = 300
+
+# Hours without tests after which a server started by the run command stops.
+_DEFAULT_IDLE_TIMEOUT = 24
+
+
+def get_log_location(socket_path):
+    """
+    Get the location of the log of a server started in the background.
+
+    :param str socket_path: Path of the socket of the server.
+
+    :returns: Path to the log file.
+    """
+    return os.path.splitext(socket_path)[0] + ".log"
+
+
+def serve(repo_root, socket_path, idle_timeout, modules):
+    """
+    Prepare the environment of a repository, import the modules and handle
+    requests until the server stops.
+
+    :param str repo_root: Root of the repository being tested.
+    :param str socket_path: Path of the socket to listen on.
+    :param float idle_timeout: Number of hours without tests after which the
+        server stops.
+    :param list modules: Additional modules to import.
+
+    :returns: The exit code of the server.
+    """
+    bootstrap = compute_bootstrap(repo_root)
+    if bootstrap is None:
+        return 1
+
+    for reason, path in bootstrap["sys_paths"]:
+        print("{0}: {1}".format(reason, path))
+        sys.path.insert(0, path)
+    util.merge_into_environment_variables(bootstrap["environment"])
+
+    results = forkserver.prewarm(forkserver.DEFAULT_PREWARM_MODULES + list(modules))
+    for name, duration, error in results:
+        print("{0:>9.3f}s {1} {2}".format(duration, name, error or ""))
+
+    server = forkserver.ForkServer(
+        socket_path,
+        forkserver.get_watched_files([path for _, path in bootstrap["sys_paths"]]),
+        idle_timeout=idle_timeout * 3600,
+    )
+    server.prewarm = forkserver.format_prewarm(results)
+    print("Listening on {0}".format(socket_path))
+    sys.stdout.flush()
+    server.serve_forever()
+    return 0
+
+
+def start_server(socket_path, idle_timeout, modules):
+    """
+    Start a server in the background for the current repository.
+
+    :param str socket_path: Path of the socket the server will listen on.
+    :param float idle_timeout: Number of hours without tests after which the
+        server stops.
+    :param list modules: Additional modules to import.
+
+    :returns: The status of the server, or ``None`` if it didn't start.
+    """
+    log_path = get_log_location(socket_path)
+    util.ensure_folder_exists(os.path.dirname(log_path), 0o700)
+    with open(log_path, "wb") as log, open(os.devnull, "rb") as devnull:
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "tk_toolchain.cmd_line_tools.tk_test_forkserver",
+                "start",
+                "--foreground",
+                "--idle-timeout={0}".format(idle_timeout),
+            ]
+            + ["--prewarm={0}".format(module) for module in modules],
+            stdin=devnull,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            # Detach the server from the terminal, so it isn't interrupted
+            # along with the client.
+            preexec_fn=os.setsid,
+            close_fds=True,
+        )
+    return forkserver.wait_for_server(socket_path, _STARTUP_TIMEOUT)
+
+
+def get_status(socket_path):
+    """
+    Get the status of the server of the current repository.
+
+    :returns: The status of the server, or ``None`` if it is not running.
+    """
+    try:
+        return forkserver.send_command(socket_path, "status")
+    except (IOError, OSError):
+        return None
+
+
+def run_tests(socket_path, pytest_args):
+    """
+    Run the tests in a child of the server, starting the server if it is not
+    running and restarting it if it is out of date.
+
+    :param str socket_path: Path of the socket of the server.
+    :param list pytest_args: Command line arguments for pytest.
+
+    :returns: The exit code of pytest.
+    """
+    for _ in range(2):
+        if get_status(socket_path) is None:
+            start = time.time()
+            print("Starting the fork server...")
+            if start_server(socket_path, _DEFAULT_IDLE_TIMEOUT, []) is None:
+                print(
+                    "The fork server did not start, see {0}".format(
+                        get_log_location(socket_path)
+                    )
+                )
+                return 1
+            print("Fork server started in {0:.1f}s".format(time.time() - start))
+        try:
+            return forkserver.run(socket_path, pytest_args)
+        except forkserver.StaleServerError:
+            print("Sources were modified since the fork server started.")
+    return 1
+
+
+####################################################################################
+# script entry point
+def main(arguments=None):
+    """
+    Manage the fork server of the current repository or run tests with it.
+    """
+    arguments = arguments or sys.argv[1:]
+    options = docopt.docopt(__doc__, argv=arguments)
+
+    if not forkserver.is_supported():
+        print("tk-test-forkserver is not supported on this platform.")
+        return 1
+
+    try:
+        repo_root = Repository(os.getcwd()).root
+    except RuntimeError as e:
+        print(e)
+        return 1
+
+    socket_path = forkserver.get_socket_location(repo_root)
+
+    if options["run"]:
+        return run_tests(socket_path, options["<pytest-args>"])
+
+    if options["start"]:
+        idle_timeout = float(options["--idle-timeout"])
+        if options["--foreground"]:
+            return serve(repo_root, socket_path, idle_timeout, options["--prewarm"])
+        status = get_status(socket_path)
+        if status is None:
+            status = start_server(socket_path, idle_timeout, options["--prewarm"])
+        if status is None:
+            print(
+                "The fork server did not start, see {0}".format(
+                    get_log_location(socket_path)
+                )
+            )
+            return 1
+        print(
+            "Fork server {0} is running, {1}".format(status["pid"], status["prewarm"])
+        )
+        return 0
+
+    status = get_status(socket_path)
+    if status is None:
+        print("The fork server of {0} is not running.".format(repo_root))
+        return 1 if options["status"] else 0
+
+    if options["stop"]:
+        forkserver.send_command(socket_path, "stop")
+        print("Stopped fork server {0}".format(status["pid"]))
+    else:
+        print(
+            "Fork server {0} started {1}, {2} test run(s) in progress{3}, {4}".format(
+                status["pid"],
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(status["started"])),
+                status["running"],
+                ", out of date" if status["stale"] else "",
+                status["prewarm"],
+            )
+        )
+    return 0
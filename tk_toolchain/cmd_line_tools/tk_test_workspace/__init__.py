@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Toolkit Workspace Test Runner
+
+Run the tests of every Shotgun component cloned in a folder, in parallel, and
+merge the results into a single JUnit XML report.
+
+Usage:
+    tk-test-workspace [--repos-root=<path>] [--jobs=<count>] [--include=<glob>...] [--exclude=<glob>...] [--output=<path>] [--] [<pytest-args>...]
+
+Options:
+
+    --repos-root=<path>  Folder containing the repositories. Defaults to the
+                         parent folder of the current repository.
+
+    -j, --jobs=<count>   Number of test suites to run at the same time.
+                         Defaults to the number of CPUs.
+
+    --include=<glob>     Only test the repositories whose name match this
+                         pattern. Can be repeated.
+
+    --exclude=<glob>     Do not test the repositories whose name match this
+                         pattern. Can be repeated.
+
+    --output=<path>      Folder where the merged report (junit.xml), the
+                         timings (timings.json) and the output of each test
+                         suite are written. [default: tk-test-workspace]
+
+Any argument after -- is passed to pytest, for example:
+
+    tk-test-workspace --include=tk-multi-* -- -x --tank-affected=master
+"""
+
+from __future__ import print_function
+
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import timeit
+from multiprocessing.pool import ThreadPool
+
+import docopt
+import six
+
+from tk_toolchain.repo import Repository
+from tk_toolchain.workspace import WorkspaceIndex
+from tk_toolchain import util
+from tk_toolchain.cmd_line_tools.tk_test_workspace import junit
+
+# pytest exit code when no tests were collected.
+_NO_TESTS_COLLECTED = 5
+
+# Environment variables set by pytest_tank_test for the current repository,
+# which must not leak into the test runs of other repositories.
+_REPOSITORY_ENVIRONMENT_VARIABLES = (
+    "SHOTGUN_REPOS_ROOT",
+    "SHOTGUN_CURRENT_REPO_ROOT",
+    "TK_TEST_FIXTURES",
+    "PYTEST_XDIST_WORKER",
+)
+
+
+def find_components(repos_root, includes=None, excludes=None):
+    """
+    Find the Shotgun components with tests in a folder.
+
+    :param str repos_root: Folder containing the repositories.
+    :param list includes: If set, only repositories matching one of these
+        patterns are returned.
+    :param list excludes: Repositories matching one of these patterns are
+        not returned.
+
+    :returns: List of :class:`tk_toolchain.repo.Repository` sorted by name.
+    """
+    index = WorkspaceIndex(repos_root)
+    repos = index.get_repositories()
+    index.save()
+
+    def matches(name, patterns):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+    return [
+        repo
+        for repo in repos
+        if repo.is_shotgun_component()
+        and os.path.isdir(os.path.join(repo.root, "tests"))
+        and (not includes or matches(repo.name, includes))
+        and not matches(repo.name, excludes or [])
+    ]
+
+
+def get_environment(repo):
+    """
+    Build the environment the tests of a repository run in.
+
+    :param repo: A :class:`tk_toolchain.repo.Repository` instance.
+
+    :returns: A copy of the current environment without the variables
+        pytest_tank_test sets for the current repository. The Toolkit log
+        file is named after the repository, since several are tested at once.
+    """
+    environment = dict(os.environ)
+    for name in _REPOSITORY_ENVIRONMENT_VARIABLES:
+        environment.pop(name, None)
+    environment["TK_TEST_LOG_NAME"] = "tk-test-{0}".format(repo.name)
+    return environment
+
+
+def run_tests(repo, pytest_args, output_folder):
+    """
+    Run the tests of a repository in a separate process.
+
+    :param repo: A :class:`tk_toolchain.repo.Repository` instance.
+    :param list pytest_args: Additional arguments for pytest.
+    :param str output_folder: Folder where the JUnit XML report and the output
+        of the tests are written.
+
+    :returns: A dictionary with the ``name`` of the repository, the
+        ``returncode`` of pytest, the ``duration`` of the run and the
+        paths to the ``junitxml`` report and to the ``log`` of the run.
+    """
+    junitxml = os.path.join(output_folder, "{0}.xml".format(repo.name))
+    log = os.path.join(output_folder, "{0}.log".format(repo.name))
+    if os.path.exists(junitxml):
+        os.remove(junitxml)
+
+    start = timeit.default_timer()
+    with open(log, "wb") as fh:
+        returncode = subprocess.call(
+            [sys.executable, "-m", "pytest", "--junitxml={0}".format(junitxml)]
+            + list(pytest_args),
+            cwd=repo.root,
+            env=get_environment(repo),
+            stdout=fh,
+            stderr=subprocess.STDOUT,
+        )
+
+    return {
+        "name": repo.name,
+        "root": repo.root,
+        "returncode": returncode,
+        "duration": timeit.default_timer() - start,
+        "junitxml": junitxml,
+        "log": log,
+    }
+
+
+def get_history_location(repos_root):
+    """
+    Get the location of the durations of the previous runs.
+
+    :param str repos_root: Folder containing the repositories.
+
+    :returns: Path to a file in the tk-toolchain cache folder.
+    """
+    return util.get_cache_location(
+        "tk-test-workspace",
+        "{0}.json".format(hashlib.sha1(six.ensure_binary(repos_root)).hexdigest()),
+    )
+
+
+def run_all_tests(repos, pytest_args, output_folder, jobs, history=None):
+    """
+    Run the tests of several repositories in parallel.
+
+    Repositories that took the longest to test during previous runs are
+    started first, so they don't end up running alone at the end.
+
+    :param list repos: List of :class:`tk_toolchain.repo.Repository`.
+    :param list pytest_args: Additional arguments for pytest.
+    :param str output_folder: Folder where the reports are written.
+    :param int jobs: Maximum number of test runs at the same time.
+    :param dict history: Durations of previous runs, indexed by repository name.
+
+    :returns: List of the results of :func:`run_tests`, sorted by name.
+    """
+    history = history or {}
+    repos = sorted(repos, key=lambda repo: (-history.get(repo.name, 0.0), repo.name))
+
+    results = []
+    if not repos:
+        return results
+
+    pool = ThreadPool(min(jobs, len(repos)))
+    try:
+        for result in pool.imap_unordered(
+            lambda repo: run_tests(repo, pytest_args, output_folder), repos
+        ):
+            results.append(result)
+            print(
+                "{0:<12} {1} in {2:.1f}s".format(
+                    _get_status(result["returncode"]),
+                    result["name"],
+                    result["duration"],
+                )
+            )
+    finally:
+        pool.close()
+        pool.join()
+
+    return sorted(results, key=lambda result: result["name"])
+
+
+def merge_results(results):
+    """
+    Merge the JUnit XML reports of the test runs.
+
+    Runs that didn't write a report are reported as a single test in error,
+    with the end of their output.
+
+    :param list results: Results of :func:`run_tests`.
+
+    :returns: The merged report's root element.
+    """
+    suites_by_name = []
+    for result in results:
+        try:
+            suites = junit.read_suites(result["junitxml"])
+        except RuntimeError as e:
+            with open(result["log"], "rb") as fh:
+                output = six.ensure_text(fh.read(), errors="replace")
+            suites = [
+                junit.create_error_suite(
+                    result["name"],
+                    "pytest exited with code {0}: {1}".format(result["returncode"], e),
+                    output[-10000:],
+                )
+            ]
+        suites_by_name.append((result["name"], suites))
+    return junit.merge_suites(suites_by_name)
+
+
+def _get_status(returncode):
+    """
+    Describe the outcome of a test run.
+    """
+    if returncode == 0:
+        return "PASSED"
+    if returncode == _NO_TESTS_COLLECTED:
+        return "NO TESTS"
+    return "FAILED ({0})".format(returncode)
+
+
+####################################################################################
+# script entry point
+def main(arguments=None):
+    """
+    Run the tests of every Shotgun component of the workspace.
+    """
+    arguments = arguments or sys.argv[1:]
+    options = docopt.docopt(__doc__, argv=arguments)
+
+    repos_root = os.path.abspath(options["--repos-root"] or Repository().parent)
+    jobs = int(options["--jobs"] or util.get_cpu_count())
+    output_folder = os.path.abspath(options["--output"])
+    util.ensure_folder_exists(output_folder)
+
+    repos = find_components(repos_root, options["--include"], options["--exclude"])
+    if not repos:
+        print("No Shotgun component with tests found in {0}".format(repos_root))
+        return 1
+
+    print(
+        "Testing {0} repositories from {1} with {2} jobs".format(
+            len(repos), repos_root, jobs
+        )
+    )
+
+    history_location = get_history_location(repos_root)
+    history = util.load_json(history_location, {})
+
+    start = timeit.default_timer()
+    results = run_all_tests(
+        repos, options["<pytest-args>"], output_folder, jobs, history
+    )
+    duration = timeit.default_timer() - start
+
+    report = merge_results(results)
+    junit.write_report(report, os.path.join(output_folder, "junit.xml"))
+
+    history.update((result["name"], result["duration"]) for result in results)
+    try:
+        util.save_json(history_location, history)
+    except (IOError, OSError):
+        pass
+
+    timings = {
+        "repos_root": repos_root,
+        "jobs": jobs,
+        "duration": duration,
+        "repos": results,
+    }
+    with open(os.path.join(output_folder, "timings.json"), "w") as fh:
+        json.dump(timings, fh, indent=4, sort_keys=True)
+
+    print(
+        "{0} tests, {1} failures, {2} errors, {3} skipped in {4:.1f}s "
+        "(sum of the runs: {5:.1f}s)".format(
+            report.get("tests"),
+            report.get("failures"),
+            report.get("errors"),
+            report.get("skipped"),
+            duration,
+            sum(result["duration"] for result in results),
+        )
+    )
+    print("Reports written to {0}".format(output_folder))
+
+    if any(result["returncode"] not in (0, _NO_TESTS_COLLECTED) for result in results):
+        return 1
+    return 0
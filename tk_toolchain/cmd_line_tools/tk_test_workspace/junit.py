@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Merges the JUnit XML reports of several test runs.
+"""
+
+import os
+import xml.etree.ElementTree as ElementTree
+
+# Attributes of a test suite that are summed up when merging.
+_COUNTERS = ("tests", "failures", "errors", "skipped")
+
+
+def read_suites(path):
+    """
+    Read the test suites of a JUnit XML report.
+
+    :param str path: Path to the report.
+
+    :returns: List of ``testsuite`` elements.
+
+    :raises RuntimeError: If the report can't be read.
+    """
+    try:
+        root = ElementTree.parse(path).getroot()
+    except (IOError, OSError, ElementTree.ParseError) as e:
+        raise RuntimeError("Could not read {0}: {1}".format(path, e))
+
+    # pytest wraps the suite in a testsuites element starting with pytest 5.1.
+    if root.tag == "testsuite":
+        return [root]
+    return root.findall("testsuite")
+
+
+def create_error_suite(name, message, output):
+    """
+    Create a test suite reporting that a test run failed before writing
+    its report.
+
+    :param str name: Name of the suite.
+    :param str message: Description of the error.
+    :param str output: Output of the test run.
+
+    :returns: A ``testsuite`` element with a single test in error.
+    """
+    suite = ElementTree.Element(
+        "testsuite",
+        {
+            "name": name,
+            "tests": "1",
+            "failures": "0",
+            "errors": "1",
+            "skipped": "0",
+            "time": "0",
+        },
+    )
+    testcase = ElementTree.SubElement(
+        suite, "testcase", {"classname": name, "name": "test_run", "time": "0"}
+    )
+    error = ElementTree.SubElement(testcase, "error", {"message": message})
+    error.text = output
+    return suite
+
+
+def merge_suites(suites_by_name):
+    """
+    Merge test suites into a single report.
+
+    Each suite is renamed after the run it comes from, and the class names of
+    its tests are prefixed with it, so tests with the same name in different
+    repositories can be told apart.
+
+    :param list suites_by_name: List of (name, list of ``testsuite`` elements)
+        tuples.
+
+    :returns: A ``testsuites`` element.
+    """
+    root = ElementTree.Element("testsuites")
+    totals = dict((counter, 0) for counter in _COUNTERS)
+    total_time = 0.0
+
+    for name, suites in suites_by_name:
+        for suite in suites:
+            suite.set("name", name)
+            for testcase in suite.iter("testcase"):
+                classname = testcase.get("classname")
+                testcase.set(
+                    "classname",
+                    "{0}.{1}".format(name, classname) if classname else name,
+                )
+            for counter in _COUNTERS:
+                totals[counter] += int(suite.get(counter, 0))
+            total_time += float(suite.get("time", 0))
+            root.append(suite)
+
+    for counter in _COUNTERS:
+        root.set(counter, str(totals[counter]))
+    root.set("time", "{0:.3f}".format(total_time))
+    return root
+
+
+def write_report(root, path):
+    """
+    Write a report to disk.
+
+    :param root: The root element of the report.
+    :param str path: Path to the report.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    ElementTree.ElementTree(root).write(path, encoding="utf-8", xml_declaration=True)
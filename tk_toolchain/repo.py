@@ -23,6 +23,12 @@ class Repository(object):
         """
         Find the root of a repository for a given path inside it.
 
+        Results are memoized process-wide for every folder visited during the
+        search, so subsequent lookups from the same folder or any of the
+        folders between it and the root are resolved without listing
+        directories again. See :class:`_RootCache` for how cached results are
+        validated.
+
         :param str path: One of the descendant folders.
 
         :returns: Path to the repository root.
@@ -32,18 +38,45 @@ class Repository(object):
 
         child_path = path or os.getcwd()
 
-        # While we haven't reached the root.
-        while not cls._is_repo_root(child_path):
+        # Folders visited so far whose root we don't know yet.
+        visited = []
+        source_control_folder = None
+
+        while True:
+            found, root = _root_cache.lookup(child_path)
+            if found:
+                break
+
+            visited.append(child_path)
+
+            source_control_folder = cls._get_source_control_folder(child_path)
+            if source_control_folder is not None:
+                root = child_path
+                break
+
             # Peel off one folder from the path.
             parent_path = os.path.dirname(child_path)
 
             # If the path hasn't changed, we've reached the root of the filesystem.
             if child_path == parent_path:
-                raise RuntimeError("{0} is not inside a repository".format(path))
+                root = None
+                break
 
             child_path = parent_path
 
-        return child_path
+        _root_cache.update(visited, root, source_control_folder)
+
+        if root is None:
+            raise RuntimeError("{0} is not inside a repository".format(path))
+
+        return root
+
+    @classmethod
+    def clear_root_cache(cls):
+        """
+        Forget every repository root resolved so far by :meth:`find_root`.
+        """
+        _root_cache.clear()
 
     def __init__(self, path=None):
         """
@@ -52,6 +85,22 @@ class Repository(object):
         :raises RuntimeError: If the path is not inside a repository
         """
         self._root = self.find_root(path)
+        self._profile = None
+
+    @classmethod
+    def from_profile(cls, root, profile):
+        """
+        Create a repository for a known root without searching for it.
+
+        :param str root: Root of the repository.
+        :param profile: :class:`RepoProfile` of the root.
+
+        :returns: A :class:`Repository` instance.
+        """
+        repo = cls.__new__(cls)
+        repo._root = root
+        repo._profile = profile
+        return repo
 
     def __repr__(self):
         """
@@ -92,6 +141,18 @@ class Repository(object):
         """
         return os.path.basename(self.root)
 
+    @property
+    def profile(self):
+        """
+        :class:`RepoProfile` of the files at the root of this repo.
+
+        The root is listed the first time this is accessed and the ``is_*``
+        methods all answer from that snapshot afterwards.
+        """
+        if self._profile is None:
+            self._profile = RepoProfile.scan(self._root)
+        return self._profile
+
     def is_tk_core(self):
         """
         Check if the repository is the tk-core repository.
@@ -186,6 +247,8 @@ class Repository(object):
 
         :returns: ``True`` is the file was found under the root, ``False`` otherwise.
         """
+        if RepoProfile.is_marker(filename):
+            return self.profile.contains(filename)
         return os.path.exists(os.path.join(self._root, filename))
 
     @classmethod
@@ -198,8 +261,345 @@ class Repository(object):
 
         :returns: ``True`` if the folder is the root of a repository, ``False`` otherwise.
         """
+        return cls._get_source_control_folder(path) is not None
+
+    @classmethod
+    def _get_source_control_folder(cls, path):
+        """
+        Find the source control folder inside a folder.
+
+        :returns: The name of the .git, .svn or .hg folder found inside the folder,
+            ``None`` otherwise.
+        """
         files = os.listdir(path)
-        for source_control_folder in [".git", ".svn", ".hg"]:
+        for source_control_folder in _SOURCE_CONTROL_FOLDERS:
             if source_control_folder in files:
+                return source_control_folder
+        return None
+
+
+class RepoProfile(object):
+    """
+    Immutable snapshot of the files found at the root of a repository.
+
+    Only the files and folders used to detect the type of a repository are
+    tracked, as a bitmask. The snapshot is built from a single listing of the
+    root, which is a lot cheaper than testing for the existence of each file
+    individually on network filesystems.
+    """
+
+    __slots__ = ("_flags",)
+
+    # Files and folders that identify the type of a repository. The position
+    # of each name in this list is its bit in the mask.
+    _MARKERS = (
+        "_core_upgrader.py",
+        "engine.py",
+        "framework.py",
+        "app.py",
+        "core",
+        "env",
+        "pytest_tank_test",
+        "shotgun_api3",
+        ".git",
+        ".svn",
+        ".hg",
+    )
+
+    def __init__(self, flags=0):
+        """
+        :param int flags: Bitmask of the markers found at the root.
+        """
+        object.__setattr__(self, "_flags", flags)
+
+    @classmethod
+    def scan(cls, path):
+        """
+        Create a profile by listing a folder.
+
+        :param str path: Root of the repository.
+
+        :returns: A :class:`RepoProfile` instance.
+        """
+        return cls.from_names(_list_names(path))
+
+    @classmethod
+    def from_names(cls, names):
+        """
+        Create a profile from the list of names found at the root of a repository.
+
+        :param names: Iterable of file and folder names.
+
+        :returns: A :class:`RepoProfile` instance.
+        """
+        flags = 0
+        for name in names:
+            flags |= cls._get_bit(name)
+        return cls(flags)
+
+    @classmethod
+    def is_marker(cls, filename):
+        """
+        Check if a file is tracked by profiles.
+
+        :param str filename: Name of the file.
+
+        :returns: ``True`` if the file is tracked, ``False`` otherwise.
+        """
+        return filename in cls._MARKERS
+
+    @property
+    def flags(self):
+        """
+        Bitmask of the markers found at the root.
+        """
+        return self._flags
+
+    @property
+    def is_repo_root(self):
+        """
+        ``True`` if a source control folder was found, ``False`` otherwise.
+        """
+        for source_control_folder in _SOURCE_CONTROL_FOLDERS:
+            if self.contains(source_control_folder):
                 return True
         return False
+
+    def contains(self, filename):
+        """
+        Check if a marker was found at the root.
+
+        :param str filename: Name of the marker.
+
+        :returns: ``True`` if the marker was found, ``False`` otherwise.
+
+        :raises ValueError: If the file is not tracked by profiles.
+        """
+        bit = self._get_bit(filename)
+        if bit == 0:
+            raise ValueError("{0} is not tracked by RepoProfile".format(filename))
+        return bool(self._flags & bit)
+
+    @classmethod
+    def _get_bit(cls, name):
+        """
+        Get the bit associated with a marker.
+
+        :param str name: Name of the marker.
+
+        :returns: The bit or 0 if the name is not a marker.
+        """
+        try:
+            return 1 << cls._MARKERS.index(name)
+        except ValueError:
+            return 0
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RepoProfile objects are immutable")
+
+    def __reduce__(self):
+        return (self.__class__, (self._flags,))
+
+    def __eq__(self, other):
+        return isinstance(other, RepoProfile) and self._flags == other._flags
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._flags)
+
+    def __repr__(self):
+        """
+        Representation of this object.
+        """
+        return "<{0}.{1} {2}>".format(
+            self.__class__.__module__,
+            self.__class__.__name__,
+            [marker for marker in self._MARKERS if self.contains(marker)],
+        )
+
+
+def _list_names(path):
+    """
+    List the names of the entries of a folder.
+
+    :param str path: Folder to list.
+
+    :returns: List of names.
+    """
+    # os.scandir is only available on Python 3.5+.
+    if hasattr(os, "scandir"):
+        iterator = os.scandir(path)
+        try:
+            return [entry.name for entry in iterator]
+        finally:
+            # The close method is only available on Python 3.6+.
+            getattr(iterator, "close", lambda: None)()
+    return os.listdir(path)
+
+
+class _RootCache(object):
+    """
+    Process-wide cache of the results of :meth:`Repository.find_root`.
+
+    Every folder visited while looking for a root is remembered, along with
+    the root it resolved to, or ``None`` if it wasn't inside a repository.
+
+    Entries are validated on lookup with ``stat`` calls only:
+
+    - a folder inside a repository is valid as long as the source control
+      folder at the root of the repository has the same modification time,
+      and neither the folder nor any folder between it and the root have been
+      modified or removed, which is what would happen if a source control
+      folder was created inside one of them;
+    - a folder outside a repository is valid as long as neither it nor any of
+      its parent folders have been modified or removed.
+
+    This is much cheaper than listing every folder up to the root, which is
+    significant when the repositories live on a network filesystem.
+    """
+
+    def __init__(self):
+        # Maps a folder to its repository root or None.
+        self._roots = {}
+        # Maps a root to the path of its source control folder and the
+        # modification time of that folder.
+        self._markers = {}
+        # Maps every visited folder to its modification time.
+        self._folders = {}
+
+    def lookup(self, path):
+        """
+        Look up the root of a folder.
+
+        :param str path: Folder to look up.
+
+        :returns: A tuple of (found, root). If the cache has no valid entry for
+            the folder, found is ``False``. Otherwise, root is the repository
+            root or ``None`` if the folder is not inside a repository.
+        """
+        if path not in self._roots:
+            return False, None
+
+        root = self._roots[path]
+        if self._are_folders_valid(path, root) and (
+            root is None or self._is_marker_valid(root)
+        ):
+            return True, root
+
+        self._roots.pop(path, None)
+        return False, None
+
+    def update(self, paths, root, source_control_folder=None):
+        """
+        Record the root for a series of folders.
+
+        :param list paths: Folders that resolved to the root.
+        :param str root: Root of the repository or ``None`` if the folders are not
+            inside a repository.
+        :param str source_control_folder: Name of the source control folder found
+            at the root, if the root was just listed.
+        """
+        if not paths:
+            return
+
+        if root is not None:
+            if source_control_folder is not None:
+                marker = os.path.join(root, source_control_folder)
+            elif root in self._markers:
+                # The root was validated during the lookup.
+                marker = None
+            else:
+                marker = self._get_marker(root)
+            if marker is not None:
+                mtime = self._get_mtime(marker)
+                if mtime is None:
+                    return
+                self._markers[root] = (marker, mtime)
+
+        for path in paths:
+            mtime = self._get_mtime(path)
+            if mtime is None:
+                return
+            self._folders[path] = mtime
+
+        for path in paths:
+            self._roots[path] = root
+
+    def clear(self):
+        """
+        Empty the cache.
+        """
+        self._roots.clear()
+        self._markers.clear()
+        self._folders.clear()
+
+    def _are_folders_valid(self, path, root):
+        """
+        Check if a folder and its parents up to a root are unchanged.
+
+        :param str path: Folder to validate.
+        :param str root: Root of the repository, which is not validated, or
+            ``None`` to validate every parent folder.
+
+        :returns: ``True`` if the folders are unchanged, ``False`` otherwise.
+        """
+        while path != root:
+            if (
+                path not in self._folders
+                or self._get_mtime(path) != self._folders[path]
+            ):
+                return False
+            parent = os.path.dirname(path)
+            if parent == path:
+                return root is None
+            path = parent
+        return True
+
+    def _is_marker_valid(self, root):
+        """
+        Check if the source control folder of a root is unchanged.
+
+        :param str root: Root of the repository.
+
+        :returns: ``True`` if the folder is unchanged, ``False`` otherwise.
+        """
+        if root not in self._markers:
+            return False
+        marker, mtime = self._markers[root]
+        return self._get_mtime(marker) == mtime
+
+    @staticmethod
+    def _get_marker(root):
+        """
+        Find the source control folder at the root of a repository.
+
+        :param str root: Root of the repository.
+
+        :returns: Path to the source control folder.
+        """
+        for source_control_folder in _SOURCE_CONTROL_FOLDERS:
+            marker = os.path.join(root, source_control_folder)
+            if os.path.lexists(marker):
+                return marker
+        return root
+
+    @staticmethod
+    def _get_mtime(path):
+        """
+        Get the modification time of a path.
+
+        :param str path: Path to stat.
+
+        :returns: The modification time or ``None`` if the path doesn't exist.
+        """
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+
+_SOURCE_CONTROL_FOLDERS = (".git", ".svn", ".hg")
+
+_root_cache = _RootCache()
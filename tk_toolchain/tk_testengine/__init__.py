@@ -10,13 +10,108 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
 
+# Set to 1 to run the test engine with the offscreen Qt platform, which doesn't
+# need a display, or to 0 to always use the default platform.
+HEADLESS_ENV_VAR = "SHOTGUN_TEST_ENGINE_HEADLESS"
 
-def get_test_engine_enviroment():
+# The QApplication shared by every instance of the test engine. The engine's
+# module is reloaded each time an engine starts, so it can't keep it itself.
+_q_app = None
+
+# Tuple of (QApplication, style name, palette, style sheet) captured after the
+# dark look and feel was first initialized.
+_look_and_feel = None
+
+
+def is_headless():
+    """
+    Check if the test engine should run without a display.
+
+    :returns: The value of ``SHOTGUN_TEST_ENGINE_HEADLESS`` if it is set.
+        Otherwise, ``True`` on Linux when there is no X11 or Wayland display,
+        where creating a QApplication would abort the process.
+    """
+    value = os.environ.get(HEADLESS_ENV_VAR)
+    if value is not None:
+        return value.strip().lower() not in ("", "0", "false", "no")
+    return (
+        sys.platform.startswith("linux")
+        and not os.environ.get("DISPLAY")
+        and not os.environ.get("WAYLAND_DISPLAY")
+    )
+
+
+def get_test_engine_enviroment(headless=None):
     """
     Return the environment variables necessary to run the test engine.
 
+    :param bool headless: If ``True``, the engine uses the offscreen Qt
+        platform and if ``False`` the default one. Defaults to
+        :func:`is_headless`.
+
     :returns: Dictionary of environment variables necessary to run
         the test engine.
     """
-    return {"SHOTGUN_TEST_ENGINE": os.path.abspath(os.path.dirname(__file__))}
+    environment = {"SHOTGUN_TEST_ENGINE": os.path.abspath(os.path.dirname(__file__))}
+    if headless is None:
+        headless = is_headless()
+    environment[HEADLESS_ENV_VAR] = "1" if headless else "0"
+    if headless:
+        environment["QT_QPA_PLATFORM"] = "offscreen"
+    return environment
+
+
+def get_q_application(QtGui):
+    """
+    Get the QApplication of the process, creating it if needed.
+
+    The application is kept alive until the process exits, so engines can
+    be destroyed and started again without creating a new application,
+    which is slow and not supported by every binding.
+
+    :param QtGui: The QtGui module of the Qt binding.
+
+    :returns: The QApplication instance.
+    """
+    global _q_app
+    q_app = QtGui.QApplication.instance()
+    if q_app is None:
+        if is_headless():
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        q_app = QtGui.QApplication([])
+    _q_app = q_app
+    return q_app
+
+
+def apply_look_and_feel(q_app, initialize):
+    """
+    Apply the dark look and feel to an application.
+
+    The look and feel is only computed the first time. Afterwards, the style,
+    palette and style sheet it produced are only applied again if something
+    changed them.
+
+    :param q_app: The QApplication instance.
+    :param initialize: Callable initializing the look and feel, like
+        ``Engine._initialize_dark_look_and_feel``.
+    """
+    global _look_and_feel
+    if _look_and_feel is None or _look_and_feel[0] is not q_app:
+        initialize()
+        _look_and_feel = (
+            q_app,
+            q_app.style().objectName(),
+            q_app.palette(),
+            q_app.styleSheet(),
+        )
+        return
+
+    _, style, palette, style_sheet = _look_and_feel
+    if q_app.style().objectName() != style:
+        q_app.setStyle(style)
+    if q_app.palette() != palette:
+        q_app.setPalette(palette)
+    if q_app.styleSheet() != style_sheet:
+        q_app.setStyleSheet(style_sheet)
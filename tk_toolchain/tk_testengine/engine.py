@@ -9,8 +9,15 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import functools
+import os
+
 import sgtk
 
+from tk_toolchain import tk_testengine
+from tk_toolchain.tk_testengine import metrics
+from tk_toolchain.tk_testengine.log_buffer import LogBuffer
+
 
 class TestEngine(sgtk.platform.Engine):
     """
@@ -19,25 +26,70 @@ class TestEngine(sgtk.platform.Engine):
     The engine will initialize a QApplication if possible right before
     applications start registering themselves so it looks as if they
     are running within a GUI environment.
+
+    Set ``SHOTGUN_TEST_ENGINE_HEADLESS`` to 1 to use the offscreen Qt platform,
+    which is the default on Linux when there is no display.
+
+    Log records are kept in :attr:`log_buffer` so tests can query them, and
+    only the ones at or above the ``log_echo_level`` setting are printed.
+
+    The time and memory it takes to import, initialize and register the
+    commands of each bundle are recorded in :attr:`metrics`.
     """
 
+    _log_buffer = None
+    _flush_timer = None
+    _metrics = None
+    _startup = None
+    _restore_instrumentation = ()
+
     def pre_app_init(self):
         """
         Called before apps and loaded.
         """
+        self._start_instrumentation(metrics.STARTUP)
+
         # Since this method is called after Qt has been setup, but before
         # apps have been loaded, this makes it the perfect opportunity to
         # initialize QApplication so that apps can call has_ui and get a
         # positive answer back from the engine.
+        #
+        # The application is shared by every engine started in this process
+        # and is created with the offscreen platform when there is no display.
         try:
-            q_app = sgtk.platform.qt.QtGui.QApplication.instance()
-            self._q_app = q_app or sgtk.platform.qt.QtGui.QApplication([])
+            self._q_app = tk_testengine.get_q_application(sgtk.platform.qt.QtGui)
         except Exception:
             # This will fail if Qt is not available.
             self._q_app = None
 
         if self._q_app:
-            self._initialize_dark_look_and_feel()
+            tk_testengine.apply_look_and_feel(
+                self._q_app, self._initialize_dark_look_and_feel
+            )
+            # Lines logged while the application is idle are still printed
+            # without waiting for the next record.
+            self._flush_timer = sgtk.platform.qt.QtCore.QTimer()
+            self._flush_timer.setInterval(int(self.log_buffer.flush_interval * 1000))
+            self._flush_timer.timeout.connect(self.log_buffer.flush)
+            self._flush_timer.start()
+
+    def post_app_init(self):
+        """
+        Called once all apps are loaded.
+        """
+        self._stop_instrumentation()
+
+    def pre_context_change(self, old_context, new_context):
+        """
+        Called before the context changes and apps are reloaded.
+        """
+        self._start_instrumentation(metrics.CONTEXT_CHANGE)
+
+    def post_context_change(self, old_context, new_context):
+        """
+        Called once the context changed.
+        """
+        self._stop_instrumentation()
 
     @property
     def q_app(self):
@@ -46,11 +98,132 @@ class TestEngine(sgtk.platform.Engine):
         """
         return self._q_app
 
+    @property
+    def log_buffer(self):
+        """
+        The :class:`~tk_toolchain.tk_testengine.log_buffer.LogBuffer` holding
+        the log records of the engine.
+        """
+        if self._log_buffer is None:
+            self._log_buffer = LogBuffer.from_settings(
+                self.get_setting("log_buffer_size"),
+                self.get_setting("log_echo_level"),
+                self.get_setting("log_echo_rate"),
+                os.environ,
+            )
+        return self._log_buffer
+
+    @property
+    def metrics(self):
+        """
+        The :class:`~tk_toolchain.tk_testengine.metrics.EngineMetrics` of the
+        bundles loaded by the engine.
+        """
+        if self._metrics is None:
+            self._metrics = metrics.EngineMetrics()
+        return self._metrics
+
+    def _start_instrumentation(self, phase):
+        """
+        Measure the bundles loaded until :meth:`_stop_instrumentation` is called.
+
+        The functions Toolkit uses to load apps and frameworks and execute
+        hooks are wrapped for the duration.
+
+        :param str phase: Phase measuring the whole duration for the engine.
+        """
+        from tank.platform import application, bundle, framework
+
+        self._stop_instrumentation()
+        engine_metrics = self.metrics
+
+        def wrap_get_application(get_application):
+            def wrapper(*args, **kwargs):
+                with engine_metrics.measure(metrics.IMPORT) as entry:
+                    app = get_application(*args, **kwargs)
+                    entry["bundle"] = _get_bundle_name(app)
+                # The engine initializes the app once its frameworks are loaded.
+                app.init_app = _measure(
+                    engine_metrics, app.init_app, metrics.INIT, entry["bundle"]
+                )
+                return app
+
+            return wrapper
+
+        def wrap_load_framework(load_framework):
+            def wrapper(*args, **kwargs):
+                with engine_metrics.measure(metrics.LOAD) as entry:
+                    fw = load_framework(*args, **kwargs)
+                    entry["bundle"] = _get_bundle_name(fw)
+                return fw
+
+            return wrapper
+
+        def wrap_hook(execute):
+            def wrapper(bundle_obj, *args, **kwargs):
+                with engine_metrics.measure(metrics.HOOK, _get_bundle_name(bundle_obj)):
+                    return execute(bundle_obj, *args, **kwargs)
+
+            return wrapper
+
+        self._restore_instrumentation = [
+            metrics.wrap_attribute(
+                application, "get_application", wrap_get_application
+            ),
+            metrics.wrap_attribute(framework, "load_framework", wrap_load_framework),
+        ] + [
+            metrics.wrap_attribute(bundle.TankBundle, name, wrap_hook)
+            for name in (
+                "execute_hook_method",
+                "execute_hook_expression",
+                "create_hook_instance",
+            )
+        ]
+        self._startup = engine_metrics.start(phase, self.instance_name)
+
+    def _stop_instrumentation(self):
+        """
+        Restore the functions wrapped by :meth:`_start_instrumentation`.
+        """
+        for restore in reversed(self._restore_instrumentation):
+            restore()
+        self._restore_instrumentation = ()
+        if self._startup is not None:
+            self.metrics.stop(self._startup)
+            self._startup = None
+
+    def register_command(self, name, callback, properties=None):
+        """
+        Registers a command, measuring how long it takes.
+
+        See sgtk.platform.Engine documentation's for more details.
+        """
+        app = (properties or {}).get("app")
+        bundle_name = (
+            _get_bundle_name(app)
+            if app is not None
+            else self.metrics.current(metrics.INIT) or self.instance_name
+        )
+        with self.metrics.measure(metrics.REGISTER_COMMAND, bundle_name):
+            return super(self.__class__, self).register_command(
+                name, callback, properties
+            )
+
     def _emit_log_message(self, handler, record):
         """
-        Print any log message to the console.
+        Buffer any log message, echoing it to the console in batches.
+        """
+        self.log_buffer.add(record, handler)
+
+    def destroy_engine(self):
+        """
+        Called when the engine is destroyed.
         """
-        print(handler.format(record))
+        self._stop_instrumentation()
+        if self._flush_timer is not None:
+            self._flush_timer.stop()
+            self._flush_timer = None
+        self.log_buffer.flush()
 
     def show_dialog(self, title, bundle, widget_class, *args, **kwargs):
         """
@@ -65,3 +238,23 @@ class TestEngine(sgtk.platform.Engine):
         dialog.window().raise_()
         dialog.window().show()
         return dialog
+
+
+def _get_bundle_name(bundle):
+    """
+    Get the name metrics are recorded under for a bundle.
+    """
+    return getattr(bundle, "instance_name", None) or bundle.name
+
+
+def _measure(engine_metrics, function, phase, bundle_name):
+    """
+    Wrap a function so each call is measured.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with engine_metrics.measure(phase, bundle_name):
+            return function(*args, **kwargs)
+
+    return wrapper
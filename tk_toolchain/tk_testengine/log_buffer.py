@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Keeps the log records of the test engine in memory.
+
+Printing every record is slow when applications log heavily and floods the
+output of CI jobs. Records are instead kept in a bounded buffer tests can query,
+and only the ones at or above the echo level are written to the console, in
+batches and up to a maximum number of lines per second.
+"""
+
+import atexit
+import collections
+import logging
+import sys
+import timeit
+import weakref
+
+# Environment variables overriding the engine's settings.
+BUFFER_SIZE_ENV_VAR = "SHOTGUN_TEST_ENGINE_LOG_BUFFER_SIZE"
+ECHO_LEVEL_ENV_VAR = "SHOTGUN_TEST_ENGINE_LOG_ECHO_LEVEL"
+ECHO_RATE_ENV_VAR = "SHOTGUN_TEST_ENGINE_LOG_ECHO_RATE"
+
+DEFAULT_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+# Maximum number of seconds an echoed line waits before being written.
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+def get_level(level):
+    """
+    Convert a logging level name to its value.
+
+    :param level: A level name, like ``"INFO"``, or a level number.
+
+    :returns: The level number.
+
+    :raises RuntimeError: If the name isn't a logging level.
+    """
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).strip().upper())
+    if not isinstance(value, int):
+        raise RuntimeError("{0} is not a logging level.".format(level))
+    return value
+
+
+class LogBuffer(object):
+    """
+    Bounded buffer of log records echoing some of them to the console.
+    """
+
+    def __init__(
+        self,
+        size=DEFAULT_SIZE,
+        echo_level=logging.DEBUG,
+        echo_rate=None,
+        stream=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+    ):
+        """
+        :param int size: Maximum number of records kept. Older records are dropped.
+        :param echo_level: Minimum level of the records written to the console,
+            as a number or a name. ``None`` disables the echo.
+        :param float echo_rate: Maximum number of lines written to the console
+            per second. ``None`` or 0 doesn't limit them.
+        :param stream: File the records are echoed to. Defaults to the
+            ``sys.stdout`` of the moment they are written.
+        :param int batch_size: Number of lines written at once.
+        :param float flush_interval: Maximum number of seconds a line waits
+            before being written.
+        """
+        # Tuples of (record, formatter), formatted only when queried.
+        self._size = size
+        self._entries = collections.deque(maxlen=size)
+        self._echo_level = None if echo_level is None else get_level(echo_level)
+        self._echo_rate = echo_rate or None
+        self._stream = stream
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = timeit.default_timer()
+        # Token bucket limiting the echo rate.
+        self._allowance = self._echo_rate
+        self._last_echo = self._last_flush
+        self._dropped = 0
+        self._suppressed = 0
+        # Number of suppressed records not mentioned on the console yet.
+        self._unreported = 0
+        _buffers.add(self)
+
+    @classmethod
+    def from_settings(cls, size, echo_level, echo_rate, environ):
+        """
+        Create a buffer from the engine's settings.
+
+        :param int size: The ``log_buffer_size`` setting.
+        :param str echo_level: The ``log_echo_level`` setting.
+        :param float echo_rate: The ``log_echo_rate`` setting.
+        :param environ: Environment variables, which override the settings.
+
+        :returns: A :class:`LogBuffer`.
+        """
+        size = int(environ.get(BUFFER_SIZE_ENV_VAR, size))
+        echo_level = environ.get(ECHO_LEVEL_ENV_VAR, echo_level)
+        if str(echo_level).strip().upper() in ("", "NONE", "OFF"):
+            echo_level = None
+        echo_rate = float(environ.get(ECHO_RATE_ENV_VAR, echo_rate or 0))
+        return cls(size, echo_level, echo_rate)
+
+    @property
+    def dropped(self):
+        """
+        Number of records dropped because the buffer was full.
+        """
+        return self._dropped
+
+    @property
+    def flush_interval(self):
+        """
+        Maximum number of seconds a line waits before being written.
+
+        Lines are only written when a record is added or :meth:`flush` is
+        called, so owners of the buffer should also call it periodically.
+        """
+        return self._flush_interval
+
+    @property
+    def suppressed(self):
+        """
+        Number of records not echoed because of the rate limit.
+        """
+        return self._suppressed
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, record, formatter=None):
+        """
+        Add a record to the buffer and echo it if needed.
+
+        :param record: The :class:`logging.LogRecord`.
+        :param formatter: Object with a ``format(record)`` method, like a
+            :class:`logging.Handler`. Defaults to the message of the record.
+        """
+        if len(self._entries) == self._size:
+            self._dropped += 1
+        self._entries.append((record, formatter))
+
+        if self._echo_level is None or record.levelno < self._echo_level:
+            return
+
+        now = timeit.default_timer()
+        if self._echo_rate:
+            self._allowance = min(
+                self._echo_rate,
+                self._allowance + (now - self._last_echo) * self._echo_rate,
+            )
+            self._last_echo = now
+            if self._allowance < 1:
+                self._suppressed += 1
+                self._unreported += 1
+                return
+            self._allowance -= 1
+
+        self._pending.append(self._format(record, formatter))
+        if (
+            len(self._pending) >= self._batch_size
+            or record.levelno >= logging.ERROR
+            or now - self._last_flush >= self._flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the pending lines to the console.
+        """
+        self._last_flush = timeit.default_timer()
+        if self._unreported:
+            self._pending.append(
+                "({0} log records were not printed because of the rate limit)".format(
+                    self._unreported
+                )
+            )
+            self._unreported = 0
+        if not self._pending:
+            return
+        lines, self._pending = self._pending, []
+        stream = self._stream or sys.stdout
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+    def records(self, level=None, logger=None, contains=None):
+        """
+        Query the buffered records, oldest first.
+
+        :param level: Minimum level of the records, as a number or a name.
+        :param str logger: Only return the records of this logger and its children.
+        :param str contains: Only return the records whose message contains
+            this string.
+
+        :returns: List of :class:`logging.LogRecord`.
+        """
+        return [record for record, _ in self._query(level, logger, contains)]
+
+    def messages(self, level=None, logger=None, contains=None, formatted=False):
+        """
+        Query the messages of the buffered records, oldest first.
+
+        Takes the same filters as :meth:`records`.
+
+        :param bool formatted: If ``True``, the records are formatted the way
+            they are echoed instead of returning only their message.
+
+        :returns: List of strings.
+        """
+        return [
+            self._format(record, formatter) if formatted else record.getMessage()
+            for record, formatter in self._query(level, logger, contains)
+        ]
+
+    def clear(self):
+        """
+        Remove every buffered record.
+        """
+        self._entries.clear()
+        self._dropped = 0
+
+    def _query(self, level, logger, contains):
+        """
+        Filter the buffered entries.
+        """
+        level = None if level is None else get_level(level)
+        entries = []
+        for record, formatter in self._entries:
+            if level is not None and record.levelno < level:
+                continue
+            if logger is not None and not (
+                record.name == logger or record.name.startswith(logger + ".")
+            ):
+                continue
+            if contains is not None and contains not in record.getMessage():
+                continue
+            entries.append((record, formatter))
+        return entries
+
+    def _format(self, record, formatter):
+        """
+        Format a record.
+        """
+        if formatter is None:
+            return record.getMessage()
+        return formatter.format(record)
+
+
+# Every buffer, so lines still pending when the process exits are written.
+_buffers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_buffers():
+    """
+    Write the pending lines of every buffer.
+    """
+    for buffer in list(_buffers):
+        buffer.flush()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Measures where the time goes when the test engine loads its bundles.
+
+Each measure records the bundle it was made for, the phase of the startup,
+like importing an app or running its ``init_app``, the wall time it took and
+how much the memory used by the process changed.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import timeit
+
+# Phases measured by the test engine.
+IMPORT = "import"
+INIT = "init"
+LOAD = "load"
+HOOK = "hook"
+REGISTER_COMMAND = "register_command"
+STARTUP = "startup"
+CONTEXT_CHANGE = "context_change"
+
+
+def get_memory_usage():
+    """
+    Get the memory used by the process.
+
+    :returns: The resident set size in bytes on Linux, the peak resident set
+        size on other POSIX platforms or ``None`` when it can't be known.
+    """
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class EngineMetrics(object):
+    """
+    Wall time and memory measures of the bundles of an engine.
+    """
+
+    def __init__(self, memory_usage=get_memory_usage):
+        """
+        :param memory_usage: Callable returning the memory used by the process,
+            in bytes, or ``None``.
+        """
+        self._memory_usage = memory_usage
+        self._entries = []
+        # Measures in progress.
+        self._active = []
+
+    def start(self, phase, bundle=None):
+        """
+        Start a measure.
+
+        Measures of a phase for a bundle already being measured for that
+        phase, like a hook executing another hook, are not recorded.
+
+        :param str phase: The phase being measured.
+        :param str bundle: The bundle being measured, if known yet.
+
+        :returns: A dictionary to pass to :meth:`stop`. Its ``bundle`` can be
+            set before then.
+        """
+        nested = bundle is not None and any(
+            active["bundle"] == bundle and active["phase"] == phase
+            for active in self._active
+        )
+        entry = {
+            "bundle": bundle,
+            "phase": phase,
+            "_start": timeit.default_timer(),
+            "_memory": self._memory_usage(),
+            "_nested": nested,
+        }
+        self._active.append(entry)
+        return entry
+
+    def stop(self, entry):
+        """
+        Finish a measure and record it.
+
+        :param dict entry: The dictionary returned by :meth:`start`.
+        """
+        duration = timeit.default_timer() - entry.pop("_start")
+        memory = self._memory_usage()
+        start_memory = entry.pop("_memory")
+        self._active = [active for active in self._active if active is not entry]
+        if entry.pop("_nested"):
+            return
+        entry["duration"] = duration
+        entry["memory_delta"] = (
+            None if memory is None or start_memory is None else memory - start_memory
+        )
+        self._entries.append(entry)
+
+    def current(self, phase):
+        """
+        Get the bundle of the innermost measure in progress for a phase.
+
+        :param str phase: The phase.
+
+        :returns: The name of the bundle or ``None``.
+        """
+        for entry in reversed(self._active):
+            if entry["phase"] == phase:
+                return entry["bundle"]
+        return None
+
+    @contextlib.contextmanager
+    def measure(self, phase, bundle=None):
+        """
+        Measure the code run in a ``with`` statement.
+
+        See :meth:`start` for the parameters.
+        """
+        entry = self.start(phase, bundle)
+        try:
+            yield entry
+        finally:
+            self.stop(entry)
+
+    def entries(self, bundle=None, phase=None):
+        """
+        Get the recorded measures, in the order they finished.
+
+        :param str bundle: Only return the measures of this bundle.
+        :param str phase: Only return the measures of this phase.
+
+        :returns: List of dictionaries with the ``bundle``, ``phase``,
+            ``duration`` in seconds and ``memory_delta`` in bytes of
+            each measure.
+        """
+        return [
+            dict(entry)
+            for entry in self._entries
+            if (bundle is None or entry["bundle"] == bundle)
+            and (phase is None or entry["phase"] == phase)
+        ]
+
+    def duration(self, bundle=None, phase=None):
+        """
+        Get the total duration of measures.
+
+        Takes the same filters as :meth:`entries`.
+
+        :returns: The duration in seconds.
+        """
+        return sum(entry["duration"] for entry in self.entries(bundle, phase))
+
+    def by_bundle(self):
+        """
+        Summarize the measures of each bundle.
+
+        :returns: Dictionary indexed by bundle and phase of dictionaries
+            with the ``count`` of measures, their total ``duration`` and
+            total ``memory_delta``.
+        """
+        summary = {}
+        for entry in self._entries:
+            phases = summary.setdefault(entry["bundle"], {})
+            total = phases.setdefault(
+                entry["phase"], {"count": 0, "duration": 0.0, "memory_delta": None}
+            )
+            total["count"] += 1
+            total["duration"] += entry["duration"]
+            if entry["memory_delta"] is not None:
+                total["memory_delta"] = (total["memory_delta"] or 0) + entry[
+                    "memory_delta"
+                ]
+        return summary
+
+    def clear(self):
+        """
+        Forget the recorded measures.
+        """
+        self._entries = []
+
+    def to_dict(self):
+        """
+        :returns: A JSON serializable dictionary with the ``entries`` and
+            the summary of each bundle, under ``bundles``.
+        """
+        return {"entries": self.entries(), "bundles": self.by_bundle()}
+
+    def dump(self, path):
+        """
+        Write the measures to a JSON file.
+
+        :param str path: Path of the file.
+        """
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=2, sort_keys=True)
+
+    def format_table(self):
+        """
+        Describe the time spent by each bundle, slowest first.
+
+        :returns: A human readable string.
+        """
+        summary = self.by_bundle()
+        lines = []
+        for bundle in sorted(
+            summary,
+            key=lambda name: -sum(
+                total["duration"] for total in summary[name].values()
+            ),
+        ):
+            lines.append(str(bundle))
+            for phase, total in sorted(summary[bundle].items()):
+                memory = total["memory_delta"]
+                lines.append(
+                    "    {0:<18} {1:>8.3f}s {2:>10} ({3} time(s))".format(
+                        phase,
+                        total["duration"],
+                        "" if memory is None else _format_bytes(memory),
+                        total["count"],
+                    )
+                )
+        return "\n".join(lines)
+
+
+def wrap_attribute(owner, name, make_wrapper):
+    """
+    Replace a function of a module or class by a wrapper.
+
+    :param owner: The module or class.
+    :param str name: Name of the function.
+    :param make_wrapper: Callable receiving the function and returning the
+        wrapper.
+
+    :returns: A callable restoring the original function. Nothing is wrapped
+        if the owner doesn't have the function.
+    """
+    if not callable(getattr(owner, name, None)):
+        return lambda: None
+
+    missing = object()
+    # Looked up in __dict__ so methods and inherited functions are restored
+    # as they were.
+    original = vars(owner).get(name, missing)
+    setattr(owner, name, make_wrapper(getattr(owner, name)))
+
+    def restore():
+        if original is missing:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
+
+    return restore
+
+
+def _format_bytes(size):
+    """
+    Format a number of bytes in mebibytes.
+    """
+    return "{0:+.1f}MiB".format(size / (1024.0 * 1024.0))
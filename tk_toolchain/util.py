@@ -9,7 +9,12 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
+import errno
+import json
+import multiprocessing
 import os
+import sys
+import tempfile
 
 
 def expand_path(path):
@@ -34,3 +39,138 @@ def merge_into_environment_variables(env):
     """
     for name, value in env.items():
         os.environ.setdefault(name, value)
+
+
+def get_cache_location(*names):
+    """
+    Return a path inside the tk-toolchain cache folder for the current user.
+
+    The cache folder can be overridden with the ``TK_TOOLCHAIN_CACHE_LOCATION``
+    environment variable.
+
+    :param names: Names of the files and folders to append to the cache folder.
+
+    :returns: The path inside the cache folder.
+    """
+    root = os.environ.get("TK_TOOLCHAIN_CACHE_LOCATION")
+    if root:
+        root = expand_path(root)
+    elif sys.platform == "win32":
+        root = os.path.join(
+            os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"),
+            "Shotgun",
+            "tk-toolchain",
+        )
+    elif sys.platform == "darwin":
+        root = os.path.expanduser(
+            os.path.join("~", "Library", "Caches", "tk-toolchain")
+        )
+    else:
+        root = os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+            "tk-toolchain",
+        )
+    return os.path.join(root, *names)
+
+
+def ensure_folder_exists(path, mode=0o777):
+    """
+    Create a folder and its parents if they are missing.
+
+    :param str path: Folder to create.
+    :param int mode: Permissions of the folders that are created.
+    """
+    try:
+        os.makedirs(path, mode)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def load_json(path, default=None):
+    """
+    Read a JSON file.
+
+    :param str path: Path to the file.
+    :param default: Value to return if the file is missing or corrupted.
+
+    :returns: The content of the file or the default value.
+    """
+    try:
+        with open(path, "r") as fh:
+            return json.load(fh)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def save_json(path, data, mode=0o666):
+    """
+    Write a JSON file atomically, so readers never see a partially written file.
+
+    :param str path: Path to the file.
+    :param data: Data to write.
+    :param int mode: Permissions of the file and of the folders that are created,
+        restricted by the umask like files created with :func:`open`. Execute
+        permissions are added to the folders for every class of user that can
+        read the file.
+    """
+    folder = os.path.dirname(path)
+    ensure_folder_exists(folder, mode | ((mode & 0o444) >> 2))
+    handle, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+    try:
+        with os.fdopen(handle, "w") as fh:
+            json.dump(data, fh)
+        os.chmod(tmp_path, mode & ~_get_umask())
+        # os.replace is only available on Python 3.3+. On Python 2, os.rename can't
+        # overwrite an existing file on Windows.
+        getattr(os, "replace", os.rename)(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_umask():
+    """
+    Read the umask of the process by setting it and restoring it.
+
+    The umask of the whole process changes in the meantime, so this is only
+    safe before any thread creates files.
+    """
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+# Read when the module is imported, before threads are likely to be running.
+_IMPORT_UMASK = _read_umask()
+
+
+def _get_umask():
+    """
+    Get the umask of the process, without changing it.
+
+    :returns: The current umask on Linux, otherwise the umask the process had
+        when this module was imported.
+    """
+    # Linux 4.7+ reports the umask in /proc.
+    try:
+        with open("/proc/self/status", "r") as fh:
+            for line in fh:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    return _IMPORT_UMASK
+
+
+def get_cpu_count():
+    """
+    Get the number of CPUs on this computer.
+
+    :returns: The number of CPUs, or 1 if it can't be determined.
+    """
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
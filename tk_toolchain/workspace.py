@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import hashlib
+import os
+from multiprocessing.pool import ThreadPool
+
+import six
+
+from tk_toolchain.repo import Repository, RepoProfile
+from tk_toolchain import util
+
+# Types of components a repository can be classified as.
+TK_CORE = "tk-core"
+PYTHON_API = "python-api"
+TK_TOOLCHAIN = "tk-toolchain"
+ENGINE = "engine"
+FRAMEWORK = "framework"
+APP = "app"
+CONFIG = "config"
+
+COMPONENT_TYPES = (TK_CORE, PYTHON_API, TK_TOOLCHAIN, ENGINE, FRAMEWORK, APP, CONFIG)
+
+
+def get_component_type(repo):
+    """
+    Classify a repository.
+
+    :param repo: A :class:`tk_toolchain.repo.Repository` instance.
+
+    :returns: One of the values of ``COMPONENT_TYPES`` or ``None`` if the
+        repository is not a Shotgun component.
+    """
+    # Order matters here, as tk-core or a config could contain files
+    # that would make them look like another type of component.
+    if repo.is_tk_core():
+        return TK_CORE
+    if repo.is_python_api():
+        return PYTHON_API
+    if repo.is_tk_toolchain():
+        return TK_TOOLCHAIN
+    if repo.is_engine():
+        return ENGINE
+    if repo.is_framework():
+        return FRAMEWORK
+    if repo.is_app():
+        return APP
+    if repo.is_config():
+        return CONFIG
+    return None
+
+
+class Workspace(object):
+    """
+    Index of the Shotgun components cloned side by side in a folder.
+
+    The folder is scanned the first time the index is accessed. Each child
+    folder is listed once, in parallel, to find out if it is the root of
+    a repository and what type of component it contains.
+    """
+
+    def __init__(self, path=None, max_workers=None):
+        """
+        :param str path: Folder containing the repositories. Defaults to
+            ``SHOTGUN_REPOS_ROOT`` or the parent folder of the current repository.
+        :param int max_workers: Number of threads used to scan the folder.
+
+        :raises RuntimeError: If no path is specified and the current folder is
+            not inside a repository.
+        """
+        self._path = path or os.environ.get("SHOTGUN_REPOS_ROOT") or Repository().parent
+        self._max_workers = max_workers or min(32, 4 * util.get_cpu_count())
+        self._index = None
+
+    def __repr__(self):
+        """
+        Representation of this object.
+        """
+        return "<{0}.{1} for {2}>".format(
+            self.__class__.__module__, self.__class__.__name__, self._path
+        )
+
+    @property
+    def path(self):
+        """
+        Folder containing the repositories.
+        """
+        return self._path
+
+    @property
+    def index(self):
+        """
+        Dictionary of repositories, indexed by component type and then by name.
+
+        For example::
+
+            {
+                "engine": {"tk-maya": <Repository>, ...},
+                "framework": {"tk-framework-qtwidgets": <Repository>, ...},
+                ...
+            }
+        """
+        if self._index is None:
+            self.scan()
+        return self._index
+
+    def scan(self):
+        """
+        Scan the folder for repositories, discarding any previous result.
+
+        :returns: The index. See :attr:`index`.
+        """
+        names = sorted(os.listdir(self._path))
+        paths = [os.path.join(self._path, name) for name in names]
+
+        repos = _parallel_map(_scan_folder, paths, self._max_workers)
+
+        index = dict((component_type, {}) for component_type in COMPONENT_TYPES)
+        for repo in repos:
+            if repo is None:
+                continue
+            component_type = get_component_type(repo)
+            if component_type is not None:
+                index[component_type][repo.name] = repo
+
+        self._index = index
+        return index
+
+    def get(self, name, component_type=None):
+        """
+        Find a repository by name.
+
+        :param str name: Name of the repository's folder.
+        :param str component_type: If set, only repositories of this type will
+            be considered.
+
+        :returns: A :class:`tk_toolchain.repo.Repository` or ``None``.
+        """
+        if component_type is not None:
+            return self.index[component_type].get(name)
+
+        for repos in self.index.values():
+            if name in repos:
+                return repos[name]
+        return None
+
+    def get_repositories(self, component_type=None):
+        """
+        List repositories.
+
+        :param str component_type: If set, only repositories of this type will
+            be returned.
+
+        :returns: List of :class:`tk_toolchain.repo.Repository` sorted by name.
+        """
+        if component_type is not None:
+            repos = list(self.index[component_type].values())
+        else:
+            repos = [repo for repos in self.index.values() for repo in repos.values()]
+        return sorted(repos, key=lambda repo: repo.name)
+
+
+class WorkspaceIndex(object):
+    """
+    Persistent index of the repositories in a workspace.
+
+    The index is stored as a JSON file in the tk-toolchain cache folder so that
+    it can be reused across tool invocations. Each repository's entry is
+    invalidated when the modification time of its folder changes, so only the
+    repositories that changed since the last invocation need to be listed again.
+    Everything else costs a single ``stat`` call.
+    """
+
+    # Bump this whenever the format of the file changes.
+    _FORMAT_VERSION = 1
+
+    def __init__(self, path, cache_path=None, max_workers=None):
+        """
+        :param str path: Folder containing the repositories.
+        :param str cache_path: Path to the file the index is stored in. Defaults to
+            a file in the tk-toolchain cache folder.
+        :param int max_workers: Number of threads used to validate the index.
+        """
+        self._path = path
+        self._cache_path = cache_path or util.get_cache_location(
+            "workspaces",
+            "{0}.json".format(hashlib.sha1(six.ensure_binary(path)).hexdigest()),
+        )
+        self._max_workers = max_workers or min(32, 4 * util.get_cpu_count())
+        self._hits = 0
+        self._misses = 0
+        self._is_dirty = False
+
+        data = util.load_json(self._cache_path)
+        if (
+            isinstance(data, dict)
+            and data.get("version") == self._FORMAT_VERSION
+            and data.get("path") == path
+        ):
+            self._folder = data["folder"]
+            self._entries = data["entries"]
+        else:
+            self._folder = None
+            self._entries = {}
+
+    @classmethod
+    def for_repository(cls, repo, **kwargs):
+        """
+        Get the index of the workspace a repository was cloned in.
+
+        :param repo: A :class:`tk_toolchain.repo.Repository` instance.
+
+        :returns: A :class:`WorkspaceIndex` instance.
+        """
+        return cls(
+            repo.get_roots_environment_variables()["SHOTGUN_REPOS_ROOT"], **kwargs
+        )
+
+    def __repr__(self):
+        """
+        Representation of this object.
+        """
+        return "<{0}.{1} for {2}>".format(
+            self.__class__.__module__, self.__class__.__name__, self._path
+        )
+
+    @property
+    def path(self):
+        """
+        Folder containing the repositories.
+        """
+        return self._path
+
+    @property
+    def cache_path(self):
+        """
+        Path to the file the index is stored in.
+        """
+        return self._cache_path
+
+    @property
+    def hits(self):
+        """
+        Number of lookups that were answered by the index.
+        """
+        return self._hits
+
+    @property
+    def misses(self):
+        """
+        Number of lookups that required scanning the filesystem.
+        """
+        return self._misses
+
+    def format_stats(self):
+        """
+        Describe how effective the index was.
+
+        :returns: A human readable string.
+        """
+        return "Workspace index for {0}: {1} hit(s), {2} miss(es)".format(
+            self._path, self._hits, self._misses
+        )
+
+    def get(self, name):
+        """
+        Find a repository by name.
+
+        :param str name: Name of the repository's folder.
+
+        :returns: A :class:`tk_toolchain.repo.Repository` or ``None`` if there
+            is no repository with that name.
+        """
+        return self._record(_validate_entry(self._path, name, self._entries.get(name)))
+
+    def resolve(self, repo):
+        """
+        Get a repository whose type is answered by the index.
+
+        :param repo: A :class:`tk_toolchain.repo.Repository` instance.
+
+        :returns: A :class:`tk_toolchain.repo.Repository` for the same root,
+            which is the original repository if it is not part of this workspace.
+        """
+        if repo.parent == self._path:
+            return self.get(repo.name) or repo
+        return repo
+
+    def get_repositories(self, component_type=None):
+        """
+        List the Shotgun components of the workspace.
+
+        :param str component_type: If set, only repositories of this type will
+            be returned.
+
+        :returns: List of :class:`tk_toolchain.repo.Repository` sorted by name.
+        """
+        mtime = _get_mtime(self._path)
+        if self._folder is not None and self._folder["mtime"] == mtime:
+            self._hits += 1
+            names = self._folder["names"]
+        else:
+            self._misses += 1
+            names = sorted(os.listdir(self._path))
+            self._folder = {"mtime": mtime, "names": names}
+            self._is_dirty = True
+
+        results = _parallel_map(
+            lambda name: _validate_entry(self._path, name, self._entries.get(name)),
+            names,
+            self._max_workers,
+        )
+
+        repos = []
+        for result in results:
+            repo = self._record(result)
+            if repo is None:
+                continue
+            repo_type = get_component_type(repo)
+            if repo_type is None:
+                continue
+            if component_type is None or component_type == repo_type:
+                repos.append(repo)
+        return repos
+
+    def save(self):
+        """
+        Write the index to disk if it was updated.
+
+        Failures to write the index are ignored, as the index is only an
+        optimization.
+
+        :returns: ``True`` if the index was written, ``False`` otherwise.
+        """
+        if not self._is_dirty:
+            return False
+        try:
+            util.save_json(
+                self._cache_path,
+                {
+                    "version": self._FORMAT_VERSION,
+                    "path": self._path,
+                    "folder": self._folder,
+                    "entries": self._entries,
+                },
+            )
+        except (IOError, OSError):
+            return False
+        self._is_dirty = False
+        return True
+
+    def _record(self, result):
+        """
+        Record the outcome of the validation of an entry.
+
+        :param tuple result: Result of :func:`_validate_entry`.
+
+        :returns: A :class:`tk_toolchain.repo.Repository` or ``None``.
+        """
+        name, entry, is_hit = result
+        if is_hit:
+            self._hits += 1
+        else:
+            self._misses += 1
+            self._is_dirty = True
+            if entry is None:
+                self._entries.pop(name, None)
+            else:
+                self._entries[name] = entry
+
+        if entry is None or entry["flags"] is None:
+            return None
+        return Repository.from_profile(
+            os.path.join(self._path, name), RepoProfile(entry["flags"])
+        )
+
+
+def _validate_entry(parent, name, entry):
+    """
+    Validate an entry of the index and refresh it if it is stale.
+
+    :param str parent: Folder containing the repository.
+    :param str name: Name of the repository.
+    :param dict entry: Entry of the index, or ``None`` if there is no entry.
+
+    :returns: A tuple of (name, entry, is_hit). The entry is ``None`` when the
+        folder doesn't exist. The entry's flags are ``None`` when the folder
+        is not a repository.
+    """
+    path = os.path.join(parent, name)
+    mtime = _get_mtime(path)
+    if mtime is None:
+        return name, None, entry is None
+    if entry is not None and entry["mtime"] == mtime:
+        return name, entry, True
+
+    try:
+        profile = RepoProfile.scan(path)
+    except OSError:
+        flags = None
+    else:
+        flags = profile.flags if profile.is_repo_root else None
+    return name, {"mtime": mtime, "flags": flags}, False
+
+
+def _parallel_map(func, items, max_workers):
+    """
+    Call a function on every item using a pool of threads.
+
+    :param callable func: Function to call.
+    :param list items: Items to pass to the function.
+    :param int max_workers: Maximum number of threads to use.
+
+    :returns: List of results, in the same order as the items.
+    """
+    if not items:
+        return []
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        # Large chunks reduce the synchronization overhead between the
+        # threads when there are thousands of folders to scan.
+        chunksize = max(1, len(items) // (4 * max_workers))
+        return pool.map(func, items, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _get_mtime(path):
+    """
+    Get the modification time of a path.
+
+    :param str path: Path to stat.
+
+    :returns: The modification time or ``None`` if the path doesn't exist.
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _scan_folder(path):
+    """
+    Create a repository object for a folder if it is the root of a repository.
+
+    :param str path: Folder to scan.
+
+    :returns: A :class:`tk_toolchain.repo.Repository` or ``None``.
+    """
+    try:
+        profile = RepoProfile.scan(path)
+    except OSError:
+        # Files, broken links and folders we can't read.
+        return None
+
+    if profile.is_repo_root:
+        return Repository.from_profile(path, profile)
+    return None